@@ -1,16 +1,150 @@
 # ai_tips.py
 import os
-from dotenv import load_dotenv
+import json
+import threading
 import time
+from contextvars import ContextVar
 from functools import lru_cache
-from openai import OpenAI, OpenAIError
+from rate_limiter import (
+    PRIORITY_BACKGROUND,
+    PRIORITY_BATCH,
+    PRIORITY_INTERACTIVE,
+    get_rate_limiter,
+)
+import metrics
+from tracing import traced
 
-# Create client (safe even if key is missing; we guard before calling)
-load_dotenv()  # Load variables from .env if present
-client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+# The OpenAI SDK and .env loading are deferred to first use so importing this
+# module (and the app, and the test suite) does not pay for them.
+_env_loaded = False
+_client = None
+_client_key = None
+_client_lock = threading.Lock()
+
+# Optional override for the client (e.g. a local stand-in server for load tests).
+# When None, the lazily built default client is used.
+_client_provider = None
+
+
+def _ensure_env() -> None:
+    """Load variables from .env once, on first use."""
+    global _env_loaded
+    if _env_loaded:
+        return
+    try:
+        from dotenv import load_dotenv
+        load_dotenv()  # Load variables from .env if present
+    except ImportError:
+        pass
+    _env_loaded = True
+
+
+def _default_client():
+    """Build (once per API key) the default OpenAI client.
+
+    Safe even if the key is missing: callers check OPENAI_API_KEY before any
+    request, so a placeholder key is only ever used for inspection/patching.
+    """
+    global _client, _client_key
+    _ensure_env()
+    key = os.getenv("OPENAI_API_KEY")
+    if _client is None or key != _client_key:
+        with _client_lock:
+            if _client is None or key != _client_key:
+                from openai import OpenAI
+                _client = OpenAI(api_key=key or "missing-api-key")
+                _client_key = key
+    return _client
+
+
+def __getattr__(name):
+    # Keep `ai_tips.client` working as a lazily created module attribute
+    if name == "client":
+        return _default_client()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 # Public flag for UI to inspect last tip source: "gpt" | "fallback" | "unknown"
 LAST_TIP_SOURCE = "unknown"
+# The same, for the current thread only: other sessions' requests cannot overwrite it
+_TIP_SOURCE: ContextVar = ContextVar("tip_source", default="unknown")
+
+
+def _set_tip_source(source: str) -> None:
+    global LAST_TIP_SOURCE
+    LAST_TIP_SOURCE = source
+    _TIP_SOURCE.set(source)
+
+# How long a request may wait for rate-limiter capacity before degrading to local_tip.
+# (env var, default seconds); read at call time so values from .env apply.
+_DEADLINE_ENV = {
+    PRIORITY_INTERACTIVE: ("TIP_DEADLINE_INTERACTIVE_S", 10.0),
+    PRIORITY_BACKGROUND: ("TIP_DEADLINE_BACKGROUND_S", 30.0),
+    PRIORITY_BATCH: ("TIP_DEADLINE_BATCH_S", 120.0),
+}
+
+
+def _default_deadline(priority: int) -> float:
+    name, default = _DEADLINE_ENV.get(priority, _DEADLINE_ENV[PRIORITY_INTERACTIVE])
+    try:
+        return float(os.getenv(name, default))
+    except ValueError:
+        return default
+
+# Priority/deadline of the current request. Kept out of the lru_cache key so the
+# same inputs share one cached answer regardless of who asked first.
+_REQUEST_CTX: ContextVar = ContextVar("tip_request_ctx", default=(PRIORITY_INTERACTIVE, None))
+# Set per lookup; the cached function flips it, so a hit leaves it False
+_CACHE_MISS: ContextVar = ContextVar("tip_cache_miss", default=None)
+
+
+class _RateLimited(Exception):
+    """Raised inside the cached generator so a degraded call is never cached."""
+
+
+# Per-source counters for load tests and monitoring
+_TIP_STATS_LOCK = threading.Lock()
+_TIP_STATS = {"requests": 0, "gpt": 0, "fallback": 0}
+
+
+def set_client_provider(provider) -> None:
+    """Use provider() to obtain the OpenAI-compatible client; None restores the default.
+
+    Example (local stand-in server):
+        set_client_provider(lambda: OpenAI(api_key="mock", base_url="http://127.0.0.1:8089/v1"))
+    """
+    global _client_provider
+    _client_provider = provider
+    _generate_eco_tip_cached.cache_clear()
+
+
+def get_client():
+    """Return the client used for GPT calls (provider override or module default)."""
+    if _client_provider is not None:
+        return _client_provider()
+    return _default_client()
+
+
+def _count_tip(source: str) -> None:
+    with _TIP_STATS_LOCK:
+        _TIP_STATS["requests"] += 1
+        _TIP_STATS[source] = _TIP_STATS.get(source, 0) + 1
+    metrics.TIP_REQUESTS.labels(source).inc()
+
+
+def get_tip_stats() -> dict:
+    """Counts of tips served by source, plus GPT cache hits/misses."""
+    info = _generate_eco_tip_cached.cache_info()
+    with _TIP_STATS_LOCK:
+        stats = dict(_TIP_STATS)
+    stats["cache_hits"] = info.hits
+    stats["cache_misses"] = info.misses
+    return stats
+
+
+def reset_tip_stats() -> None:
+    with _TIP_STATS_LOCK:
+        for k in _TIP_STATS:
+            _TIP_STATS[k] = 0
 
 # Local factors used only for rules-based fallback logic.
 # These mirror typical factors used elsewhere in the app, but are intentionally local
@@ -38,14 +172,19 @@ LOCAL_CO2_FACTORS = {
     "vegan_kg": 1.5,
 }
 
-def generate_eco_tip(user_data: dict, emissions: float) -> str:
+def generate_eco_tip(user_data: dict, emissions: float, priority: int = PRIORITY_INTERACTIVE, deadline_s: float | None = None) -> str:
     """Public entry point used by the app. Tries GPT with caching and backoff;
     falls back to local rules if key missing or calls fail.
+
+    priority orders requests in the shared rate limiter (interactive before
+    background/batch); if no capacity frees up within deadline_s (default per
+    priority) the local tip is returned straight away.
     """
-    global LAST_TIP_SOURCE
+    _ensure_env()
     if not os.getenv("OPENAI_API_KEY"):
         print("⚠️ OPENAI_API_KEY not set. Using local tip generator.")
-        LAST_TIP_SOURCE = "fallback"
+        _set_tip_source("fallback")
+        _count_tip("fallback")
         return clean_tip(local_tip(user_data, emissions))
 
     # Build a deterministic cache key from user_data
@@ -54,11 +193,24 @@ def generate_eco_tip(user_data: dict, emissions: float) -> str:
     except Exception:
         user_key = str(sorted(user_data.items()))
 
-    tip = _generate_eco_tip_cached(user_key, float(emissions or 0))
+    if deadline_s is None:
+        deadline_s = _default_deadline(priority)
+    token = _REQUEST_CTX.set((priority, deadline_s))
+    missed = _CACHE_MISS.set([False])
+    try:
+        tip = _generate_eco_tip_cached(user_key, float(emissions or 0))
+    except _RateLimited:
+        tip = ""
+    finally:
+        metrics.TIP_CACHE.labels("miss" if _CACHE_MISS.get()[0] else "hit").inc()
+        _CACHE_MISS.reset(missed)
+        _REQUEST_CTX.reset(token)
     if tip:
-        LAST_TIP_SOURCE = "gpt"
+        _set_tip_source("gpt")
+        _count_tip("gpt")
         return clean_tip(tip)
-    LAST_TIP_SOURCE = "fallback"
+    _set_tip_source("fallback")
+    _count_tip("fallback")
     return clean_tip(local_tip(user_data, emissions))
 
 
@@ -80,24 +232,52 @@ def _generate_eco_tip_cached(user_data_key: str, emissions: float) -> str:
         """.strip()
     ).format(user_data_summary=user_data_key, emissions=emissions)
 
+    miss_flag = _CACHE_MISS.get()
+    if miss_flag is not None:
+        miss_flag[0] = True  # only runs on a cache miss
+    priority, deadline_s = _REQUEST_CTX.get()
+    return _call_gpt(prompt, max_tokens=120, priority=priority, deadline_s=deadline_s)
+
+
+def _call_gpt(prompt: str, max_tokens: int, priority: int, deadline_s: float | None) -> str:
+    """Send one chat completion through the shared rate limiter with retries.
+
+    Returns the stripped message text, or "" if every attempt failed. Raises
+    _RateLimited if no rate-limiter capacity frees up before the deadline.
+    """
+    from openai import OpenAIError, RateLimitError
+
     retries = 3
     base_delay = 1.0
+    limiter = get_rate_limiter()
+    deadline = None if deadline_s is None else time.monotonic() + deadline_s
+    # Rough token estimate (~4 chars/token) plus the completion budget
+    est_tokens = len(prompt) // 4 + max_tokens
     for attempt in range(retries):
+        remaining = None if deadline is None else max(0.0, deadline - time.monotonic())
+        if not limiter.acquire(est_tokens, priority=priority, deadline_s=remaining):
+            print("⚠️ GPT rate limit budget exhausted before deadline. Using local tip.")
+            raise _RateLimited()
         try:
-            response = client.chat.completions.create(
+            response = get_client().chat.completions.create(
                 model="gpt-4o-mini",
                 messages=[
                     {"role": "system", "content": "You are a sustainability assistant."},
                     {"role": "user", "content": prompt},
                 ],
-                max_tokens=120,
+                max_tokens=max_tokens,
                 temperature=0.7,
             )
             return (response.choices[0].message.content or "").strip()
         except OpenAIError as e:
             # Retry on OpenAI API errors (rate limit/quota/etc.), then give up
             sleep_s = base_delay * (2 ** attempt)
+            if isinstance(e, RateLimitError):
+                # Back off every caller in this process, not just this one
+                limiter.penalize(sleep_s)
             print(f"⚠️ GPT call failed (attempt {attempt+1}/{retries}): {e}. Retrying in {sleep_s:.1f}s...")
+            if attempt + 1 < retries:
+                metrics.GPT_RETRIES.inc()
             time.sleep(sleep_s)
         except Exception as e:
             print(f"⚠️ Unexpected GPT error: {e}")
@@ -105,6 +285,108 @@ def _generate_eco_tip_cached(user_data_key: str, emissions: float) -> str:
     return ""
 
 
+def _compact_profile(user_data: dict, emissions: float) -> str:
+    """Short one-line profile: only non-zero activities, plus the daily total."""
+    bits = []
+    for k in sorted(user_data.keys()):
+        try:
+            v = float(user_data.get(k) or 0)
+        except (TypeError, ValueError):
+            continue
+        if v > 0:
+            bits.append(f"{k}={v:g}")
+    try:
+        em = float(emissions or 0)
+    except (TypeError, ValueError):
+        em = 0.0
+    return f"{'; '.join(bits) or 'nothing logged'} | total={em:.2f}kg"
+
+
+def _parse_batch_tips(text: str) -> dict:
+    """Parse {"tips": [{"id": n, "tip": "..."}]} (or a bare list) into {id: tip}.
+
+    Tolerates surrounding prose or code fences; returns {} if nothing parses.
+    """
+    if not isinstance(text, str):
+        return {}
+    start_obj, start_list = text.find("{"), text.find("[")
+    starts = [i for i in (start_obj, start_list) if i >= 0]
+    if not starts:
+        return {}
+    start = min(starts)
+    end = max(text.rfind("}"), text.rfind("]"))
+    try:
+        data = json.loads(text[start:end + 1])
+    except ValueError:
+        return {}
+    if isinstance(data, dict):
+        data = data.get("tips", [])
+    out = {}
+    if isinstance(data, list):
+        for item in data:
+            if not isinstance(item, dict):
+                continue
+            try:
+                idx = int(item.get("id"))
+            except (TypeError, ValueError):
+                continue
+            tip = item.get("tip")
+            if isinstance(tip, str) and tip.strip():
+                out[idx] = tip.strip()
+    return out
+
+
+def generate_eco_tips_batch(profiles: list, chunk_size: int = 25, priority: int = PRIORITY_BATCH, deadline_s: float | None = None) -> list[str]:
+    """Generate tips for many (user_data, emissions) profiles with few model calls.
+
+    Profiles are packed chunk_size at a time into one prompt as numbered compact
+    summaries; the model answers with JSON that is parsed back per id. Any item
+    that is missing, unparsable, or whose chunk failed falls back to local_tip.
+    Returns cleaned tips in the same order as profiles.
+    """
+    profiles = list(profiles)
+    tips: list[str] = [""] * len(profiles)
+    _ensure_env()
+    use_gpt = bool(os.getenv("OPENAI_API_KEY"))
+    if deadline_s is None:
+        deadline_s = _default_deadline(priority)
+    chunk_size = max(1, int(chunk_size))
+
+    for offset in range(0, len(profiles), chunk_size):
+        chunk = profiles[offset:offset + chunk_size]
+        parsed = {}
+        if use_gpt:
+            lines = "\n".join(
+                f"{i}. {_compact_profile(ud, em)}" for i, (ud, em) in enumerate(chunk, start=1)
+            )
+            prompt = (
+                """
+                You are a helpful sustainability coach. Below are {n} users' daily activities
+                (amounts per activity) and total CO₂ in kg, one per numbered line.
+
+                {lines}
+
+                For EACH user write one concise, positive, practical tip (1–2 short sentences)
+                that targets their largest CO₂ source.
+                Answer with JSON only, exactly in this shape:
+                {{"tips": [{{"id": 1, "tip": "..."}}, ...]}}
+                """.strip()
+            ).format(n=len(chunk), lines=lines)
+            try:
+                text = _call_gpt(prompt, max_tokens=60 * len(chunk) + 40, priority=priority, deadline_s=deadline_s)
+            except _RateLimited:
+                text = ""
+            parsed = _parse_batch_tips(text)
+            if text and not parsed:
+                print(f"⚠️ Could not parse batch tips for items {offset + 1}-{offset + len(chunk)}; using local tips.")
+        for i, (ud, em) in enumerate(chunk, start=1):
+            tip = parsed.get(i)
+            if not tip:
+                tip = local_tip(ud, float(em or 0))
+            tips[offset + i - 1] = clean_tip(tip)
+    return tips
+
+
 def local_tip(user_data: dict, emissions: float) -> str:
     """
     Simple rules-based fallback that never crashes and gives helpful, actionable tips.
@@ -204,8 +486,21 @@ def clean_tip(tip: str, max_sentences: int = 2) -> str:
     return tip
 
 
-def generate_tip(user_data: dict, emissions: float) -> str:
+@traced()
+def generate_tip(user_data: dict, emissions: float, priority: int = PRIORITY_INTERACTIVE, deadline_s: float | None = None) -> str:
     """Facade used by the UI. Delegates to generate_eco_tip so we keep caching,
     backoff, prompt engineering, and fallback behaviors in one place.
     """
-    return generate_eco_tip(user_data, emissions)
\ No newline at end of file
+    return generate_eco_tip(user_data, emissions, priority=priority, deadline_s=deadline_s)
+
+
+def generate_tip_with_source(user_data: dict, emissions: float, priority: int = PRIORITY_INTERACTIVE, deadline_s: float | None = None) -> tuple[str, str]:
+    """generate_tip plus where the tip came from ("gpt" | "fallback" | "unknown").
+
+    The source is read in the thread that generated the tip, so a job on the
+    shared executor returns its own source rather than LAST_TIP_SOURCE, which
+    any concurrent session may have overwritten by the time the UI reads it.
+    """
+    _TIP_SOURCE.set("unknown")  # executor threads are reused across jobs
+    tip = generate_tip(user_data, emissions, priority=priority, deadline_s=deadline_s)
+    return tip, _TIP_SOURCE.get()
\ No newline at end of file
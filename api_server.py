@@ -0,0 +1,359 @@
+"""
+api_server.py
+
+Lightweight HTTP/JSON API for partner apps, on top of co2_engine, core and
+ai_tips. Built on asyncio streams (no extra dependencies): one event loop
+handles many keep-alive connections, single calculations run inline, and the
+blocking bits (batches, history file I/O, tip generation) run off the loop.
+
+Endpoints (JSON in, JSON out):
+- GET  /health                 -> {"status": "ok"}
+- POST /v1/calculate           {"activity_data": {...}}        -> total, breakdown, categories
+- POST /v1/calculate/batch     {"items": [{...}, ...]}          -> {"results": [...]}
+- GET  /v1/history?limit=N     -> {"rows": [...]} (most recent N >= 1, oldest first)
+- POST /v1/history             {"date": "YYYY-MM-DD", "activity_data": {...}} -> saved total
+- POST /v1/tip                 {"activity_data": {...}, "emissions": optional} -> {"tip": "..."}
+- GET  /metrics                -> Prometheus text format (see metrics.py)
+
+Errors are {"error": "..."} with a 4xx/5xx status. Tips go through the shared
+TipExecutor, so a full queue answers 503 instead of piling up threads.
+
+Usage:
+    python api_server.py --port 8000
+    curl -s localhost:8000/v1/calculate -d '{"activity_data": {"bus_km": 12}}'
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import datetime as dt
+import json
+import threading
+from typing import Dict, Optional, Tuple
+from urllib.parse import parse_qs, urlsplit
+
+import core
+import metrics
+from co2_engine import CO2_FACTORS, calculate_co2, calculate_co2_breakdown
+from utils import normalize_activity_name
+
+MAX_BODY_BYTES = 1 << 20
+MAX_BATCH_ITEMS = 1000
+KEEPALIVE_TIMEOUT_S = 15.0
+
+_REASONS = {
+    200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+    411: "Length Required", 413: "Payload Too Large", 500: "Internal Server Error",
+    503: "Service Unavailable",
+}
+
+
+class ApiError(Exception):
+    """Raised by handlers to answer with a JSON error and the given status."""
+
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+
+# =========================
+# Request handlers (pure, testable without sockets)
+# =========================
+def _activity_data(payload) -> Tuple[Dict[str, float], list]:
+    """Validate an activity mapping; return (known amounts, unknown keys)."""
+    if not isinstance(payload, dict):
+        raise ApiError(400, "activity_data must be a JSON object")
+    known: Dict[str, float] = {}
+    unknown = []
+    bad = []
+    for key, amount in payload.items():
+        name = normalize_activity_name(str(key))
+        if name not in CO2_FACTORS:
+            unknown.append(key)
+            continue
+        try:
+            known[name] = float(amount or 0)
+        except (TypeError, ValueError):
+            bad.append(key)
+    if bad:
+        raise ApiError(400, f"non-numeric amounts: {', '.join(map(str, bad))}")
+    return known, unknown
+
+
+def calculate(payload: dict) -> dict:
+    data, unknown = _activity_data(payload.get("activity_data", payload) if isinstance(payload, dict) else payload)
+    return {
+        "total_kg": calculate_co2(data),
+        "breakdown": calculate_co2_breakdown(data),
+        "categories": core.compute_category_emissions(data),
+        "unknown_keys": unknown,
+    }
+
+
+def calculate_batch(payload: dict) -> dict:
+    items = payload.get("items") if isinstance(payload, dict) else None
+    if not isinstance(items, list):
+        raise ApiError(400, "items must be a JSON array")
+    if len(items) > MAX_BATCH_ITEMS:
+        raise ApiError(413, f"at most {MAX_BATCH_ITEMS} items per batch")
+    results = []
+    for item in items:
+        try:
+            results.append(calculate({"activity_data": item}))
+        except ApiError as e:
+            results.append({"error": e.message})
+    return {"count": len(results), "results": results}
+
+
+def history_rows(limit: Optional[int], path: Optional[str] = None) -> dict:
+    df = core.load_history(path)
+    if df.empty:
+        return {"count": 0, "rows": []}
+    if limit:
+        df = df.sort_values("date").tail(limit)
+    df = df.assign(date=df["date"].dt.strftime("%Y-%m-%d"))
+    rows = json.loads(df.to_json(orient="records"))
+    return {"count": len(rows), "rows": rows}
+
+
+def save_history(payload: dict, path: Optional[str] = None) -> dict:
+    if not isinstance(payload, dict):
+        raise ApiError(400, "body must be a JSON object")
+    try:
+        date_val = dt.date.fromisoformat(str(payload.get("date") or dt.date.today().isoformat()))
+    except ValueError:
+        raise ApiError(400, "date must be YYYY-MM-DD")
+    data, _ = _activity_data(payload.get("activity_data", {}))
+    total = calculate_co2(data)
+    core.save_entry(date_val, data, total, path)
+    return {"date": date_val.isoformat(), "total_kg": total}
+
+
+# =========================
+# HTTP plumbing
+# =========================
+class ApiServer:
+    """asyncio HTTP/1.1 server with keep-alive.
+
+    Use `await serve()` inside an event loop, or start()/stop() (and the context
+    manager) to run it on a background thread, e.g. in tests and benchmarks.
+    """
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, history_path: Optional[str] = None):
+        self.host = host
+        self.port = port
+        self.history_path = history_path
+        self._server: Optional[asyncio.base_events.Server] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+        self._history_lock: Optional[asyncio.Lock] = None
+        self.requests = 0
+
+    @property
+    def base_url(self) -> str:
+        return f"http://{self.host}:{self.port}"
+
+    async def serve(self, ready: Optional[threading.Event] = None) -> None:
+        self._history_lock = asyncio.Lock()
+        self._server = await asyncio.start_server(self._handle_conn, self.host, self.port, limit=MAX_BODY_BYTES)
+        self.port = self._server.sockets[0].getsockname()[1]
+        if ready is not None:
+            ready.set()
+        async with self._server:
+            await self._server.serve_forever()
+
+    def start(self) -> "ApiServer":
+        ready = threading.Event()
+        self._loop = asyncio.new_event_loop()
+
+        def run():
+            loop = self._loop
+            asyncio.set_event_loop(loop)
+            main_task = loop.create_task(self.serve(ready))
+            try:
+                loop.run_until_complete(main_task)
+            except asyncio.CancelledError:
+                pass
+            finally:
+                # Drop open keep-alive connections, then close the loop cleanly
+                pending = asyncio.all_tasks(loop)
+                for task in pending:
+                    task.cancel()
+                loop.run_until_complete(asyncio.gather(*pending, return_exceptions=True))
+                loop.close()
+
+        self._thread = threading.Thread(target=run, name="api-server", daemon=True)
+        self._thread.start()
+        if not ready.wait(timeout=10):
+            raise RuntimeError("API server did not start")
+        return self
+
+    def stop(self) -> None:
+        if self._loop is not None and self._server is not None and not self._loop.is_closed():
+            self._loop.call_soon_threadsafe(self._server.close)
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+
+    def __enter__(self) -> "ApiServer":
+        return self.start()
+
+    def __exit__(self, *exc) -> None:
+        self.stop()
+
+    async def _handle_conn(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            while True:
+                try:
+                    head = await asyncio.wait_for(reader.readuntil(b"\r\n\r\n"), KEEPALIVE_TIMEOUT_S)
+                except (asyncio.IncompleteReadError, asyncio.TimeoutError, ConnectionError):
+                    return
+                except asyncio.LimitOverrunError:
+                    await self._write(writer, 413, {"error": "headers too large"}, keep_alive=False)
+                    return
+                method, target, version, headers = self._parse_head(head)
+                keep_alive = self._wants_keep_alive(version, headers)
+                if headers.get("transfer-encoding"):
+                    await self._write(writer, 411, {"error": "chunked bodies are not supported"}, keep_alive=False)
+                    return
+                try:
+                    length = int(headers.get("content-length") or 0)
+                except ValueError:
+                    length = -1
+                if length < 0:
+                    await self._write(writer, 400, {"error": "invalid Content-Length"}, keep_alive=False)
+                    return
+                if length > MAX_BODY_BYTES:
+                    await self._write(writer, 413, {"error": "body too large"}, keep_alive=False)
+                    return
+                body = await reader.readexactly(length) if length else b""
+                status, payload = await self._dispatch(method, target, body)
+                await self._write(writer, status, payload, keep_alive)
+                if not keep_alive:
+                    return
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        except asyncio.CancelledError:
+            pass  # server shutting down; finish quietly so asyncio doesn't log it
+        finally:
+            writer.close()
+
+    @staticmethod
+    def _parse_head(head: bytes):
+        lines = head.decode("latin-1").split("\r\n")
+        method, target, version = (lines[0].split(" ", 2) + ["", ""])[:3]
+        headers = {}
+        for line in lines[1:]:
+            if ":" in line:
+                k, v = line.split(":", 1)
+                headers[k.strip().lower()] = v.strip()
+        return method.upper(), target, version, headers
+
+    @staticmethod
+    def _wants_keep_alive(version: str, headers: dict) -> bool:
+        conn = headers.get("connection", "").lower()
+        if version == "HTTP/1.0":
+            return conn == "keep-alive"
+        return conn != "close"
+
+    @staticmethod
+    async def _write(writer: asyncio.StreamWriter, status: int, payload, keep_alive: bool) -> None:
+        # str payloads are plain text (the /metrics exposition); everything else is JSON
+        if isinstance(payload, str):
+            data, ctype = payload.encode("utf-8"), metrics.CONTENT_TYPE
+        else:
+            data, ctype = json.dumps(payload).encode("utf-8"), "application/json"
+        head = (
+            f"HTTP/1.1 {status} {_REASONS.get(status, 'OK')}\r\n"
+            f"Content-Type: {ctype}\r\n"
+            f"Content-Length: {len(data)}\r\n"
+            f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n"
+        ).encode("latin-1")
+        writer.write(head + data)
+        await writer.drain()
+
+    async def _dispatch(self, method: str, target: str, body: bytes) -> Tuple[int, object]:
+        self.requests += 1
+        url = urlsplit(target)
+        path = url.path.rstrip("/") or "/"
+        try:
+            payload = json.loads(body) if body else {}
+        except ValueError:
+            return 400, {"error": "invalid JSON body"}
+        try:
+            if path == "/health" and method == "GET":
+                return 200, {"status": "ok"}
+            if path == "/metrics" and method == "GET":
+                return 200, await asyncio.to_thread(metrics.render_text)
+            if path == "/v1/calculate" and method == "POST":
+                return 200, calculate(payload)
+            if path == "/v1/calculate/batch" and method == "POST":
+                # Up to MAX_BATCH_ITEMS calculations: keep them off the loop
+                return 200, await asyncio.to_thread(calculate_batch, payload)
+            if path == "/v1/history" and method == "GET":
+                limit = parse_qs(url.query).get("limit", [""])[0]
+                if limit and not (limit.isascii() and limit.isdigit() and int(limit) > 0):
+                    raise ApiError(400, "limit must be a positive integer")
+                return 200, await asyncio.to_thread(history_rows, int(limit) if limit else None, self.history_path)
+            if path == "/v1/history" and method == "POST":
+                # Serialize writers: save_entry is a read-modify-write of one CSV
+                async with self._history_lock:
+                    return 200, await asyncio.to_thread(save_history, payload, self.history_path)
+            if path == "/v1/tip" and method == "POST":
+                return 200, await self._tip(payload)
+            if path in ("/health", "/metrics", "/v1/calculate", "/v1/calculate/batch", "/v1/history", "/v1/tip"):
+                return 405, {"error": f"{method} not allowed on {path}"}
+            return 404, {"error": f"no route for {path}"}
+        except ApiError as e:
+            return e.status, {"error": e.message}
+        except Exception as e:  # keep the connection usable on handler bugs
+            return 500, {"error": f"{type(e).__name__}: {e}"}
+
+    async def _tip(self, payload: dict) -> dict:
+        # Imported here so the calculate-only path never pays for the tip stack
+        from ai_tips import generate_tip
+        from tip_executor import QueueFullError, get_executor
+
+        if not isinstance(payload, dict):
+            raise ApiError(400, "body must be a JSON object")
+        data, _ = _activity_data(payload.get("activity_data", {}))
+        emissions = payload.get("emissions")
+        try:
+            emissions = calculate_co2(data) if emissions is None else float(emissions)
+        except (TypeError, ValueError):
+            raise ApiError(400, "emissions must be a number")
+        try:
+            fut = get_executor().submit(generate_tip, data, emissions)
+        except QueueFullError:
+            raise ApiError(503, "tip queue is full, retry later")
+        tip = await asyncio.wrap_future(fut)
+        return {"tip": tip, "emissions": emissions}
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description="HTTP/JSON API for emissions and eco tips")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--history", default=None, help="History CSV (default: history.csv next to core.py)")
+    args = parser.parse_args(argv)
+
+    server = ApiServer(args.host, args.port, args.history)
+    metrics.ensure_exporters()
+    ready = threading.Event()
+
+    async def run():
+        task = asyncio.create_task(server.serve(ready))
+        while not ready.is_set():
+            await asyncio.sleep(0.01)
+        print(f"API listening on {server.base_url} (Ctrl+C to stop)", flush=True)
+        await task
+
+    try:
+        asyncio.run(run())
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -1,207 +1,73 @@
 # app.py
 import os
+import json
 import pandas as pd
 import datetime as dt
 import streamlit as st
-import io
-from co2_engine import calculate_co2, CO2_FACTORS, calculate_co2_breakdown
+from streamlit.runtime.scriptrunner import get_script_run_ctx
+from co2_engine import calculate_co2, calculate_co2_breakdown
 from utils import (
     format_emissions as fmt_emissions,
     friendly_message as status_message,
     percentage_change,
 )
-from ai_tips import generate_tip, LAST_TIP_SOURCE
+from ai_tips import generate_tip_with_source
+import perf_log
+from perf_log import get_perf_logger
+from perf_stats import get_perf_aggregator
+from rate_limiter import PRIORITY_BACKGROUND, get_rate_limiter
+from tip_executor import QueueFullError, SessionFutures, TipPrefetcher, get_executor, input_hash
 import time
-import concurrent.futures
-import csv
+from concurrent.futures import TimeoutError as FutureTimeoutError
+import core
+import downsample
+import memprof
+import metrics
+import tracing
+from core import (
+    ALL_KEYS,
+    CATEGORY_MAP,
+    _coerce_float,
+    award_badges,  # noqa: F401
+    badges_from_stats,
+    compute_category_emissions,
+    compute_streak,  # noqa: F401
+    dominant_category_icon,
+    find_invalid_fields,
+    format_summary,
+    has_meaningful_input,
+    should_generate_tip,  # noqa: F401  (re-exported for tests and callers)
+)
+from pdf_report import build_eco_tips_pdf, build_history_report_pdf, pdf_render_stats, render_pdf_async  # noqa: F401
 
-# Set page config first (must be the first Streamlit command)
-st.set_page_config(page_title="Sustainability Tracker", page_icon="🌍", layout="wide")
+# The pure helpers live in core.py / pdf_report.py (importable without Streamlit);
+# this module is the Streamlit shell and re-exports them for existing callers.
+HISTORY_FILE = core.HISTORY_FILE
+# Trend chart windows (days back from the last logged day; None = everything)
+TREND_RANGES = {"30 days": 30, "90 days": 90, "1 year": 365, "All": None}
+HISTORY_PAGE_SIZES = [25, 50, 100, 250]
+# Streamlit 1.52+ accepts a callable as download data and only runs it on click
+DEFERRED_DOWNLOADS = tuple(int(p) for p in st.__version__.split(".")[:2] if p.isdigit()) >= (1, 52)
 
-# =========================
-# Category Mapping & Storage
-# =========================
-CATEGORY_MAP = {
-    "Energy": [
-        "electricity_kwh",
-        "natural_gas_m3",
-        "hot_water_liter",
-        "cold_water_liter",
-        "district_heating_kwh",
-        "propane_liter",
-        "fuel_oil_liter",
-    ],
-    "Transport": [
-        "petrol_liter",
-        "diesel_liter",
-        "bus_km",
-        "train_km",
-        "bicycle_km",
-        "flight_short_km",
-        "flight_long_km",
-    ],
-    "Meals": [
-        "meat_kg",
-        "chicken_kg",
-        "eggs_kg",
-        "dairy_kg",
-        "vegetarian_kg",
-        "vegan_kg",
-    ],
-}
-ALL_KEYS = [k for keys in CATEGORY_MAP.values() for k in keys]
-
-HISTORY_FILE = os.path.join(os.path.dirname(__file__), "history.csv")
 
+def load_history() -> pd.DataFrame:
+    return core.load_history(HISTORY_FILE)
 
-# =========================
-# Helper Functions
-# =========================
-def compute_category_emissions(activity_data: dict) -> dict:
-    result = {}
-    for cat, keys in CATEGORY_MAP.items():
-        subtotal = 0.0
-        for k in keys:
-            amt = float(activity_data.get(k, 0) or 0)
-            factor = CO2_FACTORS.get(k)
-            if factor is not None:
-                subtotal += amt * factor
-        result[cat] = round(subtotal, 2)
-    return result
 
-
-def load_history() -> pd.DataFrame:
-    if os.path.exists(HISTORY_FILE):
-        try:
-            df = pd.read_csv(HISTORY_FILE, parse_dates=["date"])
-            return df
-        except Exception:
-            return pd.DataFrame()
-    return pd.DataFrame()
+def history_csv_data():
+    """Download data for the history CSV: built on click where Streamlit allows it."""
+    if DEFERRED_DOWNLOADS:
+        return lambda: core.history_csv(HISTORY_FILE)
+    return core.history_csv(HISTORY_FILE)
 
 
 def save_entry(date_val: dt.date, activity_data: dict, total: float):
-    df = load_history()
-    row = {"date": pd.to_datetime(date_val)}
-    for k in ALL_KEYS:
-        row[k] = float(activity_data.get(k, 0) or 0)
-    row["total_kg"] = float(total)
-
-    if df.empty:
-        df = pd.DataFrame([row])
-    else:
-        mask = df["date"].dt.date == date_val
-        if mask.any():
-            # Upsert
-            df.loc[mask, list(row.keys())] = list(row.values())
-        else:
-            df = pd.concat([df, pd.DataFrame([row])], ignore_index=True)
-
-    df = df.sort_values("date")
-    df.to_csv(HISTORY_FILE, index=False)
-
-
-def get_yesterday_total(df: pd.DataFrame, date_val: dt.date) -> float:
-    if df.empty:
-        return 0.0
-    yesterday = pd.to_datetime(date_val) - pd.Timedelta(days=1)
-    mask = df["date"].dt.date == yesterday.date()
-    if mask.any():
-        return float(df.loc[mask, "total_kg"].iloc[0])
-    return 0.0
-
-
-def compute_streak(df: pd.DataFrame, date_val: dt.date) -> int:
-    """Compute the current streak of consecutive days up to date_val."""
-    if df.empty:
-        return 0
-
-    # Ensure all dates are datetime.date
-    df_dates = df["date"].dt.date if pd.api.types.is_datetime64_any_dtype(df["date"]) else df["date"]
-    dayset = set(df_dates)
-
-    streak = 0
-    current = date_val
-    while current in dayset:
-        streak += 1
-        current -= dt.timedelta(days=1)
-
-    return streak
-
-
-def award_badges(today_total: float, streak: int, df: pd.DataFrame) -> list:
-    badges = []
-    if not df.empty:
-        badges.append("📅 Consistency: Entries logged!")
-    if today_total < 20:
-        badges.append("🌿 Low Impact Day (< 20 kg)")
-    if streak >= 3:
-        badges.append("🔥 3-Day Streak")
-    if streak >= 7:
-        badges.append("🏆 7-Day Streak")
-    if not df.empty:
-        recent = df.tail(7)
-        avg7 = float(recent["total_kg"].mean()) if not recent.empty else 0.0
-        if avg7 and today_total < 0.9 * avg7:
-            badges.append("📈 10% Better than 7-day avg")
-    return badges
+    core.save_entry(date_val, activity_data, total, HISTORY_FILE)
 
 
 # =========================
 # Helper formatters
 # =========================
-def format_summary(user_data: dict) -> str:
-    """Return a compact, human-friendly summary of today's inputs.
-    Only include fields that are present and > 0 where numeric.
-    """
-    parts: list[str] = []
-    def _num(v):
-        try:
-            return float(v)
-        except Exception:
-            return v
-
-    # Transport
-    if (val := _num(user_data.get("petrol_liter"))) and isinstance(val, float) and val > 0:
-        parts.append(f"🚗 Petrol: {val:.1f} L")
-    if (val := _num(user_data.get("diesel_liter"))) and isinstance(val, float) and val > 0:
-        parts.append(f"🚙 Diesel: {val:.1f} L")
-    if (val := _num(user_data.get("bus_km"))) and isinstance(val, float) and val > 0:
-        parts.append(f"🚌 Bus: {val:.0f} km")
-    if (val := _num(user_data.get("train_km"))) and isinstance(val, float) and val > 0:
-        parts.append(f"🚆 Train: {val:.0f} km")
-    if (val := _num(user_data.get("bicycle_km"))) and isinstance(val, float) and val > 0:
-        parts.append(f"🚴 Bike: {val:.0f} km")
-
-    # Energy
-    if (val := _num(user_data.get("electricity_kwh"))) and isinstance(val, float) and val > 0:
-        parts.append(f"⚡ Electricity: {val:.1f} kWh")
-    if (val := _num(user_data.get("district_heating_kwh"))) and isinstance(val, float) and val > 0:
-        parts.append(f"🔥 District heat: {val:.1f} kWh")
-    if (val := _num(user_data.get("natural_gas_m3"))) and isinstance(val, float) and val > 0:
-        parts.append(f"🏠 Gas: {val:.1f} m³")
-    if (val := _num(user_data.get("hot_water_liter"))) and isinstance(val, float) and val > 0:
-        parts.append(f"🚿 Hot water: {val:.0f} L")
-
-    # Meals
-    meal_bits = []
-    for key, label in [
-        ("meat_kg", "🥩 Meat"),
-        ("chicken_kg", "🍗 Chicken"),
-        ("dairy_kg", "🥛 Dairy"),
-        ("eggs_kg", "🥚 Eggs"),
-        ("vegetarian_kg", "🥗 Veg"),
-        ("vegan_kg", "🌱 Vegan"),
-    ]:
-        val = _num(user_data.get(key))
-        if isinstance(val, float) and val > 0:
-            meal_bits.append(f"{label}: {val:.2f} kg")
-    if meal_bits:
-        parts.append(" | ".join(meal_bits))
-
-    return " | ".join(parts) if parts else "No activities logged yet."
-
-
 def format_summary_html(user_data: dict) -> str:
     """Return an HTML-formatted summary with colored tags. Safe for st.markdown(..., unsafe_allow_html=True)."""
     # Color groups
@@ -268,49 +134,6 @@ def format_summary_html(user_data: dict) -> str:
     return "\n".join(html_parts)
 
 
-def dominant_category_icon(user_data: dict) -> tuple[str, str]:
-    """Return (icon, category_label) for the dominant emitting category.
-    Defaults to neutral if nothing is logged.
-    """
-    try:
-        cat = compute_category_emissions(user_data)
-    except Exception:
-        cat = {}
-    if not cat:
-        return ("💡", "Tip")
-    dom = max(cat.items(), key=lambda x: x[1])[0]
-    icon_map = {"Energy": "⚡", "Transport": "🚗", "Meals": "🥗"}
-    return (icon_map.get(dom, "💡"), dom)
-
-
-# =========================
-# Validation helpers
-# =========================
-def _coerce_float(v):
-    try:
-        return float(v)
-    except Exception:
-        return None
-
-def has_meaningful_input(user_data: dict) -> bool:
-    """True if at least one numeric input is > 0."""
-    for v in user_data.values():
-        fv = _coerce_float(v)
-        if fv is not None and fv > 0:
-            return True
-    return False
-
-def find_invalid_fields(user_data: dict) -> list[str]:
-    """Return keys that are negative or non-numeric when a number is expected."""
-    bad = []
-    for k, v in user_data.items():
-        fv = _coerce_float(v)
-        if fv is None:
-            bad.append(k)
-        elif fv < 0:
-            bad.append(k)
-    return bad
-
 def show_input_warnings(user_data: dict):
     """Render inline warnings grouped by category for any invalid fields.
     This is shown immediately after inputs so users can correct quickly.
@@ -331,19 +154,43 @@ def show_input_warnings(user_data: dict):
                 issues = ", ".join(grouped[cat])
                 st.markdown(f"- <span style='color:#b00020;'>[{cat}] Invalid: {issues}</span>", unsafe_allow_html=True)
 
-def should_generate_tip(user_data: dict) -> bool:
-    """Pure decision helper: return True if inputs are valid and meaningful.
-    This is used by the UI layer and covered by unit tests.
-    """
-    invalid = find_invalid_fields(user_data)
-    if invalid:
-        return False
-    return has_meaningful_input(user_data)
-
 # =========================
 # Streamlit App
 # =========================
 def main():
+    metrics.ensure_exporters()
+    metrics.APP_RERUNS.inc()
+    profile_memory = st.session_state.get("memprof_enabled", False)
+    if profile_memory:
+        memprof.start()
+    try:
+        # Optional per-rerun span tree (Debug → "Trace reruns"); shown on the next rerun
+        if not st.session_state.get("trace_reruns", False):
+            _render_app()
+            return
+        with tracing.trace("rerun") as tr:
+            try:
+                _render_app()
+            finally:
+                st.session_state["last_trace"] = tr
+    finally:
+        if profile_memory:
+            _record_memory()
+
+
+def _record_memory():
+    """Memory report for this rerun, shown in the Debug expander on the next one."""
+    ctx = get_script_run_ctx()
+    session_id = ctx.session_id if ctx is not None else "local"
+    state = {k: v for k, v in st.session_state.items() if k != "memprof_report"}
+    frames = {k: v for k, v in core.history_views(HISTORY_FILE).items() if k != "csv"}
+    st.session_state["memprof_report"] = memprof.rerun_report(session_id, state, frames)
+
+
+def _render_app():
+    # Set page config first (must be the first Streamlit command)
+    st.set_page_config(page_title="Sustainability Tracker", page_icon="🌍", layout="wide")
+
     # Density + header
     # Initialize persisted UI density in session state
     if "density" not in st.session_state:
@@ -550,11 +397,75 @@ def main():
             th = st.slider("Spinner threshold (seconds)", 0.0, 2.0, float(default_th), 0.05)
             st.session_state["spinner_threshold"] = float(th)
             st.checkbox(
-                "Enable performance logging (perf_log.csv)",
+                "Enable performance logging (perf_log.jsonl)",
                 value=st.session_state.get("perf_logging", False),
                 key="perf_logging",
-                help="Append eco-tip generation timings to perf_log.csv",
+                help="Log eco-tip timings and input warnings to perf_log.jsonl (buffered, rotated)",
+            )
+            st.checkbox(
+                "Prefetch tips while editing",
+                value=st.session_state.get("tip_prefetch", False),
+                key="tip_prefetch",
+                help="Apply inputs live and start a background tip once they settle",
+            )
+            pf_debounce = st.slider(
+                "Prefetch debounce (seconds)", 0.2, 3.0,
+                float(st.session_state.get("tip_prefetch_debounce", 0.75)), 0.05,
+            )
+            st.session_state["tip_prefetch_debounce"] = float(pf_debounce)
+            st.caption("Tip executor (process-wide)")
+            st.json(get_executor().stats(), expanded=False)
+            st.caption("OpenAI rate limiter (process-wide)")
+            st.json(get_rate_limiter().stats(), expanded=False)
+            st.caption("PDF rendering (worker processes + cache)")
+            st.json(pdf_render_stats(), expanded=False)
+            st.checkbox(
+                "Trace reruns",
+                value=st.session_state.get("trace_reruns", False),
+                key="trace_reruns",
+                help="Record a span tree per rerun (history, emissions, charts, tips, PDF)",
+            )
+            st.checkbox(
+                "Memory profiling (tracemalloc)",
+                value=st.session_state.get("memprof_enabled", False),
+                key="memprof_enabled",
+                help="Snapshot allocations after every rerun; slows reruns while on. Tracing is process-wide.",
             )
+            if not st.session_state.get("memprof_enabled", False) and memprof.is_enabled():
+                memprof.stop()
+                st.session_state.pop("memprof_report", None)
+            mem_report = st.session_state.get("memprof_report")
+            if mem_report is not None:
+                st.caption("Memory after the previous rerun")
+                if "traced_mb" in mem_report:
+                    mt, mp, ms = st.columns(3)
+                    mt.metric("Traced", f"{mem_report['traced_mb']:.1f} MB")
+                    mp.metric("Peak", f"{mem_report['peak_mb']:.1f} MB")
+                    ms.metric("session_state", f"{mem_report['session_state_bytes'] / 1024:.0f} KB")
+                for title, rows in (
+                    ("Growth since this session's previous rerun", mem_report["growth"]),
+                    ("Top allocation sites", mem_report["top"]),
+                    ("session_state entries", mem_report["session_state"]),
+                    ("History frames", mem_report["frames"]),
+                    ("Sessions in this process", mem_report["sessions"]),
+                ):
+                    if rows:
+                        st.caption(title)
+                        st.dataframe(pd.DataFrame(rows), hide_index=True, use_container_width=True)
+            last_trace = st.session_state.get("last_trace")
+            if last_trace is not None:
+                st.caption("Previous rerun (spans ≥ 0.1 ms)")
+                st.code(tracing.format_tree(last_trace, min_ms=0.1), language=None)
+                tj, tc = st.columns(2)
+                tj.download_button(
+                    "Trace JSON", json.dumps(tracing.to_dict(last_trace), indent=1),
+                    file_name="rerun_trace.json", mime="application/json", key="download_trace_json",
+                )
+                tc.download_button(
+                    "Chrome trace", json.dumps(tracing.to_chrome_trace(last_trace)),
+                    file_name="rerun_trace.chrome.json", mime="application/json", key="download_trace_chrome",
+                    help="Open in chrome://tracing or ui.perfetto.dev",
+                )
             st.markdown(
                 """
                 <a href="#secrets" style="text-decoration:none;">
@@ -719,7 +630,10 @@ def main():
 
     _apply_pending_values_if_any()
 
-    with st.form("daily_input"):
+    # Prefetch mode applies inputs live (no form) so the tip can start as soon
+    # as they settle; otherwise values only apply on "Calculate & Save".
+    live_inputs = bool(st.session_state.get("tip_prefetch", False))
+    with (st.container() if live_inputs else st.form("daily_input")):
         # Inputs grouped in compact expanders (density controlled)
         with st.expander("Energy inputs", expanded=expander_default):
             e1, e2, e3 = st.columns(3)
@@ -768,7 +682,7 @@ def main():
                 vegetarian = st.number_input("Vegetarian (kg)", value=0.0, min_value=0.0, step=0.1, key="in_vegetarian_kg", help="Enter a number ≥ 0")
                 vegan = st.number_input("Vegan (kg)", value=0.0, min_value=0.0, step=0.1, key="in_vegan_kg", help="Enter a number ≥ 0")
 
-        submitted = st.form_submit_button("Calculate & Save")
+        submitted = st.button("Calculate & Save") if live_inputs else st.form_submit_button("Calculate & Save")
 
     # Gather input into a dict compatible with CO2_FACTORS
     user_data = {
@@ -805,14 +719,33 @@ def main():
     # Store for cross-tab visibility (Eco Tips tab)
     st.session_state["emissions_today"] = float(emissions)
 
+    # With live inputs, speculatively start the tip in the background once the
+    # inputs settle, so intermediate edits never reach the model. Form mode
+    # requests the tip at interactive priority below instead.
+    tip_key = input_hash(user_data, emissions)
+    session_futs = st.session_state.get("tip_futures")
+    if not isinstance(session_futs, SessionFutures):
+        session_futs = SessionFutures()
+        st.session_state["tip_futures"] = session_futs
+    prefetcher = st.session_state.get("tip_prefetcher")
+    if not isinstance(prefetcher, TipPrefetcher):
+        prefetcher = TipPrefetcher()
+        st.session_state["tip_prefetcher"] = prefetcher
+    if live_inputs and tip_key not in session_futs:
+        prefetch_delay = float(st.session_state.get("tip_prefetch_debounce", 0.75))
+        prefetcher.schedule(tip_key, generate_tip_with_source, user_data, emissions, priority=PRIORITY_BACKGROUND, delay=prefetch_delay)
+
     # Compute per-activity once for optional breakdown tab
     per_activity = calculate_co2_breakdown(user_data)
 
-    # Load history for KPIs and visuals
-    history_df = load_history()
-    yesterday_total = get_yesterday_total(history_df, selected_date)
+    # Load history for KPIs and visuals (memoized until history or factors change)
+    with tracing.span("history_views"):
+        views = core.history_views(HISTORY_FILE)
+        kpis = core.history_kpis(selected_date, HISTORY_FILE)
+    history_df = views["history"]
+    yesterday_total = kpis["yesterday_total"]
     delta_pct = percentage_change(yesterday_total, emissions)
-    streak = compute_streak(history_df, selected_date)
+    streak = kpis["streak"]
 
     # KPIs (compact)
     c1, c2, c3 = st.columns(3)
@@ -821,8 +754,9 @@ def main():
     c3.metric("Streak", f"{streak} day(s)")
 
     # Tabs for Dashboard and Breakdown
-    tab_dashboard, tab_history, tab_breakdown, tab_tips = st.tabs(["📊 Dashboard", "📜 History", "📉 Breakdown", "💡 Eco Tips"])
+    tab_dashboard, tab_history, tab_breakdown, tab_tips, tab_perf = st.tabs(["📊 Dashboard", "📜 History", "📉 Breakdown", "💡 Eco Tips", "⏱️ Performance"])
 
+    trend_start = None  # set by the trend range selector; also applies to the mini trends
     with tab_dashboard:
         # Two-column layout for compact one-page UI
         left_col, right_col = st.columns([2, 1])
@@ -849,47 +783,32 @@ def main():
                     st.warning(f"Some inputs look invalid (negative or non-numeric): {bad_list}. Please correct them before saving.")
                     # Optional logging
                     if st.session_state.get("perf_logging", False):
-                        log_path = os.path.join(os.getcwd(), "perf_log.csv")
-                        file_exists = os.path.exists(log_path)
-                        try:
-                            with open(log_path, mode="a", newline="", encoding="utf-8") as f:
-                                writer = csv.writer(f)
-                                if not file_exists:
-                                    writer.writerow(["timestamp", "elapsed_s", "emissions_kg"])  # header
-                                writer.writerow([dt.datetime.now().isoformat(), "warning:invalid_inputs", f"{emissions:.4f}"])
-                        except Exception:
-                            pass
+                        get_perf_logger().log(perf_log.EVENT_INVALID_INPUTS, emissions_kg=emissions)
                 elif not has_meaningful_input(user_data):
                     st.warning("No valid input detected – please log at least one activity before saving.")
                     if st.session_state.get("perf_logging", False):
-                        log_path = os.path.join(os.getcwd(), "perf_log.csv")
-                        file_exists = os.path.exists(log_path)
-                        try:
-                            with open(log_path, mode="a", newline="", encoding="utf-8") as f:
-                                writer = csv.writer(f)
-                                if not file_exists:
-                                    writer.writerow(["timestamp", "elapsed_s", "emissions_kg"])  # header
-                                writer.writerow([dt.datetime.now().isoformat(), "warning:no_inputs", f"{emissions:.4f}"])
-                        except Exception:
-                            pass
+                        get_perf_logger().log(perf_log.EVENT_NO_INPUTS, emissions_kg=emissions)
                 else:
                     save_entry(selected_date, user_data, emissions)
                     st.success("Saved.")
 
             # Visualizations (reduced height)
-            history_df = load_history()  # reload after potential save
+            views = core.history_views(HISTORY_FILE)  # new version after a save
+            history_df = views["history"]
             if not history_df.empty:
                 st.caption("Trend (Total kg CO₂)")
-                history_df_display = history_df.copy()
-                history_df_display["date"] = history_df_display["date"].dt.date
-                st.line_chart(history_df_display.set_index("date")["total_kg"], height=trend_height)
+                trend_range = st.radio("Trend range", list(TREND_RANGES), index=len(TREND_RANGES) - 1, horizontal=True, key="trend_range", label_visibility="collapsed")
+                if TREND_RANGES[trend_range] is not None:
+                    trend_start = history_df["date"].max().date() - dt.timedelta(days=TREND_RANGES[trend_range] - 1)
+                # Downsampled to what the chart width can show, cached per history version
+                trend = core.chart_series("total_kg", HISTORY_FILE, start=trend_start, max_points=downsample.points_for_width(2 / 3))
+                with tracing.span("chart.trend", rows=len(trend)):
+                    st.line_chart(trend, height=trend_height)
 
                 # CSV export button
-                csv_buf = io.StringIO()
-                history_df.to_csv(csv_buf, index=False)
                 st.download_button(
                     label="⬇️ Download history CSV",
-                    data=csv_buf.getvalue(),
+                    data=history_csv_data(),
                     file_name="history.csv",
                     mime="text/csv",
                     key="download_history_csv_dashboard",
@@ -898,49 +817,113 @@ def main():
             # Eco tip and status (compact)
             st.caption("Eco tip & status")
             start_time = time.time()
-            placeholder = st.empty()
-            tip = None
-            threshold = float(st.session_state.get("spinner_threshold", 0.3))
-            # Run tip generation in a background thread
-            with concurrent.futures.ThreadPoolExecutor(max_workers=1) as ex:
-                fut = ex.submit(generate_tip, user_data, emissions)
-                spinner_shown = False
-                # Poll until done; when threshold reached, block within spinner context
-                while True:
-                    if fut.done():
-                        tip = fut.result()
-                        break
-                    elapsed_loop = time.time() - start_time
-                    if not spinner_shown and elapsed_loop > threshold:
+
+            def _show_tip(result, elapsed, cache):
+                # result is (tip, source) from generate_tip_with_source, so the
+                # source belongs to this session's tip, not whichever finished last
+                tip, source = result
+                icon, dom_cat = dominant_category_icon(user_data)
+                st.session_state["last_tip"] = tip
+                st.session_state["last_tip_icon"] = icon
+                st.session_state["last_tip_source"] = {"gpt": "GPT", "fallback": "Fallback"}.get(source)
+                st.success(f"{icon} {tip}")
+                st.caption(f"Tip generated in {elapsed:.2f}s")
+                # Optional perf logging, once per tip (the live fragment re-renders it)
+                if st.session_state.get("perf_logging", False) and st.session_state.get("perf_logged_tip") != tip_key:
+                    st.session_state["perf_logged_tip"] = tip_key
+                    get_perf_logger().log(perf_log.EVENT_TIP, duration_s=elapsed, emissions_kg=emissions, cache=cache, tip_source=source)
+
+            tip_cache = {}  # how the tip was obtained, for the perf log
+
+            def _claim_prefetched(wait_for_timer: bool):
+                # Adopt a prefetched future so later reruns reattach to it
+                fut = session_futs.get(tip_key)
+                tip_cache.setdefault("outcome", "session")
+                if fut is None:
+                    fut = prefetcher.claim(tip_key) if wait_for_timer else prefetcher.take(tip_key)
+                    tip_cache["outcome"] = "prefetch" if fut is not None else "miss"
+                    if fut is not None:
+                        session_futs.put(tip_key, fut)
+                return fut
+
+            def _elapsed(fut):
+                # Stamped by the executor when the job finished, so reattaching
+                # on a later rerun does not report the time since that rerun
+                return getattr(fut, "elapsed_s", None) or time.time() - start_time
+
+            if live_inputs and hasattr(st, "fragment"):
+                def _live_tip_future():
+                    fut = _claim_prefetched(wait_for_timer=True)
+                    if fut is None and not prefetcher.is_pending(tip_key):
+                        # Prefetch was dropped (executor saturated): request it directly
+                        try:
+                            fut = session_futs.get_or_submit(tip_key, tracing.bind(generate_tip_with_source), user_data, emissions)
+                        except QueueFullError:
+                            fut = None
+                    return fut
+
+                if submitted:
+                    st.session_state.pop("tip_failed", None)
+                failed = st.session_state.get("tip_failed") == tip_key
+                live_fut = None if failed else _live_tip_future()
+                polling = not failed and (live_fut is None or not live_fut.done())
+
+                # Poll the prefetch without blocking the rerun, but only while
+                # the tip for the current inputs is still pending; an idle
+                # session does not keep refreshing.
+                @st.fragment(run_every=float(st.session_state.get("tip_prefetch_debounce", 0.75)) if polling else None)
+                def _prefetched_tip_card():
+                    fut = None if failed else _live_tip_future()
+                    if polling and fut is not None and fut.done():
+                        # Finish with a full rerun, which redefines the card without run_every
+                        st.rerun()
+                    if failed:
+                        st.warning("Tip generation failed. Change an input or click Calculate & Save to retry.")
+                    elif fut is not None and fut.done():
+                        if fut.exception() is None:
+                            _show_tip(fut.result(), _elapsed(fut), tip_cache.get("outcome"))
+                        else:
+                            # Remember the failure so reruns stop resubmitting it
+                            st.session_state["tip_failed"] = tip_key
+                            st.warning("Tip generation failed. Change an input or click Calculate & Save to retry.")
+                    else:
+                        st.info("⏳ Preparing a tip for your latest inputs...")
+                        if st.session_state.get("last_tip"):
+                            st.caption(f"Previous tip: {st.session_state['last_tip']}")
+
+                _prefetched_tip_card()
+            else:
+                placeholder = st.empty()
+                tip = None
+                threshold = float(st.session_state.get("spinner_threshold", 0.3))
+                # Run tip generation on the shared executor; reruns with the same
+                # inputs reattach to the session's in-flight or completed future.
+                fut = _claim_prefetched(wait_for_timer=False)
+                if fut is None:
+                    try:
+                        fut = session_futs.get_or_submit(tip_key, tracing.bind(generate_tip_with_source), user_data, emissions)
+                    except QueueFullError:
+                        fut = None
+                if fut is None:
+                    # Executor saturated: generate inline rather than fail
+                    tip_cache["outcome"] = "inline"
+                    with placeholder.container():
+                        with st.spinner("Generating eco-tip..."):
+                            tip = generate_tip_with_source(user_data, emissions)
+                else:
+                    try:
+                        tip = fut.result(timeout=threshold)
+                    except FutureTimeoutError:
+                        # Past the threshold: block within spinner context
                         with placeholder.container():
                             with st.spinner("Generating eco-tip..."):
-                                tip = fut.result()  # wait until complete while spinner shows
-                        spinner_shown = True
-                        break
-                    time.sleep(0.05)
-            elapsed = time.time() - start_time
-            icon, dom_cat = dominant_category_icon(user_data)
-            st.session_state["last_tip"] = tip
-            st.session_state["last_tip_icon"] = icon
-            st.success(f"{icon} {tip}")
-            st.caption(f"Tip generated in {elapsed:.2f}s")
-            # Optional perf logging
-            if st.session_state.get("perf_logging", False):
-                log_path = os.path.join(os.getcwd(), "perf_log.csv")
-                file_exists = os.path.exists(log_path)
-                try:
-                    with open(log_path, mode="a", newline="", encoding="utf-8") as f:
-                        writer = csv.writer(f)
-                        if not file_exists:
-                            writer.writerow(["timestamp", "elapsed_s", "emissions_kg"])  # header
-                        writer.writerow([dt.datetime.now().isoformat(), f"{elapsed:.4f}", f"{emissions:.4f}"])
-                except Exception:
-                    pass
+                                tip = fut.result()
+                _show_tip(tip, time.time() - start_time if fut is None else _elapsed(fut), tip_cache.get("outcome"))
             st.success(status_message(emissions))
 
             # Badges (compact list)
             st.caption("Badges")
-            badges = award_badges(emissions, streak, history_df)
+            badges = badges_from_stats(emissions, streak, not history_df.empty, views["avg7"])
             if badges:
                 for b in badges:
                     st.markdown(f"- {b}")
@@ -952,43 +935,18 @@ def main():
             st.divider()
             st.caption("Mini trends by category")
 
-            def _category_series(df: pd.DataFrame, keys: list[str]) -> pd.Series | None:
-                present = [k for k in keys if k in df.columns]
-                if not present:
-                    return None
-                s = pd.Series(0.0, index=df.index)
-                for k in present:
-                    factor = CO2_FACTORS.get(k)
-                    s = s + df[k].fillna(0).astype(float) * factor
-                return s
-
-            def _seven_day_delta(s: pd.Series):
-                if s is None or s.empty:
-                    return None, None
-                s = s.dropna()
-                if len(s) < 2:
-                    return None, None
-                last7 = float(s.iloc[-7:].sum())
-                prev7 = float(s.iloc[-14:-7].sum()) if len(s) >= 14 else 0.0
-                return last7, percentage_change(prev7, last7)
-
-            df_sorted = history_df.sort_values("date").copy()
-            df_sorted_indexed = df_sorted.set_index("date")
-
-            energy_s = _category_series(df_sorted, CATEGORY_MAP["Energy"]) 
-            energy_s = energy_s if (energy_s is not None and not energy_s.empty) else pd.Series(dtype=float)
-            transport_s = _category_series(df_sorted, CATEGORY_MAP["Transport"]) 
-            transport_s = transport_s if (transport_s is not None and not transport_s.empty) else pd.Series(dtype=float)
-            meals_s = _category_series(df_sorted, CATEGORY_MAP["Meals"]) 
-            meals_s = meals_s if (meals_s is not None and not meals_s.empty) else pd.Series(dtype=float)
+            energy_s = views["series"]["Energy"]
+            transport_s = views["series"]["Transport"]
+            meals_s = views["series"]["Meals"]
 
             mini_height = 120 if density == "Compact" else 160
+            mini_points = downsample.points_for_width(1 / 3)
             c_en, c_tr, c_me = st.columns(3)
             with c_en:
                 st.markdown("**Energy**")
                 if not energy_s.empty:
-                    st.line_chart(energy_s.set_axis(df_sorted_indexed.index), height=mini_height)
-                    en_last7, en_pct = _seven_day_delta(energy_s)
+                    st.line_chart(core.chart_series("Energy", HISTORY_FILE, start=trend_start, max_points=mini_points), height=mini_height)
+                    en_last7, en_pct = views["deltas"]["Energy"]
                     if en_last7 is not None:
                         st.metric("7d total", f"{en_last7:.2f} kg", f"{en_pct:.1f}%", delta_color="inverse")
                     else:
@@ -998,8 +956,8 @@ def main():
             with c_tr:
                 st.markdown("**Transport**")
                 if not transport_s.empty:
-                    st.line_chart(transport_s.set_axis(df_sorted_indexed.index), height=mini_height)
-                    tr_last7, tr_pct = _seven_day_delta(transport_s)
+                    st.line_chart(core.chart_series("Transport", HISTORY_FILE, start=trend_start, max_points=mini_points), height=mini_height)
+                    tr_last7, tr_pct = views["deltas"]["Transport"]
                     if tr_last7 is not None:
                         st.metric("7d total", f"{tr_last7:.2f} kg", f"{tr_pct:.1f}%", delta_color="inverse")
                     else:
@@ -1009,8 +967,8 @@ def main():
             with c_me:
                 st.markdown("**Meals**")
                 if not meals_s.empty:
-                    st.line_chart(meals_s.set_axis(df_sorted_indexed.index), height=mini_height)
-                    me_last7, me_pct = _seven_day_delta(meals_s)
+                    st.line_chart(core.chart_series("Meals", HISTORY_FILE, start=trend_start, max_points=mini_points), height=mini_height)
+                    me_last7, me_pct = views["deltas"]["Meals"]
                     if me_last7 is not None:
                         st.metric("7d total", f"{me_last7:.2f} kg", f"{me_pct:.1f}%", delta_color="inverse")
                     else:
@@ -1020,21 +978,44 @@ def main():
 
     with tab_history:
         st.header("Saved History")
-        history_all = load_history()
+        views = core.history_views(HISTORY_FILE)
+        history_all = views["history"]
         if history_all.empty:
             st.info("No entries yet. Click Calculate & Save on the Dashboard to start your history.")
         else:
-            st.caption("All logged entries (most recent shown first)")
-            display_df = history_all.copy()
-            display_df["date"] = display_df["date"].dt.date
-            st.dataframe(display_df.sort_values("date", ascending=False), use_container_width=True, height=per_activity_height)
+            # Filters and paging run against the cached sorted frame; only the visible page is copied
+            f_range, f_cols, f_size = st.columns([2, 3, 1])
+            with f_range:
+                date_range = st.date_input("Date range", value=(), key="history_filter_range", help="Leave empty to show all dates.")
+            with f_cols:
+                shown_cols = st.multiselect("Columns", [c for c in views["sorted"].columns if c != "date"], key="history_columns", placeholder="All columns")
+            with f_size:
+                page_size = st.selectbox("Rows per page", HISTORY_PAGE_SIZES, index=1, key="history_page_size")
+            range_start = date_range[0] if len(date_range) > 0 else None
+            range_end = date_range[1] if len(date_range) > 1 else None
+            total_rows = core.count_history(HISTORY_FILE, range_start, range_end)
+            n_pages = max(1, -(-total_rows // page_size))
+            # Back to the first page when the filter changes; clamp when the range shrinks
+            filter_sig = (range_start, range_end, page_size)
+            if st.session_state.get("_history_filter_sig") != filter_sig:
+                st.session_state["_history_filter_sig"] = filter_sig
+                st.session_state["history_page"] = 1
+            elif st.session_state.get("history_page", 1) > n_pages:
+                st.session_state["history_page"] = n_pages
+            page_no = st.number_input("Page", min_value=1, max_value=n_pages, step=1, key="history_page")
+            with tracing.span("history.page", rows=total_rows):
+                result = core.history_page(HISTORY_FILE, range_start, range_end, columns=shown_cols or None, page=page_no, page_size=page_size)
+            if total_rows:
+                first_row = (result["page"] - 1) * page_size + 1
+                st.caption(f"Rows {first_row:,}–{first_row + len(result['rows']) - 1:,} of {total_rows:,} (page {result['page']:,} of {n_pages:,}, most recent first)")
+                st.dataframe(result["rows"], use_container_width=True, hide_index=True, height=per_activity_height)
+            else:
+                st.info("No entries in the selected date range.")
 
             # CSV export
-            csv_buf = io.StringIO()
-            history_all.to_csv(csv_buf, index=False)
             st.download_button(
                 label="⬇️ Download history CSV",
-                data=csv_buf.getvalue(),
+                data=history_csv_data(),
                 file_name="history.csv",
                 mime="text/csv",
                 key="download_history_csv_history_tab",
@@ -1057,7 +1038,7 @@ def main():
         st.caption(f"Get a personalized tip based on today’s inputs and total emissions. Dominant today: {dom_hdr}.")
 
         # API source badge (GPT vs Fallback)
-        source = st.session_state.get("last_tip_source") or ("GPT" if LAST_TIP_SOURCE == "gpt" else ("Fallback" if LAST_TIP_SOURCE == "fallback" else "Unknown"))
+        source = st.session_state.get("last_tip_source") or "Unknown"
         badge_color = "#16a34a" if source == "GPT" else ("#6b7280" if source == "Fallback" else "#9ca3af")
         st.markdown(f"<div style='display:inline-block;padding:2px 8px;border-radius:12px;background:{badge_color};color:white;font-size:0.85em;'>AI source: {source}</div>", unsafe_allow_html=True)
 
@@ -1116,7 +1097,14 @@ def main():
                     "Include sparklines",
                     value=st.session_state.get("pdf_include_spark", True),
                     key="pdf_include_spark",
-                    help="Include 7-day per-category mini charts",
+                    help="Include per-category mini charts",
+                )
+                pdf_spark_window = st.selectbox(
+                    "Sparkline window (days)",
+                    options=[7, 30, 90, 365],
+                    index=[7, 30, 90, 365].index(int(st.session_state.get("pdf_spark_window", 7))),
+                    key="pdf_spark_window",
+                    help="Last N logged days shown in the sparklines",
                 )
             cT1, cT2 = st.columns(2)
             with cT1:
@@ -1143,24 +1131,12 @@ def main():
 
         if st.button("Generate Eco Tips PDF (beta)"):
             tip_for_pdf = st.session_state.get("last_tip", "")
-            src_label = st.session_state.get("last_tip_source") or ("GPT" if LAST_TIP_SOURCE == "gpt" else ("Fallback" if LAST_TIP_SOURCE == "fallback" else "Unknown"))
+            src_label = st.session_state.get("last_tip_source") or "Unknown"
             date_str = selected_date.isoformat() if isinstance(selected_date, (dt.date, dt.datetime)) else str(selected_date)
-            # Prepare 7-day per-category sparkline data from history
-            spark = {}
+            # Per-category sparkline data: a tail slice of the cached daily frame
             try:
-                _hist = load_history()
-                if not _hist.empty:
-                    dfh = _hist.copy()
-                    dfh["date"] = pd.to_datetime(dfh["date"]).dt.date
-                    last_dates = sorted(dfh["date"].unique())[-7:]
-                    for d in last_dates:
-                        row = dfh[dfh["date"] == d]
-                        if row.empty:
-                            continue
-                        rdict = {k: float(row.iloc[-1].get(k, 0) or 0) for k in ALL_KEYS if k in row.columns}
-                        cat_vals = compute_category_emissions(rdict)
-                        for cat, val in cat_vals.items():
-                            spark.setdefault(cat, []).append(float(val))
+                _views = core.history_views(HISTORY_FILE)
+                spark = core.build_spark_data(_views["history"], pdf_spark_window, daily=_views["daily"])
             except Exception:
                 spark = {}
             # Prefer uploaded logo; fallback to project's logo.png path if present
@@ -1175,284 +1151,148 @@ def main():
                             logo_bytes = lf.read()
                     except Exception:
                         logo_bytes = None
-            pdf_bytes, err = build_eco_tips_pdf(
-                summary_str, tip_for_pdf, em_today, date_str, src_label, per_activity, compute_category_emissions(user_data), {
-                "today_total": fmt_emissions(em_today),
-                "yesterday_total": fmt_emissions(yesterday_total) if 'yesterday_total' in locals() else "",
-                "delta_pct": f"{percentage_change(yesterday_total, em_today):.2f}%" if 'yesterday_total' in locals() else "",
-                "streak_days": f"{streak} days" if 'streak' in locals() else "",
-            }, logo_bytes=logo_bytes, title_text=pdf_title, primary_color=pdf_primary_color, include_pie=bool(pdf_include_pie), include_sparklines=bool(pdf_include_spark), spark_data=spark, footer_text=pdf_footer_text if pdf_include_footer else None, margins_cm={"side": float(pdf_side_margin), "top": float(pdf_top_margin), "bottom": float(pdf_bottom_margin)}, text_hex=pdf_text_color, chart_bg_hex=pdf_chart_bg)
-            if pdf_bytes:
-                st.download_button(
-                    label=" Download Eco Tips PDF",
-                    data=pdf_bytes,
-                    file_name=f"eco_tips_{date_str}.pdf",
-                    mime="application/pdf",
-                    key="download_eco_tips_pdf",
-                )
+            pdf_kwargs = dict(
+                summary_text=summary_str, tip_text=tip_for_pdf, emissions=em_today, date_str=date_str, source_label=src_label,
+                per_activity=per_activity, per_category=compute_category_emissions(user_data), kpis={
+                    "today_total": fmt_emissions(em_today),
+                    "yesterday_total": fmt_emissions(yesterday_total) if 'yesterday_total' in locals() else "",
+                    "delta_pct": f"{percentage_change(yesterday_total, em_today):.2f}%" if 'yesterday_total' in locals() else "",
+                    "streak_days": f"{streak} days" if 'streak' in locals() else "",
+                }, logo_bytes=logo_bytes, title_text=pdf_title, primary_color=pdf_primary_color, include_pie=bool(pdf_include_pie), include_sparklines=bool(pdf_include_spark), spark_data=spark, spark_window_days=int(pdf_spark_window), footer_text=pdf_footer_text if pdf_include_footer else None, margins_cm={"side": float(pdf_side_margin), "top": float(pdf_top_margin), "bottom": float(pdf_bottom_margin)}, text_hex=pdf_text_color, chart_bg_hex=pdf_chart_bg,
+            )
+            # Rendered in a worker process; identical inputs come straight from the PDF cache
+            with tracing.span("pdf.submit"):
+                st.session_state["pdf_job"] = {"future": render_pdf_async(**pdf_kwargs), "date_str": date_str, "started": time.time()}
+
+        pdf_job = st.session_state.get("pdf_job")
+        if pdf_job is not None:
+            if pdf_job["future"].done():
+                pdf_bytes, err = pdf_job["future"].result()
+                if pdf_bytes:
+                    st.download_button(
+                        label=" Download Eco Tips PDF",
+                        data=pdf_bytes,
+                        file_name=f"eco_tips_{pdf_job['date_str']}.pdf",
+                        mime="application/pdf",
+                        key="download_eco_tips_pdf",
+                    )
+                else:
+                    st.error(err or "PDF generation failed.")
             else:
-                st.error(err or "PDF generation failed.")
-
-def build_eco_tips_pdf(summary_text: str, tip_text: str, emissions: float, date_str: str, source_label: str, per_activity: dict | None, per_category: dict | None, kpis: dict | None, logo_bytes: bytes | None = None, title_text: str | None = None, primary_color: str | None = None, include_pie: bool = True, include_sparklines: bool = True, spark_data: dict | None = None, footer_text: str | None = None, margins_cm: dict | None = None, text_hex: str | None = None, chart_bg_hex: str | None = None) -> tuple[bytes | None, str | None]:
-    """Build a simple landscape PDF with today's summary, tip, and optional per-activity table.
-    Returns (pdf_bytes, error_message). If error_message is not None, generation failed.
-    """
-    try:
-        # Lazy import so the app runs even if reportlab isn't installed
-        from reportlab.pdfgen import canvas
-        from reportlab.lib.pagesizes import A4, landscape
-        from reportlab.lib.units import cm
-        from reportlab.lib.utils import simpleSplit, ImageReader
-        from reportlab.lib.colors import HexColor
-    except Exception as e:
-        return None, f"ReportLab not available: {e}. Install with: pip install reportlab"
-
-    # Try to import matplotlib for basic charts (optional)
-    mpl_ok = True
-    try:
-        import matplotlib.pyplot as plt
-    except Exception:
-        mpl_ok = False
-
-    try:
-        buf = io.BytesIO()
-        page_size = landscape(A4)
-        c = canvas.Canvas(buf, pagesize=page_size)
-        width, height = page_size
-        # Margins
-        side_m = (margins_cm or {}).get("side", 2.0) * cm
-        top_m = (margins_cm or {}).get("top", 2.0) * cm
-        bottom_m = (margins_cm or {}).get("bottom", 1.8) * cm
-        left = side_m
-        right = width - side_m
-
-        # Colors
-        try:
-            if text_hex:
-                c.setFillColor(HexColor(text_hex))
-        except Exception:
-            pass
-
-        # Footer helper
-        def _draw_footer():
-            if footer_text:
-                c.setFont("Helvetica", 9)
-                # Text color
-                try:
-                    if text_hex:
-                        c.setFillColor(HexColor(text_hex))
-                except Exception:
-                    c.setFillColorRGB(0, 0, 0)
-                c.drawString(left, bottom_m - 0.4*cm, footer_text)
-                try:
-                    c.drawRightString(right, bottom_m - 0.4*cm, f"Page {c.getPageNumber()}")
-                except Exception:
-                    pass
+                @st.fragment(run_every=0.5)
+                def _pdf_progress():
+                    if pdf_job["future"].done():
+                        st.rerun()
+                    # Progress is an estimate from the average render time so far
+                    eta = pdf_render_stats()["avg_render_s"] or 2.0
+                    elapsed = time.time() - pdf_job["started"]
+                    st.progress(min(0.95, elapsed / eta), text=f"Rendering PDF… {elapsed:.1f}s")
+
+                _pdf_progress()
+
+        # Long-range history report: months/years of entries, streamed from the history file
+        st.caption("History report (PDF, any date range)")
+        hist_days = views["history"]["date"] if not views["history"].empty else None
+        if hist_days is None:
+            st.info("Log some entries to build a history report.")
+        else:
+            first_day, last_day = hist_days.min().date(), hist_days.max().date()
+            report_range = st.date_input(
+                "Report range",
+                value=(first_day, last_day),
+                min_value=first_day,
+                max_value=last_day,
+                key="history_report_range",
+            )
+            if st.button("Generate history report PDF"):
+                if isinstance(report_range, (tuple, list)) and len(report_range) == 2:
+                    range_start, range_end = report_range
+                else:
+                    range_start = range_end = report_range[0] if isinstance(report_range, (tuple, list)) else report_range
+                report_kwargs = dict(
+                    history_path=HISTORY_FILE, start=range_start, end=range_end,
+                    title_text=f"Emissions history {range_start} to {range_end}",
+                    primary_color=pdf_primary_color, text_hex=pdf_text_color, chart_bg_hex=pdf_chart_bg,
+                    footer_text=pdf_footer_text if pdf_include_footer else None,
+                )
+                st.session_state["history_report_job"] = {
+                    "future": render_pdf_async(builder=build_history_report_pdf, cache_extra=core.history_version(HISTORY_FILE), **report_kwargs),
+                    "name": f"history_{range_start}_{range_end}.pdf",
+                    "started": time.time(),
+                }
 
-        # Page break helper
-        def _show_page():
-            _draw_footer()
-            c.showPage()
-            # Reset text color after page break
-            try:
-                if text_hex:
-                    c.setFillColor(HexColor(text_hex))
-            except Exception:
-                c.setFillColorRGB(0, 0, 0)
-
-        # Title
-        y = height - top_m
-        c.setTitle("Eco Tips Summary")
-        # Slightly larger heading for better hierarchy
-        c.setFont("Helvetica-Bold", 19)
-        # Optional logo (bytes) on the left and custom title/color
-        draw_title = title_text or "Sustainability Tracker — Eco Tips Summary"
-        try:
-            if primary_color:
-                c.setFillColor(HexColor(primary_color))
-        except Exception:
-            pass
-        try:
-            if logo_bytes:
-                img = ImageReader(io.BytesIO(logo_bytes))
-                c.drawImage(img, left, y-0.5*cm, width=2.2*cm, height=2.2*cm, preserveAspectRatio=True, mask='auto')
-                c.drawString(left + 2.5*cm, y, draw_title)
-            else:
-                # Vector fallback badge (no file needed)
-                try:
-                    # Colored rounded rect badge
-                    if primary_color:
-                        c.setFillColor(HexColor(primary_color))
-                    c.roundRect(left, y-0.5*cm, 2.2*cm, 2.2*cm, 0.3*cm, fill=1, stroke=0)
-                    # Badge initials
-                    c.setFillColorRGB(1, 1, 1)
-                    c.setFont("Helvetica-Bold", 14)
-                    c.drawCentredString(left + 1.1*cm, y + 0.5*cm, "ST")
-                except Exception:
-                    pass
-                # Title next to badge
-                c.setFillColorRGB(0, 0, 0)
-                c.drawString(left + 2.5*cm, y, draw_title)
-        except Exception:
-            c.drawString(left, y, draw_title)
-        
-        # Reset text color for body
-        try:
-            if text_hex:
-                c.setFillColor(HexColor(text_hex))
+            report_job = st.session_state.get("history_report_job")
+            if report_job is not None:
+                if report_job["future"].done():
+                    report_bytes, report_err = report_job["future"].result()
+                    if report_bytes:
+                        st.download_button(
+                            label=" Download history report PDF",
+                            data=report_bytes,
+                            file_name=report_job["name"],
+                            mime="application/pdf",
+                            key="download_history_report_pdf",
+                        )
+                    else:
+                        st.error(report_err or "History report generation failed.")
+                else:
+                    @st.fragment(run_every=0.5)
+                    def _report_progress():
+                        if report_job["future"].done():
+                            st.rerun()
+                        st.caption(f"Rendering history report… {time.time() - report_job['started']:.1f}s")
+
+                    _report_progress()
+
+    with tab_perf:
+        # A fragment, so Refresh reruns only this panel; other reruns reuse the
+        # shared aggregator's state instead of flushing and re-reading the log.
+        @st.fragment
+        def _perf_panel():
+            st.subheader("Tip latency (perf log)")
+            st.caption("Read incrementally from perf_log.jsonl: each refresh parses only new lines. Enable logging under Debug (performance).")
+            agg = get_perf_aggregator(perf_log.perf_log_path())
+            new_lines = 0
+            if st.button("🔄 Refresh", key="perf_refresh") or not st.session_state.get("perf_loaded"):
+                if st.session_state.get("perf_logging", False):
+                    # Only a logging session has queued lines (and a writer thread) to flush
+                    get_perf_logger().flush(timeout=0.5)
+                new_lines = agg.refresh()
+                st.session_state["perf_loaded"] = True
+            perf = agg.summary()
+            if not perf["tips"]:
+                st.info("No tip events logged yet.")
             else:
-                c.setFillColorRGB(0, 0, 0)
-        except Exception:
-            c.setFillColorRGB(0, 0, 0)
-        y -= 0.4*cm
-
-        # Meta line
-        c.setFont("Helvetica", 11)
-        c.drawString(left, y, f"Date: {date_str}    Total: {fmt_emissions(float(emissions))}    AI source: {source_label}")
-        y -= 0.8*cm
-
-        # KPI line (if provided)
-        if isinstance(kpis, dict):
-            c.setFont("Helvetica-Bold", 12)
-            c.drawString(left, y, "Key metrics:")
-            y -= 0.6*cm
-            c.setFont("Helvetica", 10.5)
-            for label in ["today_total", "yesterday_total", "delta_pct", "streak_days"]:
-                if label in kpis:
-                    c.drawString(left, y, f"- {label.replace('_',' ').title()}: {kpis[label]}")
-                    y -= 0.48*cm
-                    if y < bottom_m + 2*cm:
-                        _show_page(); y = height - top_m
-
-        # 7-day sparklines per category (if provided)
-        if include_sparklines and mpl_ok and isinstance(spark_data, dict) and spark_data:
-            try:
-                # Arrange small charts in a grid
-                cols = 3
-                cell_w, cell_h = 8*cm, 3*cm
-                c.setFont("Helvetica-Bold", 12)
-                c.drawString(left, y, "7-day category trends:")
-                y -= 0.6*cm
-                x0, y0 = left, y
-                i = 0
-                for cat, series in spark_data.items():
-                    fig, ax = plt.subplots(figsize=(cell_w/96, cell_h/96), dpi=96)
-                    # Theme-aware chart styling
-                    if chart_bg_hex:
-                        try:
-                            fig.patch.set_facecolor(chart_bg_hex)
-                            ax.set_facecolor(chart_bg_hex)
-                        except Exception:
-                            pass
-                    ax.plot(series, color=(primary_color or "#2563eb"))
-                    ax.set_title(cat, fontsize=8, color=(text_hex or "#000000"))
-                    ax.tick_params(colors=(text_hex or "#000000"))
-                    for spine in ax.spines.values():
-                        spine.set_color(text_hex or "#000000")
-                    ax.set_xticks([]); ax.set_yticks([])
-                    ax.grid(True, alpha=0.2)
-                    img_b = io.BytesIO()
-                    plt.tight_layout()
-                    fig.savefig(img_b, format='png', dpi=150)
-                    plt.close(fig)
-                    img_b.seek(0)
-                    col = i % cols
-                    row = i // cols
-                    x = x0 + col * (cell_w + 0.5*cm)
-                    y_img = y0 - row * (cell_h + 0.5*cm)
-                    if y_img - cell_h < bottom_m + 1.5*cm:
-                        _show_page(); width, height = page_size; y_img = height - top_m - 1*cm; x0 = left; y0 = y_img
-                        row = 0; col = 0; x = x0; y_img = y0
-                    c.drawImage(img_b, x, y_img - cell_h, width=cell_w, height=cell_h, preserveAspectRatio=True, mask='auto')
-                    i += 1
-                y = y_img - cell_h - 0.8*cm
-            except Exception:
-                pass
-
-        # Summary block
-        c.setFont("Helvetica-Bold", 12.5)
-        c.drawString(left, y, "Today's Summary:")
-        y -= 0.6*cm
-        c.setFont("Helvetica", 11)
-        for line in simpleSplit(summary_text or "", "Helvetica", 11, width - 4*cm):
-            c.drawString(left, y, line)
-            y -= 0.5*cm
-            if y < bottom_m + 2*cm:
-                _show_page(); y = height - top_m
-
-        # Tip block
-        y -= 0.2*cm
-        c.setFont("Helvetica-Bold", 12.5)
-        c.drawString(left, y, "Personalized Tip:")
-        y -= 0.6*cm
-        c.setFont("Helvetica", 11)
-        for line in simpleSplit(tip_text or "", "Helvetica", 11, width - 4*cm):
-            c.drawString(left, y, line)
-            y -= 0.5*cm
-            if y < bottom_m + 2*cm:
-                _show_page(); y = height - top_m
-
-        # Per-category breakdown and pie chart (if provided)
-        if per_category:
-            y -= 0.2*cm
-            c.setFont("Helvetica-Bold", 12)
-            c.drawString(left, y, "Per-category (kg CO₂):")
-            y -= 0.6*cm
-            c.setFont("Helvetica", 11)
-            for k, v in sorted(per_category.items(), key=lambda x: x[1], reverse=True):
-                c.drawString(left, y, f"{k}: {float(v):.2f}")
-                y -= 0.45*cm
-                if y < bottom_m + 6*cm:
-                    break
-            if include_pie and mpl_ok:
-                try:
-                    fig, ax = plt.subplots(figsize=(4, 3))
-                    labels = list(per_category.keys())
-                    values = [float(v) for v in per_category.values()]
-                    if sum(values) > 0:
-                        if chart_bg_hex:
-                            try:
-                                fig.patch.set_facecolor(chart_bg_hex)
-                                ax.set_facecolor(chart_bg_hex)
-                            except Exception:
-                                pass
-                        ax.pie(values, labels=labels, autopct='%1.1f%%', startangle=140, textprops={'fontsize': 8, 'color': (text_hex or '#000000')}, colors=None)
-                        for text in ax.texts:
-                            text.set_color(text_hex or "#000000")
-                        ax.axis('equal')
-                        img_buf = io.BytesIO()
-                        plt.tight_layout()
-                        fig.savefig(img_buf, format='png', dpi=150)
-                        plt.close(fig)
-                        img_buf.seek(0)
-                        img_width = 10*cm
-                        img_height = 7*cm
-                        c.drawImage(img_buf, right - img_width, y + 0.5*cm, width=img_width, height=img_height, preserveAspectRatio=True, mask='auto')
-                        y -= img_height + 0.5*cm
-                except Exception:
-                    pass
-
-        # Per-activity table (if provided)
-        if per_activity:
-            y -= 0.2*cm
-            c.setFont("Helvetica-Bold", 12)
-            c.drawString(left, y, "Per-activity emissions (kg CO₂):")
-            y -= 0.6*cm
-            c.setFont("Helvetica", 11)
-            for k, v in sorted(per_activity.items(), key=lambda x: x[1], reverse=True):
-                c.drawString(left, y, f"{k}: {float(v):.2f}")
-                y -= 0.45*cm
-                if y < bottom_m + 2*cm:
-                    _show_page(); y = height - top_m
-
-        _show_page()
-        c.save()
-        pdf_bytes = buf.getvalue()
-        buf.close()
-        return pdf_bytes, None
-    except Exception as e:
-        return None, f"Failed to build PDF: {e}"
+                m1, m2, m3, m4 = st.columns(4)
+                m1.metric("Tips logged", f"{perf['tips']:,}", f"+{new_lines:,} lines" if new_lines else None)
+                m2.metric("p50", f"{perf['p50_s'] * 1000:.0f} ms")
+                m3.metric("p90", f"{perf['p90_s'] * 1000:.0f} ms")
+                m4.metric("p99", f"{perf['p99_s'] * 1000:.0f} ms")
+
+                timeline = pd.DataFrame(agg.timeline())
+                if len(timeline) > 1:
+                    st.caption(f"Latency percentiles per {agg.bucket_s // 60}-minute bucket (seconds)")
+                    timeline["time"] = pd.to_datetime(timeline["ts"], unit="s")
+                    st.line_chart(timeline.set_index("time")[["p50_s", "p90_s", "p99_s"]], height=220)
+
+                src_col, cache_col = st.columns(2)
+                with src_col:
+                    st.caption("Tip source")
+                    st.bar_chart(pd.Series(perf["tip_sources"], name="tips"), height=180)
+                with cache_col:
+                    st.caption("Cache outcome (session/prefetch = reused, miss = generated)")
+                    st.bar_chart(pd.Series(perf["cache"], name="tips"), height=180)
+
+                st.caption("Slowest tips")
+                slow = pd.DataFrame(agg.slowest())
+                slow["time"] = pd.to_datetime(slow["ts"], unit="s")
+                st.dataframe(slow[["time", "duration_s", "emissions_kg", "cache", "tip_source"]], use_container_width=True, hide_index=True)
+            if perf["events"]:
+                st.caption("Events by type")
+                st.json(perf["events"], expanded=False)
+
+        _perf_panel()
 
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,269 @@
+"""
+batch_reports.py
+
+Render a PDF summary per (user, date range), e.g. the monthly report mail-out.
+
+The parent loads each history file once and turns every job into a small
+payload: range totals, per-category and per-activity sums, daily sparkline
+values and a local tip. Payloads are rendered in a process pool. Each worker
+decodes the logo into one ReportLab ImageReader and keeps the branding in its
+initializer, so neither is rebuilt per document. Chart PNGs are reused through
+pdf_report's chart cache.
+
+PDFs are written atomically (temp file + rename). Re-running the same job list
+skips documents that already exist, so an interrupted run can simply be
+restarted; pass --force to re-render.
+
+Jobs come from --jobs (CSV or JSON list with user_id, start, end and an
+optional history path) or from --users/--start/--end. When a history file has
+a user_id column, it is split per user in one pass; otherwise the whole file is
+that user's history. A document that fails to render is reported and the rest
+of the batch carries on.
+
+Examples:
+    python batch_reports.py --jobs january.csv --out reports/2025-01 --workers 4
+    python batch_reports.py --users alice,bob --start 2025-01-01 --end 2025-01-31 --history history.csv
+"""
+
+from __future__ import annotations
+
+import argparse
+import csv
+import datetime as dt
+import io
+import json
+import os
+import re
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional
+
+import pandas as pd
+
+import core
+from ai_tips import clean_tip, local_tip
+from co2_engine import CO2_FACTORS, calculate_co2_breakdown
+from utils import format_emissions as fmt_emissions
+
+DEFAULT_TITLE = "Sustainability Tracker — Monthly Summary"
+
+# Per-worker state set by _init_worker
+_WORKER: Dict[str, object] = {}
+
+
+def load_jobs(path: str) -> List[dict]:
+    """Read jobs from a CSV (header: user_id,start,end[,history]) or JSON list."""
+    with open(path, encoding="utf-8") as f:
+        if path.lower().endswith(".json"):
+            jobs = json.load(f)
+        else:
+            jobs = list(csv.DictReader(f))
+    return [
+        {
+            "user_id": str(j["user_id"]),
+            "start": dt.date.fromisoformat(str(j["start"])),
+            "end": dt.date.fromisoformat(str(j["end"])),
+            "history": j.get("history") or None,
+        }
+        for j in jobs
+    ]
+
+
+def output_name(job: dict) -> str:
+    safe_user = re.sub(r"[^A-Za-z0-9_.-]+", "_", job["user_id"]).strip("_") or "user"
+    return f"{safe_user}_{job['start'].isoformat()}_{job['end'].isoformat()}.pdf"
+
+
+def build_payload(job: dict, history: pd.DataFrame) -> dict:
+    """Everything one document needs, computed in the parent from the loaded history."""
+    df = history
+    if not df.empty and "user_id" in df.columns:
+        df = df[df["user_id"].astype(str) == job["user_id"]]
+    if not df.empty:
+        days = df["date"].dt.date
+        df = df[(days >= job["start"]) & (days <= job["end"])]
+    span = (job["end"] - job["start"]).days + 1
+    date_str = f"{job['start'].isoformat()} to {job['end'].isoformat()}"
+    if df.empty:
+        return {
+            "summary_text": f"No entries logged for {job['user_id']} between {date_str}.",
+            "tip_text": "", "emissions": 0.0, "date_str": date_str,
+            "per_activity": None, "per_category": None, "kpis": None, "spark_data": None, "spark_window_days": span,
+        }
+
+    n_days = int(df["date"].dt.date.nunique())
+    total = float(pd.to_numeric(df.get("total_kg", 0.0), errors="coerce").fillna(0.0).sum())
+    cats = core.compute_category_frame(df)
+    per_category = {cat: round(float(cats[cat].sum()), 2) for cat in core.CATEGORY_MAP}
+    amounts = {k: float(pd.to_numeric(df[k], errors="coerce").fillna(0.0).sum()) for k in CO2_FACTORS if k in df.columns}
+    daily_avg = {k: v / n_days for k, v in amounts.items()}
+    return {
+        "summary_text": (
+            f"{job['user_id']}: {n_days} of {span} days logged. Total {fmt_emissions(total)}, "
+            f"daily average {fmt_emissions(total / n_days)}."
+        ),
+        "tip_text": clean_tip(local_tip(daily_avg, total / n_days)),
+        "emissions": total,
+        "date_str": date_str,
+        "per_activity": calculate_co2_breakdown(amounts),
+        "per_category": per_category,
+        "kpis": {"streak_days": f"{core.compute_streak(df, job['end'])} days"},
+        "spark_data": core.build_spark_data(df, window_days=span),
+        "spark_window_days": span,
+    }
+
+
+def split_by_user(history: pd.DataFrame) -> Optional[Dict[str, pd.DataFrame]]:
+    """Per-user frames from one groupby pass (None when there is no user_id column)."""
+    if history.empty or "user_id" not in history.columns:
+        return None
+    return {str(user): group for user, group in history.groupby(history["user_id"].astype(str), sort=False)}
+
+
+def _init_worker(logo_path: Optional[str], branding: dict) -> None:
+    """Pool initializer: decode the logo once per worker and keep the branding."""
+    _WORKER["branding"] = branding
+    _WORKER["logo"] = None
+    if logo_path and os.path.exists(logo_path):
+        from reportlab.lib.utils import ImageReader
+
+        with open(logo_path, "rb") as f:
+            reader = ImageReader(io.BytesIO(f.read()))
+        reader.getSize()  # decode now; every document in this worker reuses it
+        _WORKER["logo"] = reader
+
+
+def render_job(payload: dict, out_path: str) -> tuple:
+    """Worker entry point: render one document and write it atomically.
+
+    Returns (out_path, bytes written, error or None).
+    """
+    from pdf_report import build_eco_tips_pdf
+
+    branding = _WORKER.get("branding") or {}
+    pdf, err = build_eco_tips_pdf(
+        source_label="Local", logo_image=_WORKER.get("logo"), **branding, **payload,
+    )
+    if err or not pdf:
+        return out_path, 0, err or "empty PDF"
+    tmp = f"{out_path}.tmp-{os.getpid()}"
+    try:
+        with open(tmp, "wb") as f:
+            f.write(pdf)
+        os.replace(tmp, out_path)
+    except OSError:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+    return out_path, len(pdf), None
+
+
+def peak_memory_mb() -> Optional[float]:
+    """Peak RSS of this process plus its finished children, in MB (None if unavailable)."""
+    try:
+        import resource
+    except ImportError:  # Windows
+        return None
+    self_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    child_kb = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    scale = 1024 * 1024 if sys.platform == "darwin" else 1024  # bytes on macOS, KB on Linux
+    return round(max(self_kb, child_kb) / scale, 1)
+
+
+def run_batch(
+    jobs: List[dict],
+    out_dir: str,
+    history_path: Optional[str] = None,
+    workers: Optional[int] = None,
+    logo_path: Optional[str] = None,
+    branding: Optional[dict] = None,
+    force: bool = False,
+) -> dict:
+    """Render every job into out_dir; returns counts, docs/sec and peak memory."""
+    os.makedirs(out_dir, exist_ok=True)
+    branding = {"title_text": DEFAULT_TITLE, **(branding or {})}
+    histories: Dict[Optional[str], tuple] = {}
+    pending = []
+    skipped = 0
+    for job in jobs:
+        out_path = os.path.join(out_dir, output_name(job))
+        if not force and os.path.exists(out_path):
+            skipped += 1
+            continue
+        src = job.get("history") or history_path
+        if src not in histories:
+            df = core.load_history(src)
+            histories[src] = (df, split_by_user(df))
+        df, by_user = histories[src]
+        if by_user is not None:
+            df = by_user.get(job["user_id"], df.iloc[0:0])
+        pending.append((build_payload(job, df), out_path))
+
+    started = time.perf_counter()
+    written, failed, nbytes = 0, [], 0
+    workers = max(1, int(workers or os.cpu_count() or 1))
+    if pending:
+        with ProcessPoolExecutor(max_workers=min(workers, len(pending)), initializer=_init_worker, initargs=(logo_path, branding)) as pool:
+            futures = [pool.submit(render_job, payload, out_path) for payload, out_path in pending]
+            for fut, (_, out_path) in zip(futures, pending):
+                # One bad document must not discard the ones already rendered
+                try:
+                    path, size, err = fut.result()
+                except Exception as e:
+                    path, size, err = out_path, 0, f"{type(e).__name__}: {e}"
+                if err:
+                    failed.append((path, err))
+                else:
+                    written += 1
+                    nbytes += size
+    elapsed = time.perf_counter() - started
+    return {
+        "jobs": len(jobs),
+        "written": written,
+        "skipped": skipped,
+        "failed": failed,
+        "seconds": round(elapsed, 3),
+        "docs_per_s": round(written / elapsed, 2) if elapsed and written else 0.0,
+        "megabytes": round(nbytes / 1e6, 2),
+        "peak_memory_mb": peak_memory_mb(),
+    }
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Render PDF summaries for many users and date ranges")
+    parser.add_argument("--jobs", help="CSV/JSON with user_id,start,end[,history]")
+    parser.add_argument("--users", help="Comma-separated user ids (with --start/--end)")
+    parser.add_argument("--start")
+    parser.add_argument("--end")
+    parser.add_argument("--history", default=None, help="Default history CSV (default: history.csv)")
+    parser.add_argument("--out", required=True, help="Output directory")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--logo", default=os.path.join(os.path.dirname(os.path.abspath(__file__)), "logo.png"))
+    parser.add_argument("--title", default=DEFAULT_TITLE)
+    parser.add_argument("--accent", default=None, help="Accent color, e.g. #60A5FA")
+    parser.add_argument("--footer", default=None)
+    parser.add_argument("--force", action="store_true", help="Re-render documents that already exist")
+    args = parser.parse_args(argv)
+
+    if args.jobs:
+        jobs = load_jobs(args.jobs)
+    elif args.users and args.start and args.end:
+        start, end = dt.date.fromisoformat(args.start), dt.date.fromisoformat(args.end)
+        jobs = [{"user_id": u.strip(), "start": start, "end": end, "history": None} for u in args.users.split(",") if u.strip()]
+    else:
+        parser.error("pass --jobs, or --users with --start and --end")
+
+    branding = {"title_text": args.title, "primary_color": args.accent, "footer_text": args.footer}
+    stats = run_batch(jobs, args.out, args.history, args.workers, args.logo, branding, args.force)
+    print(
+        f"Wrote {stats['written']} PDF(s), skipped {stats['skipped']} existing, {len(stats['failed'])} failed "
+        f"in {stats['seconds']:.2f}s: {stats['docs_per_s']:.1f} docs/s, peak memory {stats['peak_memory_mb']} MB"
+    )
+    for path, err in stats["failed"]:
+        print(f"FAILED {path}: {err}")
+    return 1 if stats["failed"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,231 @@
+"""
+batch_score.py
+
+Score large activity exports (CSV, or JSONL with one record per line) from
+the command line.
+
+The input is streamed in blocks of records; each block is parsed, scored with
+the vectorized co2_engine.calculate_co2_frame and serialized inside a worker
+process, so parsing and scoring both scale with cores. The parent only cuts
+raw records and writes finished blocks, in input order. CSV blocks are cut on
+record boundaries, so quoted fields may contain line breaks. A bounded number of
+blocks is in flight at a time, so memory stays flat for any file size.
+
+Output columns: every non-activity input column (ids, dates, ...), then
+total_kg and one <Category>_kg column per core.CATEGORY_MAP category.
+Non-activity columns are passed through as written (no type inference, so
+"00123" stays "00123" and dates keep their format). The column set is fixed
+by the first block, which is scored in the parent before the pool starts;
+later blocks are aligned to it, and JSONL keys that first appear after it are
+dropped and reported.
+
+Examples:
+    python batch_score.py fleet_2025-01-01.csv scored.csv --workers 8
+    python batch_score.py export.jsonl scored.jsonl --chunk-rows 200000
+"""
+
+from __future__ import annotations
+
+import argparse
+import csv
+import io
+import itertools
+import json
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Iterator, List, Optional, Tuple
+
+import pandas as pd
+
+from co2_engine import CO2_FACTORS, calculate_co2_frame
+from core import CATEGORY_MAP
+from utils import normalize_activity_name
+
+DEFAULT_CHUNK_ROWS = 50_000
+
+
+def _format_of(path: str, fmt: Optional[str] = None) -> str:
+    if fmt:
+        return fmt
+    return "jsonl" if path.lower().endswith((".jsonl", ".ndjson", ".json")) else "csv"
+
+
+def _csv_records(lines: Iterator[bytes]) -> Iterator[bytes]:
+    """Join raw lines into whole CSV records.
+
+    Quotes inside fields are escaped by doubling them, so a record ends at the
+    first line break after an even number of quote characters; an odd count
+    means a quoted field continues on the next line.
+    """
+    pending: List[bytes] = []
+    quotes = 0
+    for line in lines:
+        quotes += line.count(b'"')
+        if not pending and not quotes % 2:
+            yield line
+            continue
+        pending.append(line)
+        if not quotes % 2:
+            yield b"".join(pending)
+            pending, quotes = [], 0
+    if pending:
+        yield b"".join(pending)
+
+
+def iter_blocks(path: str, chunk_rows: int, fmt: str) -> Iterator[Tuple[bytes, bytes]]:
+    """Yield (header, block) byte pairs of up to chunk_rows records each.
+
+    header is the CSV header record (b"" for JSONL) so each block parses alone.
+    """
+    with open(path, "rb") as f:
+        records = _csv_records(f) if fmt == "csv" else iter(f)
+        header = next(records, b"") if fmt == "csv" else b""
+        while True:
+            chunk = list(itertools.islice(records, chunk_rows))
+            if not chunk:
+                return
+            yield header, b"".join(chunk)
+
+
+def score_frame(df):
+    """Pass-through columns + total_kg + per-category kg for one parsed block."""
+    kg = calculate_co2_frame(df, CATEGORY_MAP)
+    keep = [c for c in df.columns if normalize_activity_name(str(c)) not in CO2_FACTORS]
+    scored = ["total_kg"] + [f"{cat}_kg" for cat in CATEGORY_MAP]
+    return pd.concat([df[keep], kg[scored]], axis=1)
+
+
+def parse_block(header: bytes, block: bytes, fmt: str) -> pd.DataFrame:
+    """One block as a frame of untouched values: CSV fields stay strings, JSON
+    values keep their JSON type (object columns, so a missing key never turns
+    the other rows' ints into floats)."""
+    if fmt == "csv":
+        return pd.read_csv(io.BytesIO(header + block), dtype=str, keep_default_na=False)
+    records = [json.loads(line) for line in block.splitlines() if line.strip()]
+    return pd.DataFrame.from_records(records).astype(object)
+
+
+def score_block(
+    header: bytes, block: bytes, fmt: str, out_fmt: str, columns: Optional[List[str]] = None,
+) -> Tuple[List[str], bytes, int, List[str]]:
+    """Worker entry point: parse, score and serialize one block.
+
+    columns, if given, is the output column set every block is aligned to.
+    Returns (output columns, serialized rows without header, row count,
+    pass-through columns dropped because they are not in columns).
+    """
+    out = score_frame(parse_block(header, block, fmt))
+    dropped: List[str] = []
+    if columns is not None:
+        dropped = [c for c in out.columns if c not in columns]
+        out = out.reindex(columns=columns)
+    if out_fmt == "csv":
+        data = out.to_csv(index=False, header=False).encode("utf-8")
+    else:
+        data = out.to_json(orient="records", lines=True, date_format="iso").encode("utf-8")
+        if data and not data.endswith(b"\n"):
+            data += b"\n"
+    return list(out.columns), data, len(out), dropped
+
+
+def score_file(
+    input_path: str,
+    output_path: str,
+    workers: Optional[int] = None,
+    chunk_rows: int = DEFAULT_CHUNK_ROWS,
+    in_fmt: Optional[str] = None,
+    out_fmt: Optional[str] = None,
+    progress=None,
+) -> dict:
+    """Score input_path into output_path; returns rows, seconds, rows/sec and
+    dropped_columns (JSONL keys missing from the first block).
+
+    workers=1 scores in-process (no pool), which is also the baseline for
+    measuring scaling. progress, if given, is called with the running row count.
+    """
+    in_fmt = _format_of(input_path, in_fmt)
+    out_fmt = _format_of(output_path, out_fmt)
+    workers = max(1, int(workers or os.cpu_count() or 1))
+    blocks = iter_blocks(input_path, max(1, int(chunk_rows)), in_fmt)
+    rows = 0
+    chunks = 0
+    dropped: List[str] = []
+    started = time.perf_counter()
+
+    def write(out, result):
+        nonlocal rows, chunks
+        columns, data, n, extra = result
+        if out_fmt == "csv" and not chunks:
+            buf = io.StringIO()
+            csv.writer(buf, lineterminator="\n").writerow(columns)
+            out.write(buf.getvalue().encode("utf-8"))
+        dropped.extend(c for c in extra if c not in dropped)
+        out.write(data)
+        rows += n
+        chunks += 1
+        if progress is not None:
+            progress(rows)
+
+    with open(output_path, "wb") as out:
+        first = next(blocks, None)
+        if first is None:
+            columns = None
+        else:
+            # The first block fixes the output columns for every later one
+            result = score_block(*first, in_fmt, out_fmt)
+            columns = result[0]
+            write(out, result)
+        if workers == 1:
+            for header, block in blocks:
+                write(out, score_block(header, block, in_fmt, out_fmt, columns))
+        else:
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                inflight: deque = deque()
+                # Keep every worker busy plus one spare block each, no more
+                for header, block in blocks:
+                    inflight.append(pool.submit(score_block, header, block, in_fmt, out_fmt, columns))
+                    if len(inflight) >= workers * 2:
+                        write(out, inflight.popleft().result())
+                while inflight:
+                    write(out, inflight.popleft().result())
+
+    elapsed = time.perf_counter() - started
+    return {
+        "rows": rows,
+        "chunks": chunks,
+        "workers": workers,
+        "seconds": round(elapsed, 3),
+        "rows_per_s": round(rows / elapsed, 1) if elapsed else 0.0,
+        "dropped_columns": dropped,
+    }
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Score CSV/JSONL activity exports with a process pool")
+    parser.add_argument("input")
+    parser.add_argument("output")
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes (default: all cores; 1 = in-process)")
+    parser.add_argument("--chunk-rows", type=int, default=DEFAULT_CHUNK_ROWS)
+    parser.add_argument("--input-format", choices=("csv", "jsonl"), default=None, help="Default: from the file extension")
+    parser.add_argument("--output-format", choices=("csv", "jsonl"), default=None, help="Default: from the file extension")
+    parser.add_argument("--quiet", action="store_true")
+    args = parser.parse_args(argv)
+
+    def progress(n):
+        if not args.quiet:
+            print(f"\r{n:,} rows scored", end="", file=sys.stderr, flush=True)
+
+    stats = score_file(args.input, args.output, args.workers, args.chunk_rows, args.input_format, args.output_format, progress)
+    if not args.quiet:
+        print(file=sys.stderr)
+    print(f"Scored {stats['rows']:,} rows in {stats['seconds']:.2f}s with {stats['workers']} worker(s): {stats['rows_per_s']:,.0f} rows/s")
+    if stats["dropped_columns"]:
+        print(f"Dropped keys not in the first block: {', '.join(map(str, stats['dropped_columns']))}", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
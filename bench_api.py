@@ -0,0 +1,166 @@
+"""
+bench_api.py
+
+Throughput and tail-latency benchmark for api_server.py on localhost.
+
+Opens `--connections` keep-alive connections and sends requests back to back on
+each for `--duration` seconds, then reports requests/sec and p50/p95/p99.
+By default the server is started in a separate process (so client and server
+don't share a GIL); pass --url to target one that is already running.
+
+Examples:
+    python bench_api.py --endpoint calculate --connections 32 --duration 10
+    python bench_api.py --endpoint batch --batch-size 100
+    python bench_api.py --url http://127.0.0.1:8000 --endpoint tip --json
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import subprocess
+import sys
+import time
+from typing import List, Optional, Tuple
+from urllib.parse import urlsplit
+
+from co2_engine import CO2_FACTORS
+from loadtest_tips import percentile
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ENDPOINTS = ("health", "calculate", "batch", "tip")
+
+
+def _activity(rng: random.Random) -> dict:
+    keys = rng.sample(list(CO2_FACTORS), 5)
+    return {k: round(rng.uniform(0, 20), 1) for k in keys}
+
+
+def build_request(endpoint: str, host: str, rng: random.Random, batch_size: int = 50) -> bytes:
+    """Raw HTTP/1.1 keep-alive request bytes for one call to `endpoint`."""
+    if endpoint == "health":
+        return f"GET /health HTTP/1.1\r\nHost: {host}\r\n\r\n".encode("latin-1")
+    if endpoint == "calculate":
+        path, body = "/v1/calculate", {"activity_data": _activity(rng)}
+    elif endpoint == "batch":
+        path, body = "/v1/calculate/batch", {"items": [_activity(rng) for _ in range(batch_size)]}
+    elif endpoint == "tip":
+        path, body = "/v1/tip", {"activity_data": _activity(rng)}
+    else:
+        raise ValueError(f"Unknown endpoint: {endpoint!r}")
+    data = json.dumps(body).encode("utf-8")
+    head = (
+        f"POST {path} HTTP/1.1\r\nHost: {host}\r\n"
+        f"Content-Type: application/json\r\nContent-Length: {len(data)}\r\n\r\n"
+    ).encode("latin-1")
+    return head + data
+
+
+async def _read_response(reader: asyncio.StreamReader) -> int:
+    head = await reader.readuntil(b"\r\n\r\n")
+    status = int(head.split(b" ", 2)[1])
+    length = 0
+    for line in head.split(b"\r\n")[1:]:
+        if line.lower().startswith(b"content-length:"):
+            length = int(line.split(b":", 1)[1])
+    if length:
+        await reader.readexactly(length)
+    return status
+
+
+async def _worker(host: str, port: int, requests: List[bytes], stop_at: float, latencies: List[float], errors: List[int]) -> None:
+    reader, writer = await asyncio.open_connection(host, port)
+    i = 0
+    try:
+        while time.perf_counter() < stop_at:
+            t0 = time.perf_counter()
+            writer.write(requests[i % len(requests)])
+            await writer.drain()
+            status = await _read_response(reader)
+            latencies.append(time.perf_counter() - t0)
+            if status != 200:
+                errors.append(status)
+            i += 1
+    finally:
+        writer.close()
+
+
+async def run_benchmark(base_url: str, endpoint: str = "calculate", connections: int = 16, duration_s: float = 5.0, batch_size: int = 50, seed: int = 0) -> dict:
+    """Drive the API at base_url and return a metrics dict."""
+    url = urlsplit(base_url)
+    host, port = url.hostname or "127.0.0.1", url.port or 80
+    rng = random.Random(seed)
+    # Pre-build a pool of distinct bodies so request encoding isn't measured
+    requests = [build_request(endpoint, host, rng, batch_size) for _ in range(64)]
+    latencies: List[float] = []
+    errors: List[int] = []
+    started = time.perf_counter()
+    stop_at = started + duration_s
+    await asyncio.gather(*(_worker(host, port, requests, stop_at, latencies, errors) for _ in range(max(1, connections))))
+    wall = time.perf_counter() - started
+    latencies.sort()
+    n = len(latencies)
+    items = n * (batch_size if endpoint == "batch" else 1)
+    return {
+        "endpoint": endpoint,
+        "connections": connections,
+        "requests": n,
+        "errors": len(errors),
+        "wall_s": round(wall, 3),
+        "requests_per_s": round(n / wall, 1) if wall else 0.0,
+        "items_per_s": round(items / wall, 1) if wall else 0.0,
+        "p50_ms": round(percentile(latencies, 50) * 1000, 3),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 3),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 3),
+        "max_ms": round(latencies[-1] * 1000, 3) if latencies else 0.0,
+    }
+
+
+def start_server_process(history_path: Optional[str] = None) -> Tuple[subprocess.Popen, str]:
+    """Start api_server.py on a free port; return (process, base_url)."""
+    cmd = [sys.executable, os.path.join(HERE, "api_server.py"), "--port", "0"]
+    if history_path:
+        cmd += ["--history", history_path]
+    proc = subprocess.Popen(cmd, cwd=HERE, stdout=subprocess.PIPE, text=True)
+    line = proc.stdout.readline()
+    if "listening on" not in line:
+        proc.kill()
+        raise RuntimeError(f"API server failed to start: {line!r}")
+    return proc, line.split("listening on", 1)[1].split()[0]
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description="Benchmark the HTTP/JSON API (requests/sec and tail latency)")
+    parser.add_argument("--url", default=None, help="Target an already running server instead of starting one")
+    parser.add_argument("--endpoint", choices=ENDPOINTS, default="calculate")
+    parser.add_argument("--connections", type=int, default=16)
+    parser.add_argument("--duration", type=float, default=5.0)
+    parser.add_argument("--batch-size", type=int, default=50)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", action="store_true", help="Print the result as JSON")
+    args = parser.parse_args(argv)
+
+    proc = None
+    base_url = args.url
+    if base_url is None:
+        proc, base_url = start_server_process()
+    try:
+        result = asyncio.run(run_benchmark(base_url, args.endpoint, args.connections, args.duration, args.batch_size, args.seed))
+    finally:
+        if proc is not None:
+            proc.terminate()
+            proc.wait(timeout=5)
+
+    if args.json:
+        print(json.dumps(result, indent=2))
+        return
+    print(f"{result['endpoint']}: {result['requests']} requests over {result['connections']} keep-alive connections in {result['wall_s']:.2f}s")
+    print(f"Throughput: {result['requests_per_s']:.0f} req/s ({result['items_per_s']:.0f} items/s)  Errors: {result['errors']}")
+    print(f"Latency p50/p95/p99: {result['p50_ms']:.2f} / {result['p95_ms']:.2f} / {result['p99_ms']:.2f} ms (max {result['max_ms']:.2f} ms)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+"""
+bench_category_series.py
+
+Compare the old per-category Series loop used by the dashboard with
+core.compute_category_frame (one matrix product for all categories + total).
+
+Usage:
+    python bench_category_series.py                 # 30, 365, 3650, 100k rows
+    python bench_category_series.py --rows 1000000 --repeat 3
+"""
+
+from __future__ import annotations
+
+import argparse
+import statistics
+import time
+
+import numpy as np
+import pandas as pd
+
+from co2_engine import CO2_FACTORS
+from core import ALL_KEYS, CATEGORY_MAP, compute_category_frame
+
+
+def loop_category_series(df: pd.DataFrame) -> dict:
+    """Reference: the per-column loop the dashboard used before (one Series per step)."""
+    out = {}
+    for cat, keys in CATEGORY_MAP.items():
+        present = [k for k in keys if k in df.columns]
+        s = pd.Series(0.0, index=df.index)
+        for k in present:
+            s = s + df[k].fillna(0).astype(float) * CO2_FACTORS.get(k)
+        out[cat] = s
+    out["total_kg"] = sum(out.values())
+    return out
+
+
+def make_history(rows: int, seed: int = 0) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    data = rng.uniform(0, 10, size=(rows, len(ALL_KEYS)))
+    df = pd.DataFrame(data, columns=ALL_KEYS)
+    df.insert(0, "date", pd.date_range("2000-01-01", periods=rows, freq="D"))
+    return df
+
+
+def _time(fn, df, repeat: int) -> float:
+    runs = []
+    for _ in range(max(1, repeat)):
+        t0 = time.perf_counter()
+        fn(df)
+        runs.append(time.perf_counter() - t0)
+    return statistics.median(runs)
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description="Benchmark per-category series computation")
+    parser.add_argument("--rows", type=int, nargs="*", default=[30, 365, 3650, 100_000])
+    parser.add_argument("--repeat", type=int, default=7)
+    args = parser.parse_args(argv)
+
+    print(f"{'rows':>9}  {'loop ms':>9}  {'matrix ms':>9}  {'speedup':>7}")
+    for n in args.rows:
+        df = make_history(n)
+        # Same numbers either way
+        ref, new = loop_category_series(df), compute_category_frame(df)
+        for col in list(CATEGORY_MAP) + ["total_kg"]:
+            np.testing.assert_allclose(ref[col].to_numpy(), new[col].to_numpy(), rtol=1e-9)
+        t_loop = _time(loop_category_series, df, args.repeat)
+        t_mat = _time(compute_category_frame, df, args.repeat)
+        print(f"{n:>9}  {t_loop * 1000:9.3f}  {t_mat * 1000:9.3f}  {t_loop / t_mat:6.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,170 @@
+"""
+bench_import.py
+
+Import-time benchmark for the app's modules.
+
+Each module is imported in a fresh interpreter with `python -X importtime`, a
+few times, and the median cumulative import time is reported together with the
+heaviest third-party packages it pulled in. Results can be saved as a JSON
+baseline and later compared against it; the script exits with status 1 when a
+module regresses beyond the allowed threshold or imports a package it must not.
+
+Usage:
+    python bench_import.py                                  # report only
+    python bench_import.py --save-baseline import_baseline.json
+    python bench_import.py --baseline import_baseline.json --max-regression 0.25
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+from typing import Dict, List, Set, Tuple
+
+DEFAULT_MODULES = ["utils", "co2_engine", "rate_limiter", "tip_executor", "ai_tips", "core", "pdf_report", "app"]
+
+# Heavy packages that must stay lazy for a given module (checked on every run).
+FORBIDDEN_IMPORTS = {
+    "ai_tips": ["openai", "dotenv", "httpx"],
+    "core": ["streamlit", "openai", "reportlab", "matplotlib"],
+    "pdf_report": ["streamlit", "openai"],
+    "app": ["openai", "reportlab", "matplotlib"],
+}
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+def _importtime(code: str) -> str:
+    env = dict(os.environ)
+    env["PYTHONPATH"] = HERE + os.pathsep + env.get("PYTHONPATH", "")
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        cwd=HERE, env=env, capture_output=True, text=True,
+    )
+    if proc.returncode != 0:
+        raise RuntimeError(f"{code!r} failed:\n{proc.stderr[-2000:]}")
+    return proc.stderr
+
+
+_STARTUP: List[str] = []
+
+
+def _startup_packages() -> List[str]:
+    """Packages the bare interpreter already imports (site, .pth hooks, ...)."""
+    if not _STARTUP:
+        _STARTUP.extend(_parse(_importtime("pass"), module="")[2])
+    return _STARTUP
+
+
+def measure_once(module: str) -> Tuple[float, Dict[str, float], Set[str]]:
+    """Import module in a subprocess.
+
+    Returns (cumulative_ms, {direct top-level package: cumulative_ms}, every
+    top-level package imported at any depth), excluding interpreter startup.
+    """
+    startup = set(_startup_packages())
+    total_ms, packages, seen = _parse(_importtime(f"import {module}"), module)
+    return total_ms, {k: v for k, v in packages.items() if k not in startup}, seen - startup
+
+
+def _parse(stderr: str, module: str) -> Tuple[float, Dict[str, float], Set[str]]:
+    total_ms = 0.0
+    packages: Dict[str, float] = {}
+    seen: Set[str] = set()
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        parts = line[len("import time:"):].split("|")
+        if len(parts) != 3 or not parts[1].strip().isdigit():
+            continue  # header line
+        cumulative_ms = int(parts[1]) / 1000.0
+        raw_name = parts[2].rstrip()
+        name = raw_name.strip()
+        depth = (len(raw_name) - len(raw_name.lstrip())) // 2
+        if name == module:
+            total_ms = cumulative_ms
+        top = name.split(".")[0]
+        seen.add(top)
+        if depth <= 1 and top != module:
+            # Only count the outermost import of each package to avoid double counting
+            packages[top] = max(packages.get(top, 0.0), cumulative_ms)
+    return total_ms, packages, seen
+
+
+def measure(module: str, repeat: int) -> Dict[str, object]:
+    totals: List[float] = []
+    merged: Dict[str, List[float]] = {}
+    imported: Set[str] = set()
+    for _ in range(max(1, repeat)):
+        total, pkgs, seen = measure_once(module)
+        totals.append(total)
+        imported |= seen
+        for k, v in pkgs.items():
+            merged.setdefault(k, []).append(v)
+    top = sorted(((k, statistics.median(v)) for k, v in merged.items()), key=lambda kv: kv[1], reverse=True)
+    return {
+        "median_ms": round(statistics.median(totals), 2),
+        "min_ms": round(min(totals), 2),
+        "imported": sorted(imported),
+        "heaviest": [[k, round(v, 2)] for k, v in top[:5]],
+    }
+
+
+def compare(results: Dict[str, dict], baseline: Dict[str, dict], max_regression: float, slack_ms: float) -> List[str]:
+    """Return human-readable failures for modules slower than baseline allows."""
+    failures = []
+    for module, res in results.items():
+        base = baseline.get(module)
+        if not base:
+            continue
+        allowed = base["median_ms"] * (1.0 + max_regression) + slack_ms
+        if res["median_ms"] > allowed:
+            failures.append(f"{module}: {res['median_ms']:.1f} ms > allowed {allowed:.1f} ms (baseline {base['median_ms']:.1f} ms)")
+    return failures
+
+
+def check_forbidden(results: Dict[str, dict]) -> List[str]:
+    failures = []
+    for module, res in results.items():
+        leaked = [pkg for pkg in FORBIDDEN_IMPORTS.get(module, []) if pkg in res["imported"]]
+        if leaked:
+            failures.append(f"{module}: eagerly imports {', '.join(leaked)}")
+    return failures
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Measure per-module import time")
+    parser.add_argument("modules", nargs="*", default=DEFAULT_MODULES)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--baseline", help="JSON baseline to compare against")
+    parser.add_argument("--save-baseline", help="Write results as a JSON baseline")
+    parser.add_argument("--max-regression", type=float, default=0.25, help="Allowed relative slowdown (0.25 = 25%%)")
+    parser.add_argument("--slack-ms", type=float, default=5.0, help="Absolute slack added to every allowance")
+    args = parser.parse_args(argv)
+
+    results = {m: measure(m, args.repeat) for m in args.modules}
+    width = max(len(m) for m in results)
+    for module, res in results.items():
+        heavy = ", ".join(f"{k} {v:.0f}ms" for k, v in res["heaviest"])
+        print(f"{module:<{width}}  {res['median_ms']:8.1f} ms (min {res['min_ms']:.1f})  heaviest: {heavy or '-'}")
+
+    if args.save_baseline:
+        with open(args.save_baseline, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+        print(f"Baseline written to {args.save_baseline}")
+
+    failures = check_forbidden(results)
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            failures += compare(results, json.load(f), args.max_regression, args.slack_ms)
+    for msg in failures:
+        print(f"REGRESSION: {msg}")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,320 @@
+"""
+benchmarks.py
+
+Micro and macro benchmarks for the hot paths, with JSON baselines and
+regression gating.
+
+Micro: calculate_co2, calculate_co2_breakdown, normalize_activity_name,
+local_tip, clean_tip, compute_streak, award_badges.
+Macro: load_history / save_entry on 1k, 100k and 1M row history files, and
+build_eco_tips_pdf (skipped without ReportLab).
+
+Every benchmark is timed `--repeat` times. Fast calls are looped until one
+sample takes at least `--min-time` seconds, and the per-call time is reported.
+The median is what gets compared. History files are generated once per run in
+a temp directory; save_entry upserts the last day, so files keep their size.
+
+Usage:
+    python benchmarks.py run                                   # report only
+    python benchmarks.py run --save bench_baseline.json
+    python benchmarks.py run --filter micro. --baseline bench_baseline.json --max-regression 0.2
+    python benchmarks.py compare bench_baseline.json bench_current.json
+    python benchmarks.py list
+
+`run --baseline` and `compare` exit with status 1 when a benchmark is slower
+than baseline * (1 + max_regression) + slack.
+"""
+
+from __future__ import annotations
+
+import argparse
+import datetime as dt
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+HISTORY_SIZES = (1_000, 100_000, 1_000_000)
+MAX_HISTORY_DAYS = 100_000
+
+SAMPLE_ACTIVITY = {
+    "electricity_kwh": 8.5, "natural_gas_m3": 1.2, "hot_water_liter": 40, "bus_km": 12,
+    "petrol_liter": 3.1, "train_km": 25, "meat_kg": 0.2, "dairy_kg": 0.3, "vegan_kg": 0.4,
+}
+
+# name -> setup(workdir) returning a zero-argument callable to time
+Setup = Callable[[str], Callable[[], object]]
+BENCHMARKS: Dict[str, Setup] = {}
+
+
+def benchmark(name: str):
+    def register(setup: Setup) -> Setup:
+        BENCHMARKS[name] = setup
+        return setup
+    return register
+
+
+def make_history_file(path: str, rows: int, seed: int = 0) -> str:
+    """History CSV with rows entries and every activity column.
+
+    Dates are daily, spread over at most MAX_HISTORY_DAYS days (several entries
+    per day above that), so 1M rows still fit pandas' timestamp range.
+    """
+    from core import ALL_KEYS
+
+    rng = np.random.default_rng(seed)
+    df = pd.DataFrame(rng.uniform(0, 10, size=(rows, len(ALL_KEYS))).round(2), columns=ALL_KEYS)
+    per_day = -(-rows // MAX_HISTORY_DAYS)
+    days = pd.Timestamp("1800-01-01") + pd.to_timedelta(np.arange(rows) // per_day, unit="D")
+    df.insert(0, "date", days)
+    df["total_kg"] = rng.uniform(0, 40, size=rows).round(2)
+    df.to_csv(path, index=False)
+    return path
+
+
+# =========================
+# Micro
+# =========================
+@benchmark("micro.calculate_co2")
+def _calculate_co2(workdir):
+    from co2_engine import calculate_co2
+    return lambda: calculate_co2(SAMPLE_ACTIVITY)
+
+
+@benchmark("micro.calculate_co2_breakdown")
+def _calculate_co2_breakdown(workdir):
+    from co2_engine import calculate_co2_breakdown
+    return lambda: calculate_co2_breakdown(SAMPLE_ACTIVITY)
+
+
+@benchmark("micro.normalize_activity_name")
+def _normalize(workdir):
+    from utils import normalize_activity_name
+    names = ["Electricity (kWh)", "bus_km", "Natural Gas m3", "Flight (long) km"]
+    return lambda: [normalize_activity_name(n) for n in names]
+
+
+@benchmark("micro.local_tip")
+def _local_tip(workdir):
+    from ai_tips import local_tip
+    return lambda: local_tip(SAMPLE_ACTIVITY, 14.2)
+
+
+@benchmark("micro.clean_tip")
+def _clean_tip(workdir):
+    from ai_tips import clean_tip
+    text = "**Tip:** Try taking the train instead of driving.   It cuts emissions a lot! Also, switch off standby devices. And more."
+    return lambda: clean_tip(text)
+
+
+def _daily_history(days: int) -> pd.DataFrame:
+    df = pd.DataFrame({"date": pd.date_range(end="2025-06-30", periods=days, freq="D"), "total_kg": np.linspace(5, 20, days)})
+    return df
+
+
+@benchmark("micro.compute_streak")
+def _compute_streak(workdir):
+    from core import compute_streak
+    df = _daily_history(365)
+    return lambda: compute_streak(df, dt.date(2025, 6, 30))
+
+
+@benchmark("micro.award_badges")
+def _award_badges(workdir):
+    from core import award_badges
+    df = _daily_history(365)
+    return lambda: award_badges(12.5, 30, df)
+
+
+# =========================
+# Macro
+# =========================
+def _history_path(workdir: str, rows: int) -> str:
+    path = os.path.join(workdir, f"history_{rows}.csv")
+    if not os.path.exists(path):
+        make_history_file(path, rows)
+    return path
+
+
+def _register_history(rows: int) -> None:
+    label = f"{rows // 1_000_000}m" if rows >= 1_000_000 else f"{rows // 1000}k"
+
+    @benchmark(f"macro.load_history.{label}")
+    def _load(workdir):
+        from core import load_history
+        path = _history_path(workdir, rows)
+        return lambda: load_history(path)
+
+    @benchmark(f"macro.save_entry.{label}")
+    def _save(workdir):
+        from core import load_history, save_entry
+        path = _history_path(workdir, rows)
+        last_day = load_history(path)["date"].iloc[-1].date()
+        return lambda: save_entry(last_day, SAMPLE_ACTIVITY, 14.2, path)
+
+
+for _rows in HISTORY_SIZES:
+    _register_history(_rows)
+
+
+@benchmark("macro.build_eco_tips_pdf")
+def _build_pdf(workdir):
+    import pdf_report
+    try:
+        import reportlab  # noqa: F401
+    except ImportError:
+        return None
+    kwargs = dict(
+        summary_text="Energy 8.5 kWh, bus 12 km, meat 0.2 kg", tip_text="Take the train twice this week.",
+        emissions=14.2, date_str="2025-06-30", source_label="Local",
+        per_activity={"electricity_kwh": 1.98, "bus_km": 1.44, "meat_kg": 5.4},
+        per_category={"Energy": 4.1, "Transport": 3.2, "Meals": 6.9}, kpis={"today_total": "14.20 kg CO₂"},
+        spark_data={"Energy": [3.0, 4.1, 3.8, 4.4, 4.0, 3.9, 4.1], "Transport": [2.0, 3.2, 2.8, 3.0, 3.1, 2.9, 3.2]},
+    )
+    return lambda: pdf_report.build_eco_tips_pdf(**kwargs)
+
+
+# =========================
+# Runner
+# =========================
+def time_callable(fn: Callable[[], object], repeat: int = 5, min_time: float = 0.05) -> dict:
+    """Median/min/stdev seconds per call over `repeat` samples of `loops` calls each."""
+    fn()  # warm-up (imports, caches)
+    loops = 1
+    while True:
+        t0 = time.perf_counter()
+        for _ in range(loops):
+            fn()
+        elapsed = time.perf_counter() - t0
+        if elapsed >= min_time or loops >= 1_000_000:
+            break
+        loops *= 10 if elapsed < min_time / 10 else 2
+    samples = [elapsed / loops]
+    for _ in range(max(1, repeat) - 1):
+        t0 = time.perf_counter()
+        for _ in range(loops):
+            fn()
+        samples.append((time.perf_counter() - t0) / loops)
+    return {
+        "median_s": statistics.median(samples),
+        "min_s": min(samples),
+        "stdev_s": statistics.stdev(samples) if len(samples) > 1 else 0.0,
+        "loops": loops,
+        "repeat": len(samples),
+    }
+
+
+def run(names: List[str], repeat: int = 5, min_time: float = 0.05, workdir: Optional[str] = None, progress=None) -> dict:
+    """Run the named benchmarks; returns {"meta": ..., "results": {name: timing}}."""
+    results: Dict[str, dict] = {}
+    with tempfile.TemporaryDirectory(prefix="bench_") as tmp:
+        workdir = workdir or tmp
+        for name in names:
+            fn = BENCHMARKS[name](workdir)
+            if fn is None:
+                if progress:
+                    progress(name, None)
+                continue
+            results[name] = time_callable(fn, repeat, min_time)
+            if progress:
+                progress(name, results[name])
+    return {
+        "meta": {
+            "created": dt.datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "pandas": pd.__version__,
+            "cpus": os.cpu_count(),
+        },
+        "results": results,
+    }
+
+
+def compare(current: dict, baseline: dict, max_regression: float = 0.2, slack_s: float = 0.0) -> Tuple[List[str], List[str]]:
+    """(regressions, report lines) for benchmarks present in both result sets."""
+    failures, lines = [], []
+    base = baseline.get("results", baseline)
+    for name, res in current.get("results", current).items():
+        ref = base.get(name)
+        if not ref:
+            continue
+        ratio = res["median_s"] / ref["median_s"] if ref["median_s"] else float("inf")
+        allowed = ref["median_s"] * (1.0 + max_regression) + slack_s
+        flag = "REGRESSION" if res["median_s"] > allowed else ("faster" if ratio < 1 / (1 + max_regression) else "ok")
+        lines.append(f"{name:<36} {_fmt(ref['median_s']):>10} -> {_fmt(res['median_s']):>10}  x{ratio:5.2f}  {flag}")
+        if flag == "REGRESSION":
+            failures.append(f"{name}: {_fmt(res['median_s'])} > allowed {_fmt(allowed)} (baseline {_fmt(ref['median_s'])})")
+    return failures, lines
+
+
+def _fmt(seconds: float) -> str:
+    if seconds >= 1:
+        return f"{seconds:.2f} s"
+    if seconds >= 1e-3:
+        return f"{seconds * 1e3:.2f} ms"
+    return f"{seconds * 1e6:.2f} us"
+
+
+def select(filters: List[str], skip_sizes: List[str]) -> List[str]:
+    names = [n for n in BENCHMARKS if not filters or any(f in n for f in filters)]
+    return [n for n in names if not any(n.endswith(f".{s}") for s in skip_sizes)]
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Micro/macro benchmarks with JSON baselines")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    p_run = sub.add_parser("run", help="Run benchmarks")
+    p_run.add_argument("--filter", action="append", default=[], help="Substring of benchmark names (repeatable)")
+    p_run.add_argument("--skip", action="append", default=[], help="Skip history sizes, e.g. --skip 1m")
+    p_run.add_argument("--repeat", type=int, default=5)
+    p_run.add_argument("--min-time", type=float, default=0.05, help="Minimum seconds per sample")
+    p_run.add_argument("--save", help="Write results as JSON")
+    p_run.add_argument("--baseline", help="Compare against this JSON baseline")
+    p_cmp = sub.add_parser("compare", help="Compare two saved result files")
+    p_cmp.add_argument("baseline")
+    p_cmp.add_argument("current")
+    for p in (p_run, p_cmp):
+        p.add_argument("--max-regression", type=float, default=0.2, help="Allowed relative slowdown (0.2 = 20%%)")
+        p.add_argument("--slack-us", type=float, default=0.0, help="Absolute slack added to every allowance")
+    sub.add_parser("list", help="List benchmark names")
+    args = parser.parse_args(argv)
+
+    if args.cmd == "list":
+        print("\n".join(BENCHMARKS))
+        return 0
+
+    if args.cmd == "compare":
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+        with open(args.current, encoding="utf-8") as f:
+            current = json.load(f)
+    else:
+        def progress(name, res):
+            print(f"{name:<36} " + ("skipped" if res is None else f"{_fmt(res['median_s']):>10} (min {_fmt(res['min_s'])}, {res['loops']} loop(s) x {res['repeat']})"), flush=True)
+
+        current = run(select(args.filter, args.skip), args.repeat, args.min_time, progress=progress)
+        if args.save:
+            with open(args.save, "w", encoding="utf-8") as f:
+                json.dump(current, f, indent=2, sort_keys=True)
+            print(f"Results written to {args.save}")
+        if not args.baseline:
+            return 0
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+
+    failures, lines = compare(current, baseline, args.max_regression, args.slack_us / 1e6)
+    print("\n".join(lines))
+    for msg in failures:
+        print(f"REGRESSION: {msg}")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
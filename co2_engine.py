@@ -7,6 +7,8 @@ A small engine to estimate CO₂ emissions from daily activities.
 - calculate_co2(activity_data) returns the total emissions in kilograms of CO₂.
 - calculate_co2_breakdown(activity_data) (optional) returns per-activity emissions
   for deeper insights and debugging.
+- calculate_co2_frame(frame) does the same for a whole pandas DataFrame of
+  activity rows at once (batch scoring); pandas is only imported when it is used.
 
 Notes for readers:
 - Keys in activity_data should match the factor keys (e.g., "electricity_kWh").
@@ -15,6 +17,8 @@ Notes for readers:
 """
 
 from typing import Dict, Mapping, Optional
+import metrics
+from tracing import traced
 from utils import normalize_activity_name
 
 # Emission factors in kg CO₂ per unit.
@@ -59,6 +63,7 @@ def _get_factor(activity_key: str) -> Optional[float]:
     return CO2_FACTORS.get(normalized)
 
 
+@traced()
 def calculate_co2(activity_data: Mapping[str, float]) -> float:
     """
     Calculate total CO₂ emissions for a set of activities.
@@ -75,6 +80,7 @@ def calculate_co2(activity_data: Mapping[str, float]) -> float:
     - Non-numeric or negative amounts are ignored with a warning.
     - Unknown activity keys are ignored with a warning.
     """
+    metrics.CO2_CALCULATIONS.inc()
     total_emissions = 0.0
 
     for activity, amount in activity_data.items():
@@ -127,4 +133,56 @@ def calculate_co2_breakdown(activity_data: Mapping[str, float]) -> Dict[str, flo
             # more precision here to help users debug contributions
             breakdown[normalized] = round(kg, 4)
 
-    return breakdown
\ No newline at end of file
+    return breakdown
+
+
+def calculate_co2_frame(frame, categories: Optional[Mapping[str, list]] = None):
+    """
+    Vectorized calculate_co2_breakdown / calculate_co2 for many rows at once.
+
+    Parameters
+    - frame: pandas DataFrame with one activity row per record. Columns are
+      matched like dict keys (normalized); unknown columns are ignored.
+    - categories: optional {"Energy": [keys...], ...}; adds one "<name>_kg"
+      column per category, rounded to 2 decimals.
+
+    Returns
+    - DataFrame with one kg CO₂ column per recognized activity (normalized key)
+      plus "total_kg" rounded to 2 decimals, aligned to frame.index.
+
+    Behavior matches the per-row functions: non-numeric amounts count as 0,
+    negative amounts are treated as 0, and totals round exactly like round().
+    """
+    import numpy as np
+    import pandas as pd
+
+    columns: Dict[str, list] = {}
+    for col in frame.columns:
+        key = normalize_activity_name(str(col))
+        if key in CO2_FACTORS:
+            columns.setdefault(key, []).append(col)
+
+    kg = pd.DataFrame(index=frame.index)
+    for key, cols in columns.items():
+        amounts = frame[cols].apply(pd.to_numeric, errors="coerce").fillna(0.0).clip(lower=0.0)
+        # Several raw columns can map to one key ("Electricity (kWh)", "electricity_kwh")
+        kg[key] = amounts.sum(axis=1) * CO2_FACTORS[key]
+
+    def _round2(values) -> "pd.Series":
+        # np.round works on x*100 and can disagree with round() only when x*100
+        # lies within rounding error of a .5 tie (or is too large to be exact);
+        # those few values are rounded one by one with round().
+        v = values.to_numpy(dtype=float)
+        scaled = v * 100.0
+        out = np.round(scaled) / 100.0
+        near_tie = np.abs(scaled - np.floor(scaled) - 0.5) <= 1e-9 * np.maximum(1.0, np.abs(scaled))
+        for i in np.flatnonzero(near_tie):
+            out[i] = round(float(v[i]), 2)
+        return pd.Series(out, index=frame.index, dtype=float)
+
+    activity_cols = list(kg.columns)
+    kg["total_kg"] = _round2(kg[activity_cols].sum(axis=1))
+    for name, keys in (categories or {}).items():
+        present = [k for k in keys if k in activity_cols]
+        kg[f"{name}_kg"] = _round2(kg[present].sum(axis=1))
+    return kg
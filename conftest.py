@@ -0,0 +1,5 @@
+# Keep the suite hermetic: ai_tips loads .env lazily on first use, and a
+# developer's real OPENAI_API_KEY must not leak into tests that unset it.
+import ai_tips
+
+ai_tips._env_loaded = True
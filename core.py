@@ -0,0 +1,621 @@
+"""
+core.py
+
+UI-free core of the Sustainability Tracker: category mapping, history storage,
+streaks/badges, input validation and summary formatting.
+
+Everything here is importable without Streamlit, so batch jobs, workers, CLIs
+and tests can use it directly; app.py is a thin Streamlit shell on top.
+
+Provided helpers:
+- CATEGORY_MAP / ALL_KEYS: activity keys per category.
+- compute_category_emissions(activity_data): kg CO₂ per category.
+- compute_category_frame(df): the same for every history row at once (plus total).
+- build_spark_data(df, window_days): per-category values for the last N logged days.
+- load_history(path) / save_entry(date, data, total, path): CSV history store.
+- iter_history_rows(path, start, end, chunksize): stream history in date-filtered chunks.
+- get_yesterday_total, compute_streak, award_badges: dashboard KPIs.
+- history_views(path) / history_kpis(date, path): memoized dashboard views,
+  keyed by history version + factor-set version (bounded LRU).
+- chart_series(name, path, start, end, max_points): downsampled chart data,
+  memoized the same way.
+- history_page(path, start, end, columns, page, page_size) / count_history:
+  paginated range queries on the cached views (binary search on dates).
+- has_meaningful_input, find_invalid_fields, should_generate_tip: validation.
+- format_summary, dominant_category_icon: plain-text summary helpers.
+"""
+
+from __future__ import annotations
+
+import datetime as dt
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+
+import downsample
+import metrics
+from co2_engine import CO2_FACTORS
+from tracing import traced
+from utils import percentage_change
+
+# =========================
+# Category Mapping & Storage
+# =========================
+CATEGORY_MAP = {
+    "Energy": [
+        "electricity_kwh",
+        "natural_gas_m3",
+        "hot_water_liter",
+        "cold_water_liter",
+        "district_heating_kwh",
+        "propane_liter",
+        "fuel_oil_liter",
+    ],
+    "Transport": [
+        "petrol_liter",
+        "diesel_liter",
+        "bus_km",
+        "train_km",
+        "bicycle_km",
+        "flight_short_km",
+        "flight_long_km",
+    ],
+    "Meals": [
+        "meat_kg",
+        "chicken_kg",
+        "eggs_kg",
+        "dairy_kg",
+        "vegetarian_kg",
+        "vegan_kg",
+    ],
+}
+ALL_KEYS = [k for keys in CATEGORY_MAP.values() for k in keys]
+
+HISTORY_FILE = os.path.join(os.path.dirname(__file__), "history.csv")
+
+# =========================
+# Helper Functions
+# =========================
+@traced()
+def compute_category_emissions(activity_data: dict) -> dict:
+    result = {}
+    for cat, keys in CATEGORY_MAP.items():
+        subtotal = 0.0
+        for k in keys:
+            amt = float(activity_data.get(k, 0) or 0)
+            factor = CO2_FACTORS.get(k)
+            if factor is not None:
+                subtotal += amt * factor
+        result[cat] = round(subtotal, 2)
+    return result
+
+
+def category_factor_matrix(columns, categories: dict | None = None) -> np.ndarray:
+    """Activity-by-category factor matrix (rows follow columns; 0 outside a category),
+    with one extra last column holding every activity's factor, for the total."""
+    categories = CATEGORY_MAP if categories is None else categories
+    row_of = {k: i for i, k in enumerate(columns)}
+    matrix = np.zeros((len(row_of), len(categories) + 1))
+    for j, keys in enumerate(categories.values()):
+        for k in keys:
+            if k in row_of:
+                matrix[row_of[k], j] = CO2_FACTORS.get(k, 0.0)
+    for k, i in row_of.items():
+        matrix[i, -1] = CO2_FACTORS.get(k, 0.0)
+    return matrix
+
+
+def compute_category_frame(df: pd.DataFrame, categories: dict | None = None) -> pd.DataFrame:
+    """Per-row kg CO₂ for every category plus "total_kg", in one matrix product.
+
+    Rows are activity amounts (history rows, export rows); missing activity
+    columns count as 0. Unlike the stored total_kg column, the total here is
+    recomputed from the current factors and is not rounded.
+    """
+    categories = CATEGORY_MAP if categories is None else categories
+    names = list(categories) + ["total_kg"]
+    present = [k for k in dict.fromkeys(k for keys in categories.values() for k in keys) if k in df.columns]
+    if not present:
+        return pd.DataFrame(0.0, index=df.index, columns=names)
+    amounts = df[present].to_numpy(dtype=float, na_value=0.0)
+    values = amounts @ category_factor_matrix(present, categories)
+    return pd.DataFrame(values, index=df.index, columns=names)
+
+
+def daily_category_frame(df: pd.DataFrame) -> pd.DataFrame:
+    """Category kg (rounded like compute_category_emissions) for the last row logged
+    on each date, indexed by date and sorted ascending."""
+    if df.empty or "date" not in df.columns:
+        return pd.DataFrame(columns=list(CATEGORY_MAP))
+    dates = pd.to_datetime(df["date"]).dt.normalize()
+    # Later rows for the same date win, as in the file
+    last = df.assign(date=dates).drop_duplicates("date", keep="last").sort_values("date", kind="stable")
+    daily = compute_category_frame(last)[list(CATEGORY_MAP)].round(2)
+    return daily.set_axis(pd.DatetimeIndex(last["date"]))
+
+
+def build_spark_data(df: pd.DataFrame, window_days: int = 7, daily: pd.DataFrame | None = None) -> dict:
+    """{category: [kg, ...]} over the last window_days logged dates, oldest first.
+
+    Pass a precomputed daily_category_frame (e.g. history_views()["daily"]) to
+    make any window a cheap tail slice.
+    """
+    daily = daily_category_frame(df) if daily is None else daily
+    recent = daily.tail(max(1, int(window_days)))
+    if recent.empty:
+        return {}
+    return {cat: [float(v) for v in recent[cat].tolist()] for cat in recent.columns}
+
+
+@traced()
+def load_history(path: str | None = None) -> pd.DataFrame:
+    path = path or HISTORY_FILE
+    if os.path.exists(path):
+        try:
+            with metrics.HISTORY_LOAD_SECONDS.time():
+                df = pd.read_csv(path, parse_dates=["date"])
+            return df
+        except Exception:
+            return pd.DataFrame()
+    return pd.DataFrame()
+
+
+def iter_history_rows(path: str | None = None, start: dt.date | None = None, end: dt.date | None = None, chunksize: int = 5000):
+    """Yield history rows in DataFrame chunks of at most chunksize, limited to [start, end].
+
+    Only one chunk is in memory at a time, so long ranges can be processed with
+    flat memory. save_entry keeps the file sorted by date, which lets the scan
+    stop at the first chunk past `end`.
+    """
+    path = path or HISTORY_FILE
+    if not os.path.exists(path):
+        return
+    try:
+        reader = pd.read_csv(path, parse_dates=["date"], chunksize=max(1, int(chunksize)))
+    except Exception:
+        return
+    with reader:
+        for chunk in reader:
+            days = chunk["date"].dt.date
+            mask = pd.Series(True, index=chunk.index)
+            if start is not None:
+                mask &= days >= start
+            if end is not None:
+                mask &= days <= end
+            if mask.any():
+                yield chunk[mask]
+            if end is not None and not chunk.empty and days.min() > end:
+                return
+
+
+@traced()
+def save_entry(date_val: dt.date, activity_data: dict, total: float, path: str | None = None):
+    path = path or HISTORY_FILE
+    df = load_history(path)
+    row = {"date": pd.to_datetime(date_val)}
+    for k in ALL_KEYS:
+        row[k] = float(activity_data.get(k, 0) or 0)
+    row["total_kg"] = float(total)
+
+    if df.empty:
+        df = pd.DataFrame([row])
+    else:
+        mask = df["date"].dt.date == date_val
+        if mask.any():
+            # Upsert
+            df.loc[mask, list(row.keys())] = list(row.values())
+        else:
+            df = pd.concat([df, pd.DataFrame([row])], ignore_index=True)
+
+    df = df.sort_values("date")
+    df.to_csv(path, index=False)
+    _bump_history_writes(path)
+    metrics.HISTORY_SAVES.inc()
+
+
+def get_yesterday_total(df: pd.DataFrame, date_val: dt.date) -> float:
+    if df.empty:
+        return 0.0
+    yesterday = pd.to_datetime(date_val) - pd.Timedelta(days=1)
+    mask = df["date"].dt.date == yesterday.date()
+    if mask.any():
+        return float(df.loc[mask, "total_kg"].iloc[0])
+    return 0.0
+
+
+def compute_streak(df: pd.DataFrame, date_val: dt.date) -> int:
+    """Compute the current streak of consecutive days up to date_val."""
+    if df.empty:
+        return 0
+
+    # Ensure all dates are datetime.date
+    df_dates = df["date"].dt.date if pd.api.types.is_datetime64_any_dtype(df["date"]) else df["date"]
+    dayset = set(df_dates)
+
+    streak = 0
+    current = date_val
+    while current in dayset:
+        streak += 1
+        current -= dt.timedelta(days=1)
+
+    return streak
+
+
+def award_badges(today_total: float, streak: int, df: pd.DataFrame) -> list:
+    if df.empty:
+        return badges_from_stats(today_total, streak, has_entries=False, avg7=0.0)
+    recent = df.tail(7)
+    avg7 = float(recent["total_kg"].mean()) if not recent.empty else 0.0
+    return badges_from_stats(today_total, streak, has_entries=True, avg7=avg7)
+
+
+def badges_from_stats(today_total: float, streak: int, has_entries: bool, avg7: float) -> list:
+    """award_badges on precomputed history stats (see history_views)."""
+    badges = []
+    if has_entries:
+        badges.append("📅 Consistency: Entries logged!")
+    if today_total < 20:
+        badges.append("🌿 Low Impact Day (< 20 kg)")
+    if streak >= 3:
+        badges.append("🔥 3-Day Streak")
+    if streak >= 7:
+        badges.append("🏆 7-Day Streak")
+    if has_entries and avg7 and today_total < 0.9 * avg7:
+        badges.append("📈 10% Better than 7-day avg")
+    return badges
+
+
+# =========================
+# Derived-view cache
+# =========================
+# Streamlit reruns main() on every widget interaction. The history-derived
+# frames only change when the history file or the factor set changes, so they
+# are memoized on (path, history version, factor-set version). Only the current
+# version of each path is kept (a newer one replaces it), for at most
+# DERIVED_VIEW_CACHE_SIZE paths. Cached frames are shared between reruns and
+# sessions: treat them as read-only.
+DERIVED_VIEW_CACHE_SIZE = int(os.getenv("DERIVED_VIEW_CACHE_SIZE", "16"))
+
+_history_writes: dict = {}
+_history_writes_lock = threading.Lock()
+
+_views: "OrderedDict[str, tuple]" = OrderedDict()  # path -> ((version, factors_version), views)
+_views_lock = threading.Lock()
+_views_stats = {"hits": 0, "misses": 0}
+
+
+def _bump_history_writes(path: str) -> None:
+    with _history_writes_lock:
+        _history_writes[path] = _history_writes.get(path, 0) + 1
+
+
+def history_version(path: str | None = None) -> tuple:
+    """Cheap change token for a history file: (mtime_ns, size, in-process writes)."""
+    path = path or HISTORY_FILE
+    try:
+        st_ = os.stat(path)
+        stamp = (st_.st_mtime_ns, st_.st_size)
+    except OSError:
+        stamp = (0, 0)
+    # The write counter catches two saves within one mtime tick with equal size
+    return stamp + (_history_writes.get(path, 0),)
+
+
+def factor_set_version() -> str:
+    """Hash of CO2_FACTORS and CATEGORY_MAP; changes if factors are edited at runtime."""
+    raw = repr((sorted(CO2_FACTORS.items()), sorted((k, tuple(v)) for k, v in CATEGORY_MAP.items())))
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()[:12]
+
+
+def seven_day_delta(s: pd.Series | None):
+    """(sum of the last 7 values, % change vs. the 7 before) or (None, None)."""
+    if s is None or s.empty:
+        return None, None
+    s = s.dropna()
+    if len(s) < 2:
+        return None, None
+    last7 = float(s.iloc[-7:].sum())
+    prev7 = float(s.iloc[-14:-7].sum()) if len(s) >= 14 else 0.0
+    return last7, percentage_change(prev7, last7)
+
+
+def _history_views_cached(path: str, version: tuple, factors_version: str) -> dict:
+    key = (version, factors_version)
+    with _views_lock:
+        entry = _views.get(path)
+        if entry is not None and entry[0] == key:
+            _views.move_to_end(path)
+            _views_stats["hits"] += 1
+            return entry[1]
+        _views_stats["misses"] += 1
+    views = _build_history_views(path)
+    with _views_lock:
+        # Replaces any older version of this path instead of keeping it around
+        _views[path] = (key, views)
+        _views.move_to_end(path)
+        while len(_views) > max(1, DERIVED_VIEW_CACHE_SIZE):
+            _views.popitem(last=False)
+    return views
+
+
+def _build_history_views(path: str) -> dict:
+    df = load_history(path)
+    views = {
+        "history": df,
+        "sorted": pd.DataFrame(),
+        "dates": np.array([], dtype="datetime64[ns]"),
+        "series": {},
+        "deltas": {},
+        "dayset": frozenset(),
+        "totals_by_date": {},
+        "daily": pd.DataFrame(columns=list(CATEGORY_MAP)),
+        "avg7": 0.0,
+    }
+    if df.empty:
+        return views
+    days = df["date"].dt.date
+    df_sorted = df.sort_values("date", kind="stable").reset_index(drop=True)
+    index = pd.DatetimeIndex(df_sorted["date"])
+    cat_frame = compute_category_frame(df_sorted)
+    for cat, keys in CATEGORY_MAP.items():
+        # Categories with none of their columns in the file show "No data yet"
+        if any(k in df_sorted.columns for k in keys):
+            s = cat_frame[cat].set_axis(index)
+        else:
+            s = pd.Series(dtype=float)
+        views["series"][cat] = s
+        views["deltas"][cat] = seven_day_delta(s)
+    recent = df.tail(7)
+    first_per_day = ~days.duplicated()
+    views.update(
+        sorted=df_sorted,
+        dates=df_sorted["date"].to_numpy(),
+        daily=daily_category_frame(df),
+        dayset=frozenset(days),
+        # First row per date wins, like get_yesterday_total
+        totals_by_date=dict(zip(days[first_per_day], df.loc[first_per_day, "total_kg"].astype(float))),
+        avg7=float(recent["total_kg"].mean()) if not recent.empty else 0.0,
+    )
+    return views
+
+
+def history_views(path: str | None = None) -> dict:
+    """Memoized dashboard views of the history file.
+
+    Keys: history (as loaded), sorted (by date, stable) and dates (its date
+    column as a datetime64 array, for range lookups), series / deltas ({category: kg series indexed by date / 7-day delta}),
+    dayset (logged dates), totals_by_date, daily (daily_category_frame, for
+    sparklines) and avg7 (mean total of the last 7 rows).
+    """
+    path = path or HISTORY_FILE
+    return _history_views_cached(path, history_version(path), factor_set_version())
+
+
+@lru_cache(maxsize=1)
+def _history_csv_cached(path: str, version: tuple, factors_version: str) -> str:
+    return _history_views_cached(path, version, factors_version)["history"].to_csv(index=False)
+
+
+def history_csv(path: str | None = None) -> str:
+    """The history as export CSV text.
+
+    Built on demand (it costs more than all the other views together on a long
+    history) and cached for the latest version only.
+    """
+    path = path or HISTORY_FILE
+    return _history_csv_cached(path, history_version(path), factor_set_version())
+
+
+def history_kpis(date_val: dt.date, path: str | None = None) -> dict:
+    """Yesterday's total and the streak ending at date_val, from the cached views."""
+    views = history_views(path)
+    streak = 0
+    current = date_val
+    while current in views["dayset"]:
+        streak += 1
+        current -= dt.timedelta(days=1)
+    yesterday = date_val - dt.timedelta(days=1)
+    return {"yesterday_total": float(views["totals_by_date"].get(yesterday, 0.0)), "streak": streak}
+
+
+@lru_cache(maxsize=8 * DERIVED_VIEW_CACHE_SIZE)
+def _chart_series_cached(path: str, version: tuple, factors_version: str, name: str, start, end, max_points: int, method: str) -> pd.Series:
+    views = _history_views_cached(path, version, factors_version)
+    if name == "total_kg":
+        df = views["sorted"]
+        s = pd.Series(df["total_kg"].to_numpy(dtype=float), index=pd.DatetimeIndex(df["date"]), name="total_kg") if not df.empty else pd.Series(dtype=float)
+    else:
+        s = views["series"].get(name, pd.Series(dtype=float))
+    if s.empty:
+        return s
+    if start is not None:
+        s = s[s.index >= pd.Timestamp(start)]
+    if end is not None:
+        s = s[s.index < pd.Timestamp(end) + pd.Timedelta(days=1)]
+    return downsample.downsample(s, max_points, method)
+
+
+def chart_series(name: str = "total_kg", path: str | None = None, start: dt.date | None = None, end: dt.date | None = None, max_points: int | None = None, method: str | None = None) -> pd.Series:
+    """"total_kg" or a category's kg series within [start, end], downsampled to
+    at most ~max_points points (default: a full-width chart), indexed by date.
+
+    Cached per history version, like history_views, so reruns reuse the
+    reduced series instead of sending every daily point to the chart.
+    """
+    path = path or HISTORY_FILE
+    max_points = int(max_points or downsample.points_for_width())
+    method = method or downsample.CHART_DOWNSAMPLE
+    return _chart_series_cached(path, history_version(path), factor_set_version(), name, start, end, max_points, method)
+
+
+def _date_bounds(dates: np.ndarray, start: dt.date | None, end: dt.date | None) -> tuple:
+    """Positions [lo, hi) of sorted dates within [start, end]; two binary searches."""
+    lo = 0 if start is None else int(np.searchsorted(dates, np.datetime64(start, "D"), side="left"))
+    hi = len(dates) if end is None else int(np.searchsorted(dates, np.datetime64(end, "D") + np.timedelta64(1, "D"), side="left"))
+    return lo, max(lo, hi)
+
+
+def count_history(path: str | None = None, start: dt.date | None = None, end: dt.date | None = None) -> int:
+    """Number of history rows dated within [start, end], without touching the rows."""
+    lo, hi = _date_bounds(history_views(path)["dates"], start, end)
+    return hi - lo
+
+
+def history_page(
+    path: str | None = None,
+    start: dt.date | None = None,
+    end: dt.date | None = None,
+    columns: list | None = None,
+    page: int = 1,
+    page_size: int = 50,
+    newest_first: bool = True,
+) -> dict:
+    """One page of history rows within [start, end], for paginated tables.
+
+    Only the rows and columns of the requested page are copied out of the
+    cached sorted frame; the date column is returned as dates. Returns
+    {"rows", "total" (rows in range), "page" (1-based, clamped), "pages"}.
+    """
+    views = history_views(path)
+    df = views["sorted"]
+    lo, hi = _date_bounds(views["dates"], start, end)
+    total = hi - lo
+    page_size = max(1, int(page_size))
+    pages = max(1, -(-total // page_size))
+    page = min(max(1, int(page)), pages)
+    cols = [c for c in dict.fromkeys(["date", *(columns if columns is not None else df.columns)]) if c in df.columns]
+    if newest_first:
+        stop = hi - (page - 1) * page_size
+        rows = df.iloc[max(lo, stop - page_size):stop][cols].iloc[::-1]
+    else:
+        first = lo + (page - 1) * page_size
+        rows = df.iloc[first:min(hi, first + page_size)][cols]
+    if not rows.empty:
+        rows = rows.assign(date=rows["date"].dt.date)
+    return {"rows": rows, "total": total, "page": page, "pages": pages}
+
+
+def clear_view_cache() -> None:
+    with _views_lock:
+        _views.clear()
+        _views_stats.update(hits=0, misses=0)
+    _history_csv_cached.cache_clear()
+    _chart_series_cached.cache_clear()
+
+
+def view_cache_info() -> dict:
+    """Hits, misses, maxsize (paths) and currsize of the derived-view cache."""
+    with _views_lock:
+        return {**_views_stats, "maxsize": DERIVED_VIEW_CACHE_SIZE, "currsize": len(_views)}
+
+# =========================
+# Helper formatters
+# =========================
+def format_summary(user_data: dict) -> str:
+    """Return a compact, human-friendly summary of today's inputs.
+    Only include fields that are present and > 0 where numeric.
+    """
+    parts: list[str] = []
+    def _num(v):
+        try:
+            return float(v)
+        except Exception:
+            return v
+
+    # Transport
+    if (val := _num(user_data.get("petrol_liter"))) and isinstance(val, float) and val > 0:
+        parts.append(f"🚗 Petrol: {val:.1f} L")
+    if (val := _num(user_data.get("diesel_liter"))) and isinstance(val, float) and val > 0:
+        parts.append(f"🚙 Diesel: {val:.1f} L")
+    if (val := _num(user_data.get("bus_km"))) and isinstance(val, float) and val > 0:
+        parts.append(f"🚌 Bus: {val:.0f} km")
+    if (val := _num(user_data.get("train_km"))) and isinstance(val, float) and val > 0:
+        parts.append(f"🚆 Train: {val:.0f} km")
+    if (val := _num(user_data.get("bicycle_km"))) and isinstance(val, float) and val > 0:
+        parts.append(f"🚴 Bike: {val:.0f} km")
+
+    # Energy
+    if (val := _num(user_data.get("electricity_kwh"))) and isinstance(val, float) and val > 0:
+        parts.append(f"⚡ Electricity: {val:.1f} kWh")
+    if (val := _num(user_data.get("district_heating_kwh"))) and isinstance(val, float) and val > 0:
+        parts.append(f"🔥 District heat: {val:.1f} kWh")
+    if (val := _num(user_data.get("natural_gas_m3"))) and isinstance(val, float) and val > 0:
+        parts.append(f"🏠 Gas: {val:.1f} m³")
+    if (val := _num(user_data.get("hot_water_liter"))) and isinstance(val, float) and val > 0:
+        parts.append(f"🚿 Hot water: {val:.0f} L")
+
+    # Meals
+    meal_bits = []
+    for key, label in [
+        ("meat_kg", "🥩 Meat"),
+        ("chicken_kg", "🍗 Chicken"),
+        ("dairy_kg", "🥛 Dairy"),
+        ("eggs_kg", "🥚 Eggs"),
+        ("vegetarian_kg", "🥗 Veg"),
+        ("vegan_kg", "🌱 Vegan"),
+    ]:
+        val = _num(user_data.get(key))
+        if isinstance(val, float) and val > 0:
+            meal_bits.append(f"{label}: {val:.2f} kg")
+    if meal_bits:
+        parts.append(" | ".join(meal_bits))
+
+    return " | ".join(parts) if parts else "No activities logged yet."
+
+
+def dominant_category_icon(user_data: dict) -> tuple[str, str]:
+    """Return (icon, category_label) for the dominant emitting category.
+    Defaults to neutral if nothing is logged.
+    """
+    try:
+        cat = compute_category_emissions(user_data)
+    except Exception:
+        cat = {}
+    if not cat:
+        return ("💡", "Tip")
+    dom = max(cat.items(), key=lambda x: x[1])[0]
+    icon_map = {"Energy": "⚡", "Transport": "🚗", "Meals": "🥗"}
+    return (icon_map.get(dom, "💡"), dom)
+
+
+# =========================
+# Validation helpers
+# =========================
+def _coerce_float(v):
+    try:
+        return float(v)
+    except Exception:
+        return None
+
+def has_meaningful_input(user_data: dict) -> bool:
+    """True if at least one numeric input is > 0."""
+    for v in user_data.values():
+        fv = _coerce_float(v)
+        if fv is not None and fv > 0:
+            return True
+    return False
+
+def find_invalid_fields(user_data: dict) -> list[str]:
+    """Return keys that are negative or non-numeric when a number is expected."""
+    bad = []
+    for k, v in user_data.items():
+        fv = _coerce_float(v)
+        if fv is None:
+            bad.append(k)
+        elif fv < 0:
+            bad.append(k)
+    return bad
+
+def should_generate_tip(user_data: dict) -> bool:
+    """Pure decision helper: return True if inputs are valid and meaningful.
+    This is used by the UI layer and covered by unit tests.
+    """
+    invalid = find_invalid_fields(user_data)
+    if invalid:
+        return False
+    return has_meaningful_input(user_data)
@@ -0,0 +1,112 @@
+"""
+downsample.py
+
+Reduce long time series to a bounded number of points before charting.
+
+A chart a few hundred pixels wide cannot show more than a point or two per
+pixel, so sending thousands of daily values only costs payload and browser
+time. Two methods, both always keeping the first and last point:
+
+- "lttb": Largest-Triangle-Three-Buckets. Picks, per bucket, the point that
+  forms the largest triangle with the previously kept point and the next
+  bucket's average, which preserves the visual shape of a line.
+- "minmax": the lowest and highest point of every bucket, so single-day
+  spikes (a flight) always survive. Output has up to 2 points per bucket.
+
+Settings (env):
+- CHART_WIDTH_PX: assumed width of a full-width chart (default 1400).
+- CHART_PX_PER_POINT: horizontal pixels per plotted point (default 2).
+- CHART_DOWNSAMPLE: "lttb" (default), "minmax" or "none".
+
+Provided helpers:
+- lttb_indices(x, y, n_out), minmax_indices(y, n_out): positions to keep.
+- downsample(series, max_points, method): the reduced Series (same index type).
+- points_for_width(fraction): point budget for a chart spanning a fraction of the page.
+"""
+
+from __future__ import annotations
+
+import os
+
+import numpy as np
+import pandas as pd
+
+CHART_WIDTH_PX = int(os.getenv("CHART_WIDTH_PX", "1400"))
+CHART_PX_PER_POINT = float(os.getenv("CHART_PX_PER_POINT", "2"))
+CHART_DOWNSAMPLE = os.getenv("CHART_DOWNSAMPLE", "lttb").lower()
+MIN_POINTS = 50
+METHODS = ("lttb", "minmax", "none")
+
+
+def points_for_width(fraction: float = 1.0, width_px: int | None = None, px_per_point: float | None = None) -> int:
+    """Point budget for a chart `fraction` of the page wide (at least MIN_POINTS)."""
+    width = (width_px or CHART_WIDTH_PX) * max(0.0, fraction)
+    return max(MIN_POINTS, int(width / (px_per_point or CHART_PX_PER_POINT)))
+
+
+def lttb_indices(x: np.ndarray, y: np.ndarray, n_out: int) -> np.ndarray:
+    """Positions of the n_out points LTTB keeps (all positions if n_out >= len(x))."""
+    n = len(x)
+    if n_out >= n or n <= 2:
+        return np.arange(n)
+    if n_out < 3:
+        return np.array([0, n - 1])[:max(n_out, 1)]
+    x = np.asarray(x, dtype=float) - float(x[0])
+    y = np.asarray(y, dtype=float)
+    # n_out - 2 buckets between the fixed first and last points
+    edges = (np.arange(n_out - 1) * ((n - 2) / (n_out - 2))).astype(np.int64) + 1
+    edges[-1] = n - 1
+    out = np.empty(n_out, dtype=np.int64)
+    out[0], out[-1] = 0, n - 1
+    a = 0
+    for i in range(n_out - 2):
+        lo, hi = edges[i], edges[i + 1]
+        nlo, nhi = (edges[i + 1], edges[i + 2]) if i + 2 < len(edges) else (n - 1, n)
+        avg_x, avg_y = x[nlo:nhi].mean(), y[nlo:nhi].mean()
+        area = np.abs((x[a] - avg_x) * (y[lo:hi] - y[a]) - (x[a] - x[lo:hi]) * (avg_y - y[a]))
+        a = lo + int(np.argmax(area))
+        out[i + 1] = a
+    return out
+
+
+def minmax_indices(y: np.ndarray, n_out: int) -> np.ndarray:
+    """Sorted positions of each bucket's min and max (about n_out in total)."""
+    n = len(y)
+    if n_out >= n or n <= 2:
+        return np.arange(n)
+    y = np.asarray(y, dtype=float)
+    buckets = max(1, (n_out - 2) // 2)
+    edges = np.linspace(0, n, buckets + 1).astype(np.int64)
+    bucket = np.repeat(np.arange(buckets), np.diff(edges))
+    # Lexsort by (value, bucket): the first/last entry of each bucket run is its min/max
+    order = np.lexsort((y, bucket))
+    starts = edges[:-1]
+    ends = edges[1:] - 1
+    keep = np.concatenate(([0, n - 1], order[starts], order[ends]))
+    return np.unique(keep)
+
+
+def downsample(series: pd.Series, max_points: int, method: str | None = None) -> pd.Series:
+    """series (sorted by index) reduced to about max_points points.
+
+    NaNs are dropped; short series are returned unchanged.
+    """
+    method = (method or CHART_DOWNSAMPLE).lower()
+    if method not in METHODS:
+        raise ValueError(f"Unknown downsampling method {method!r}; choose from {', '.join(METHODS)}")
+    s = series.dropna()
+    if method == "none" or len(s) <= max_points:
+        return s
+    y = s.to_numpy(dtype=float)
+    if method == "minmax":
+        idx = minmax_indices(y, max_points)
+    else:
+        index = s.index
+        if isinstance(index, pd.DatetimeIndex):
+            x = index.asi8
+        elif pd.api.types.is_numeric_dtype(index):
+            x = index.to_numpy(dtype=float)
+        else:
+            x = np.arange(len(s))
+        idx = lttb_indices(x, y, max_points)
+    return s.iloc[idx]
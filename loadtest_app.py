@@ -0,0 +1,394 @@
+"""
+loadtest_app.py
+
+Drive N concurrent Streamlit sessions of app.py headlessly (streamlit.testing
+AppTest) and report rerun latency percentiles, throughput, CPU and memory.
+
+Every session runs in its own process. The Streamlit server runs one script
+thread per session in a single process, but AppTest instances share runtime
+state and are not safe to drive from several threads at once, so processes
+are what keeps runs deterministic. Sessions are started together (after their
+imports) and compete for the CPUs and the mock tip server. Each session opens
+the app and then performs --actions random actions from --mix:
+
+- edit:   change 1-3 activity inputs (reruns only with --live-inputs; in the
+          default form mode edits stay in the browser until the next save)
+- save:   click "Calculate & Save" (writes the session's history file)
+- browse: pick another date in the last 60 days (KPIs for that day)
+- tab:    change an option inside the Eco Tips tab. Switching tabs itself is
+          client-side in Streamlit (every tab body runs on every rerun), so an
+          interaction inside a tab is the server-side equivalent.
+- pdf:    click "Generate Eco Tips PDF" and rerun until the download appears
+
+Each session gets its own copy of a synthetic single-user history
+(synthetic_history.py) and its own perf log in a temp directory, and tips come
+from a MockOpenAIServer started by this process, so no API key, real data or
+the repo's perf_log.jsonl is touched, and the calling process is left as it was.
+
+CPU is the session processes' CPU time over the run (PDF worker processes are
+not included); memory is the mean RSS of a session process at start and end
+and its growth, plus the deep size of each session's session_state.
+
+Examples:
+    python loadtest_app.py --sessions 8 --actions 20
+    python loadtest_app.py --sessions 32 --actions 10 --mix edit:2,save:1,browse:2 --think 0.5
+    python loadtest_app.py --sessions 4 --live-inputs --latency lognormal:0.8:0.4 --json
+"""
+
+from __future__ import annotations
+
+import argparse
+import datetime as dt
+import json
+import multiprocessing
+import os
+import queue
+import random
+import shutil
+import statistics
+import tempfile
+import threading
+import time
+from typing import Dict, List, Optional
+
+import ai_tips
+import core
+import memprof
+from loadtest_tips import percentile
+from mock_openai_server import MockOpenAIServer
+
+APP_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "app.py")
+DEFAULT_MIX = "edit:4,save:2,browse:2,tab:2,pdf:1"
+INPUT_KEYS = {k: 20.0 for k in core.ALL_KEYS}
+INPUT_KEYS.update({"hot_water_liter": 150.0, "cold_water_liter": 200.0, "flight_short_km": 1500.0, "flight_long_km": 8000.0, "meat_kg": 1.0})
+
+
+def parse_mix(spec: str) -> Dict[str, float]:
+    """"edit:4,save:1" -> {"edit": 4.0, "save": 1.0}; unknown actions raise ValueError."""
+    mix = {}
+    for part in spec.split(","):
+        if not part.strip():
+            continue
+        name, _, weight = part.partition(":")
+        name = name.strip()
+        if name not in ACTIONS:
+            raise ValueError(f"Unknown action {name!r}; choose from {', '.join(ACTIONS)}")
+        mix[name] = float(weight or 1)
+    if not mix or sum(mix.values()) <= 0:
+        raise ValueError("Action mix is empty")
+    return mix
+
+
+def _rss_bytes() -> int:
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        import resource
+
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024  # peak, in KB on Linux
+
+
+class Session:
+    """One simulated user: an AppTest instance plus its recorded timings."""
+
+    def __init__(self, index: int, seed: int, live_inputs: bool, timeout_s: float, pdf_wait_s: float, think_s: float):
+        from streamlit.testing.v1 import AppTest
+
+        self.at = AppTest.from_file(APP_PATH, default_timeout=timeout_s)
+        self.rng = random.Random(seed * 1000 + index)
+        self.live_inputs = live_inputs
+        self.pdf_wait_s = pdf_wait_s
+        self.think_s = think_s
+        self.samples: List[tuple] = []  # (action, seconds) per rerun
+        self.pdf_times: List[float] = []
+        self.pdf_timeouts = 0
+        self.pdf_failures = 0
+        self.errors = 0
+        self.state_bytes = 0
+
+    def rerun(self, action: str, widget=None) -> None:
+        t0 = time.perf_counter()
+        (widget or self.at).run()
+        self.samples.append((action, time.perf_counter() - t0))
+        self.errors += len(self.at.exception)
+
+    def run(self, actions: int, mix: Dict[str, float]) -> None:
+        self.rerun("open")
+        if self.live_inputs:
+            self.rerun("open", self.at.checkbox(key="tip_prefetch").check())
+        names, weights = list(mix), list(mix.values())
+        for _ in range(actions):
+            if self.think_s:
+                time.sleep(self.rng.uniform(0, 2 * self.think_s))
+            ACTIONS[self.rng.choices(names, weights)[0]](self)
+        self.state_bytes = sum(r["bytes"] for r in memprof.session_state_sizes(self.at.session_state.to_dict()))
+
+    def _button(self, prefix: str):
+        return next(b for b in self.at.button if b.label.startswith(prefix))
+
+    def edit(self) -> None:
+        for key in self.rng.sample(list(INPUT_KEYS), self.rng.randint(1, 3)):
+            self.at.number_input(key=f"in_{key}").set_value(round(self.rng.uniform(0, INPUT_KEYS[key]), 1))
+        if self.live_inputs:
+            self.rerun("edit")
+
+    def save(self) -> None:
+        self.rerun("save", self._button("Calculate & Save").click())
+
+    def browse(self) -> None:
+        day = dt.date.today() - dt.timedelta(days=self.rng.randint(0, 60))
+        self.rerun("browse", self.at.date_input[0].set_value(day))
+
+    def tab(self) -> None:
+        self.rerun("tab", self.at.checkbox(key="pdf_include_pie").set_value(self.rng.random() < 0.5))
+
+    def pdf(self) -> None:
+        t0 = time.perf_counter()
+        self.rerun("pdf", self._button("Generate Eco Tips PDF").click())
+        while True:
+            if len(self.at.error):
+                self.pdf_failures += 1  # the app reported a failed render
+                return
+            if any("Download Eco Tips PDF" in str(d.proto.label) for d in self.at.get("download_button")):
+                self.pdf_times.append(time.perf_counter() - t0)
+                return
+            if time.perf_counter() - t0 > self.pdf_wait_s:
+                self.pdf_timeouts += 1
+                return
+            time.sleep(0.25)
+            self.rerun("pdf.poll")
+
+
+ACTIONS = {"edit": Session.edit, "save": Session.save, "browse": Session.browse, "tab": Session.tab, "pdf": Session.pdf}
+
+
+def _latency_stats(values: List[float]) -> dict:
+    values = sorted(values)
+    return {
+        "count": len(values),
+        "p50_s": round(percentile(values, 50), 4),
+        "p95_s": round(percentile(values, 95), 4),
+        "p99_s": round(percentile(values, 99), 4),
+        "max_s": round(values[-1], 4) if values else 0.0,
+    }
+
+
+def _session_main(index: int, config: dict, barrier, results) -> None:
+    """Session process: isolate the app state, wait for the start, run and report."""
+    report = {"index": index, "failure": None, "samples": [], "pdf_times": [], "pdf_timeouts": 0, "pdf_failures": 0,
+              "errors": 0, "state_bytes": 0, "cpu_s": 0.0, "rss_start": 0, "rss_end": 0, "tips": {}}
+    session = None
+    try:
+        from openai import OpenAI
+
+        os.environ["OPENAI_API_KEY"] = config["api_key"]
+        os.environ["PERF_LOG_PATH"] = config["perf_log"]  # perf_log reads it when the logger is created
+        shared = OpenAI(api_key=config["api_key"], base_url=config["base_url"], max_retries=0)
+        ai_tips.set_client_provider(lambda: shared)
+        core.HISTORY_FILE = config["history"]  # app.py reads it on every rerun
+        session = Session(index, config["seed"], config["live_inputs"], config["timeout_s"], config["pdf_wait_s"], config["think_s"])
+    except Exception as e:
+        report["failure"] = f"setup: {type(e).__name__}: {e}"
+    try:
+        barrier.wait(config["timeout_s"])
+    except threading.BrokenBarrierError:
+        report["failure"] = report["failure"] or "start barrier broken"
+    if report["failure"] is None:
+        report["rss_start"] = _rss_bytes()
+        cpu_start = time.process_time()
+        try:
+            session.run(config["actions"], config["mix"])
+        except Exception as e:  # a stuck or crashed session still reports what it did
+            report["failure"] = f"{type(e).__name__}: {e}"
+        report["cpu_s"] = time.process_time() - cpu_start
+        report["rss_end"] = _rss_bytes()
+        report["tips"] = ai_tips.get_tip_stats()
+    if session is not None:
+        for key in ("samples", "pdf_times", "pdf_timeouts", "pdf_failures", "errors", "state_bytes"):
+            report[key] = getattr(session, key)
+    results.put(report)
+    # Stop the app's PDF workers now; left to interpreter exit they keep this process alive
+    import pdf_report
+
+    pdf_report.shutdown_pdf_pool()
+
+
+def _collect_reports(procs: list, results) -> List[dict]:
+    """One report per session process; stops early if every process has exited."""
+    reports: List[dict] = []
+    while len(reports) < len(procs):
+        try:
+            reports.append(results.get(timeout=1.0))
+        except queue.Empty:
+            if not any(p.is_alive() for p in procs):
+                break
+    while len(reports) < len(procs):
+        try:
+            reports.append(results.get_nowait())
+        except queue.Empty:
+            break
+    return reports
+
+
+def run_app_load_test(
+    sessions: int = 8,
+    actions: int = 20,
+    mix: str = DEFAULT_MIX,
+    history_days: int = 730,
+    history_path: Optional[str] = None,
+    live_inputs: bool = False,
+    think_s: float = 0.0,
+    base_url: Optional[str] = None,
+    latency: str = "lognormal:0.3:0.5",
+    seed: int = 0,
+    timeout_s: float = 120.0,
+    pdf_wait_s: float = 60.0,
+) -> dict:
+    """Run the load test and return a metrics dict.
+
+    Every session process gets its own copy of history_path, or of a synthetic
+    history of history_days days; saves go to that copy.
+    """
+    from synthetic_history import write_history
+
+    weights = parse_mix(mix)
+    n = max(1, sessions)
+    workdir = tempfile.mkdtemp(prefix="loadtest_app_")
+    source = os.path.join(workdir, "history.csv")
+    if history_path:
+        shutil.copyfile(history_path, source)
+    else:
+        write_history(source, users=1, days=history_days, start=dt.date.today() - dt.timedelta(days=history_days), seed=seed)
+
+    server = None
+    if base_url is None:
+        server = MockOpenAIServer(latency=latency, seed=seed).start()
+        base_url = server.base_url
+
+    ctx = multiprocessing.get_context("spawn")
+    barrier = ctx.Barrier(n + 1)
+    results = ctx.Queue()
+    procs = []
+    failures: List[str] = []
+    try:
+        for i in range(n):
+            history = os.path.join(workdir, f"history_{i}.csv")
+            shutil.copyfile(source, history)
+            config = {
+                "api_key": os.environ.get("OPENAI_API_KEY") or "mock", "base_url": base_url, "history": history,
+                "perf_log": os.path.join(workdir, f"perf_log_{i}.jsonl"), "seed": seed, "live_inputs": live_inputs,
+                "timeout_s": timeout_s, "pdf_wait_s": pdf_wait_s, "think_s": think_s, "actions": actions, "mix": weights,
+            }
+            # Not a daemon: the app starts its own PDF worker processes
+            proc = ctx.Process(target=_session_main, args=(i, config, barrier, results), name=f"loadtest-session-{i}")
+            proc.start()
+            procs.append(proc)
+        try:
+            barrier.wait(timeout_s)  # every session has imported the app stack
+        except threading.BrokenBarrierError:
+            failures.append("not every session started before the timeout")
+        started = time.perf_counter()
+        reports = _collect_reports(procs, results)
+        wall = time.perf_counter() - started
+        for proc in procs:
+            proc.join(timeout_s)
+            if proc.is_alive():
+                proc.terminate()
+    finally:
+        for proc in procs:
+            if proc.is_alive():
+                proc.terminate()
+        server_counts = dict(server.counts) if server is not None else None
+        if server is not None:
+            server.stop()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    reports.sort(key=lambda r: r["index"])
+    failures += [r["failure"] for r in reports if r["failure"]]
+    failures += [f"session {i} exited without a report" for i in sorted(set(range(n)) - {r["index"] for r in reports})]
+    samples = [tuple(x) for r in reports for x in r["samples"]]
+    by_action: Dict[str, List[float]] = {}
+    for action, seconds in samples:
+        by_action.setdefault(action, []).append(seconds)
+    state_bytes = [r["state_bytes"] for r in reports if r["state_bytes"]]
+    pdf_times = sorted(x for r in reports for x in r["pdf_times"])
+    ran = [r for r in reports if r["rss_end"]]
+    cpu = sum(r["cpu_s"] for r in reports)
+    tip_stats: Dict[str, int] = {}
+    for r in reports:
+        for k in ("requests", "gpt", "fallback", "cache_hits", "cache_misses"):
+            if k in r["tips"]:
+                tip_stats[k] = tip_stats.get(k, 0) + r["tips"][k]
+    rss_start = statistics.mean(r["rss_start"] for r in ran) if ran else 0
+    rss_end = statistics.mean(r["rss_end"] for r in ran) if ran else 0
+    result = {
+        "sessions": n,
+        "actions_per_session": actions,
+        "mix": weights,
+        "live_inputs": live_inputs,
+        "wall_s": round(wall, 3),
+        "reruns": len(samples),
+        "throughput_rps": round(len(samples) / wall, 2) if wall else 0.0,
+        **{k: v for k, v in _latency_stats([x for _, x in samples]).items() if k != "count"},
+        "by_action": {a: _latency_stats(v) for a, v in sorted(by_action.items())},
+        "script_errors": sum(r["errors"] for r in reports),
+        "session_failures": failures,
+        "cpu_s": round(cpu, 3),
+        "cpu_per_session_s": round(cpu / n, 3),
+        "cpu_per_rerun_ms": round(cpu / len(samples) * 1000, 2) if samples else 0.0,
+        "cpu_utilization": round(cpu / wall / (os.cpu_count() or 1), 3) if wall else 0.0,
+        "rss_start_mb": round(rss_start / 2**20, 1),
+        "rss_end_mb": round(rss_end / 2**20, 1),
+        "rss_per_session_mb": round((rss_end - rss_start) / 2**20, 2),
+        "session_state_kb_mean": round(statistics.mean(state_bytes) / 1024, 1) if state_bytes else 0.0,
+        "session_state_kb_max": round(max(state_bytes) / 1024, 1) if state_bytes else 0.0,
+        "pdfs": len(pdf_times),
+        "pdf_timeouts": sum(r["pdf_timeouts"] for r in reports),
+        "pdf_failures": sum(r["pdf_failures"] for r in reports),
+        "pdf_p50_s": round(percentile(pdf_times, 50), 3),
+        "tips": tip_stats,
+    }
+    if server_counts is not None:
+        result["server"] = server_counts
+    return result
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description="Concurrent-session load test for the Streamlit app (AppTest, mock tips)")
+    parser.add_argument("--sessions", type=int, default=8)
+    parser.add_argument("--actions", type=int, default=20, help="Actions per session after the first page load")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help=f"Weighted actions (default {DEFAULT_MIX})")
+    parser.add_argument("--history-days", type=int, default=730, help="Days of synthetic history")
+    parser.add_argument("--history", help="Copy this history CSV instead of generating one")
+    parser.add_argument("--live-inputs", action="store_true", help="Enable live inputs + tip prefetch (edits rerun)")
+    parser.add_argument("--think", type=float, default=0.0, help="Mean think time between actions (seconds)")
+    parser.add_argument("--base-url", default=None, help="Use an already running OpenAI stand-in")
+    parser.add_argument("--latency", default="lognormal:0.3:0.5", help="Mock tip latency distribution")
+    parser.add_argument("--timeout", type=float, default=120.0, help="Per-rerun timeout (seconds)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", action="store_true", help="Print the result as JSON")
+    args = parser.parse_args(argv)
+
+    result = run_app_load_test(
+        sessions=args.sessions, actions=args.actions, mix=args.mix, history_days=args.history_days,
+        history_path=args.history, live_inputs=args.live_inputs, think_s=args.think, base_url=args.base_url,
+        latency=args.latency, seed=args.seed, timeout_s=args.timeout,
+    )
+    if args.json:
+        print(json.dumps(result, indent=2))
+        return
+    print(f"Sessions: {result['sessions']} x {result['actions_per_session']} actions  Reruns: {result['reruns']}  Wall: {result['wall_s']:.1f}s")
+    print(f"Throughput: {result['throughput_rps']:.2f} reruns/s")
+    print(f"Rerun latency p50/p95/p99: {result['p50_s']:.3f}s / {result['p95_s']:.3f}s / {result['p99_s']:.3f}s (max {result['max_s']:.3f}s)")
+    for action, st in result["by_action"].items():
+        print(f"  {action:<9} n={st['count']:<5} p50 {st['p50_s']:.3f}s  p95 {st['p95_s']:.3f}s")
+    print(f"CPU: {result['cpu_s']:.1f}s total, {result['cpu_per_session_s']:.2f}s/session, {result['cpu_per_rerun_ms']:.0f} ms/rerun ({result['cpu_utilization']:.0%} of {os.cpu_count()} CPUs)")
+    print(f"Memory: RSS per session process {result['rss_start_mb']:.0f} -> {result['rss_end_mb']:.0f} MB (+{result['rss_per_session_mb']:.1f} MB), session_state {result['session_state_kb_mean']:.0f} KB avg")
+    print(f"PDFs: {result['pdfs']} (p50 {result['pdf_p50_s']:.2f}s, {result['pdf_timeouts']} timed out, {result['pdf_failures']} failed)  Tips: {result['tips']}")
+    if result["script_errors"] or result["session_failures"]:
+        print(f"Errors: {result['script_errors']} script exception(s); session failures: {result['session_failures']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,143 @@
+"""
+loadtest_tips.py
+
+Drive N concurrent generate_tip calls against a local OpenAI stand-in and report
+latency percentiles, GPT cache hit ratio and fallback rate.
+
+By default an in-process MockOpenAIServer is started; pass --base-url to target
+a server started separately (e.g. `python mock_openai_server.py`).
+
+Examples:
+    python loadtest_tips.py --requests 500 --concurrency 32 --profiles 50
+    python loadtest_tips.py --latency lognormal:0.5:0.6 --error-rate 0.05 --burst-every 10 --burst-len 2
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import math
+import os
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import ai_tips
+from mock_openai_server import MockOpenAIServer
+
+
+def percentile(sorted_values: list, p: float) -> float:
+    """Nearest-rank percentile of an already sorted list (0 for empty input)."""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, math.ceil(p / 100.0 * len(sorted_values)))
+    return float(sorted_values[min(rank, len(sorted_values)) - 1])
+
+
+def make_profiles(n: int, seed: int = 0) -> list:
+    """n distinct (user_data, emissions) profiles over a few common activities."""
+    rng = random.Random(seed)
+    keys = list(ai_tips.LOCAL_CO2_FACTORS.keys())
+    profiles = []
+    for _ in range(max(1, n)):
+        ud = {k: round(rng.uniform(0, 10), 1) for k in rng.sample(keys, 4)}
+        em = round(sum(v * ai_tips.LOCAL_CO2_FACTORS[k] for k, v in ud.items()), 2)
+        profiles.append((ud, em))
+    return profiles
+
+
+def run_load_test(base_url: str, requests: int, concurrency: int, profiles: int, seed: int = 0) -> dict:
+    """Run the load test against base_url and return a metrics dict."""
+    from openai import OpenAI
+
+    # One shared client (connection pool) for all workers; the SDK's own retries
+    # are disabled so ai_tips' backoff and rate limiter are what get measured.
+    saved_key = os.environ.get("OPENAI_API_KEY")
+    shared = OpenAI(api_key=saved_key or "mock", base_url=base_url, max_retries=0)
+
+    pool = make_profiles(profiles, seed)
+    rng = random.Random(seed + 1)
+    plan = [rng.choice(pool) for _ in range(requests)]
+
+    def one(profile):
+        ud, em = profile
+        t0 = time.perf_counter()
+        ai_tips.generate_tip(ud, em)
+        return time.perf_counter() - t0
+
+    # ai_tips only calls GPT with a key set; restored afterwards so the
+    # mock key does not leak into the calling process.
+    os.environ["OPENAI_API_KEY"] = saved_key or "mock"
+    ai_tips.set_client_provider(lambda: shared)
+    ai_tips.reset_tip_stats()
+    started = time.perf_counter()
+    try:
+        with ThreadPoolExecutor(max_workers=max(1, concurrency)) as ex:
+            latencies = sorted(ex.map(one, plan))
+        wall = time.perf_counter() - started
+        # Read before restoring the provider, which clears the tip cache
+        stats = ai_tips.get_tip_stats()
+    finally:
+        ai_tips.set_client_provider(None)
+        if saved_key is None:
+            os.environ.pop("OPENAI_API_KEY", None)
+
+    lookups = stats["cache_hits"] + stats["cache_misses"]
+    return {
+        "requests": requests,
+        "concurrency": concurrency,
+        "distinct_profiles": len(pool),
+        "wall_s": round(wall, 3),
+        "throughput_rps": round(requests / wall, 2) if wall else 0.0,
+        "p50_s": round(percentile(latencies, 50), 4),
+        "p95_s": round(percentile(latencies, 95), 4),
+        "p99_s": round(percentile(latencies, 99), 4),
+        "max_s": round(latencies[-1], 4) if latencies else 0.0,
+        "cache_hit_ratio": round(stats["cache_hits"] / lookups, 4) if lookups else 0.0,
+        "fallback_rate": round(stats["fallback"] / stats["requests"], 4) if stats["requests"] else 0.0,
+        "gpt": stats["gpt"],
+        "fallback": stats["fallback"],
+    }
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description="Load-test the eco-tip pipeline against a mock OpenAI server")
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--profiles", type=int, default=40, help="Distinct user profiles (controls cache hit ratio)")
+    parser.add_argument("--base-url", default=None, help="Use an already running stand-in instead of starting one")
+    parser.add_argument("--latency", default="lognormal:0.3:0.5")
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--burst-every", type=float, default=0.0)
+    parser.add_argument("--burst-len", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", action="store_true", help="Print the result as JSON")
+    args = parser.parse_args(argv)
+
+    server = None
+    base_url = args.base_url
+    if base_url is None:
+        server = MockOpenAIServer(latency=args.latency, error_rate=args.error_rate, burst_every_s=args.burst_every, burst_len_s=args.burst_len, seed=args.seed).start()
+        base_url = server.base_url
+    try:
+        result = run_load_test(base_url, args.requests, args.concurrency, args.profiles, args.seed)
+    finally:
+        if server is not None:
+            result_server = dict(server.counts)
+            server.stop()
+    if server is not None:
+        result["server"] = result_server
+
+    if args.json:
+        print(json.dumps(result, indent=2))
+        return
+    print(f"Requests: {result['requests']} @ concurrency {result['concurrency']} ({result['distinct_profiles']} profiles)")
+    print(f"Wall: {result['wall_s']:.2f}s  Throughput: {result['throughput_rps']:.1f} req/s")
+    print(f"Latency p50/p95/p99: {result['p50_s']:.3f}s / {result['p95_s']:.3f}s / {result['p99_s']:.3f}s (max {result['max_s']:.3f}s)")
+    print(f"Cache hit ratio: {result['cache_hit_ratio']:.1%}  Fallback rate: {result['fallback_rate']:.1%}")
+    if "server" in result:
+        print(f"Server: {result['server']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,187 @@
+"""
+memprof.py
+
+Opt-in memory instrumentation for the app (Debug → "Memory profiling").
+
+While enabled, tracemalloc records allocation sites. After each rerun the app
+calls rerun_report(), which takes a snapshot and reports:
+- the top allocating call sites, and the biggest growth since the previous
+  snapshot of the same session (tracemalloc is process-wide, so growth also
+  includes other sessions' work in between);
+- the size of every session_state entry (deep size; DataFrames via
+  memory_usage(deep=True), arrays via nbytes), plus per-session totals for all
+  sessions seen by this process;
+- memory used by each history frame (history_views() DataFrames/Series).
+
+Snapshots are kept here (last one per session, bounded), not in session_state,
+so the panel does not inflate what it measures. Nothing is recorded unless
+start() was called; stop() frees the traces.
+
+Provided helpers:
+- start(frames), stop(), is_enabled()
+- deep_sizeof(obj), session_state_sizes(state), frame_memory(frames)
+- top_allocations(snapshot), growth(prev, cur)
+- rerun_report(session_id, state, frames)
+"""
+
+from __future__ import annotations
+
+import sys
+import threading
+import time
+import tracemalloc
+from collections import OrderedDict
+from typing import Any, Dict, List, Mapping, Optional
+
+MAX_SESSIONS = 16
+TOP_N = 15
+
+_lock = threading.Lock()
+_snapshots: "OrderedDict[str, tracemalloc.Snapshot]" = OrderedDict()
+_session_totals: "OrderedDict[str, dict]" = OrderedDict()
+
+# Frames from these files are noise in an app-level report
+_FILTERS = (
+    tracemalloc.Filter(False, tracemalloc.__file__),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap_external>"),
+    tracemalloc.Filter(False, "<unknown>"),
+)
+
+
+def start(frames: int = 1) -> None:
+    """Start tracemalloc (process-wide) if it is not already tracing."""
+    if not tracemalloc.is_tracing():
+        tracemalloc.start(frames)
+
+
+def stop() -> None:
+    """Stop tracemalloc and drop stored snapshots."""
+    with _lock:
+        _snapshots.clear()
+    if tracemalloc.is_tracing():
+        tracemalloc.stop()
+
+
+def is_enabled() -> bool:
+    return tracemalloc.is_tracing()
+
+
+# =========================
+# Object sizes
+# =========================
+def deep_sizeof(obj: Any, _seen: Optional[set] = None, _depth: int = 0) -> int:
+    """Approximate retained size of obj in bytes, counting shared objects once."""
+    seen = set() if _seen is None else _seen
+    if id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+    memory_usage = getattr(obj, "memory_usage", None)
+    if callable(memory_usage) and hasattr(obj, "dtypes"):  # pandas DataFrame/Series
+        try:
+            used = memory_usage(deep=True)
+            return int(used.sum() if hasattr(used, "sum") else used)
+        except Exception:
+            pass
+    nbytes = getattr(obj, "nbytes", None)
+    if isinstance(nbytes, int) and hasattr(obj, "dtype"):  # numpy array
+        return nbytes + sys.getsizeof(obj, 0) if getattr(obj, "base", None) is None else sys.getsizeof(obj, 0)
+    size = sys.getsizeof(obj, 0)
+    if _depth > 20:
+        return size
+    if isinstance(obj, dict):
+        size += sum(deep_sizeof(k, seen, _depth + 1) + deep_sizeof(v, seen, _depth + 1) for k, v in list(obj.items()))
+    elif isinstance(obj, (list, tuple, set, frozenset)):
+        size += sum(deep_sizeof(v, seen, _depth + 1) for v in list(obj))
+    elif hasattr(obj, "__dict__") and not isinstance(obj, type):
+        size += deep_sizeof(vars(obj), seen, _depth + 1)
+    return size
+
+
+def session_state_sizes(state: Mapping) -> List[dict]:
+    """[{key, type, bytes}] for every session_state entry, largest first."""
+    rows = []
+    for key in list(state.keys()):
+        try:
+            value = state[key]
+        except Exception:
+            continue
+        rows.append({"key": str(key), "type": type(value).__name__, "bytes": deep_sizeof(value)})
+    rows.sort(key=lambda r: r["bytes"], reverse=True)
+    return rows
+
+
+def frame_memory(frames: Mapping[str, Any]) -> List[dict]:
+    """[{name, rows, columns, bytes}] for each DataFrame/Series in frames (nested dicts flattened)."""
+    rows = []
+
+    def add(name: str, obj: Any) -> None:
+        if hasattr(obj, "memory_usage") and hasattr(obj, "dtypes"):
+            cols = len(obj.columns) if hasattr(obj, "columns") else 1
+            rows.append({"name": name, "rows": len(obj), "columns": cols, "bytes": deep_sizeof(obj)})
+        elif isinstance(obj, Mapping):
+            for k, v in obj.items():
+                add(f"{name}.{k}", v)
+
+    for name, obj in frames.items():
+        add(str(name), obj)
+    rows.sort(key=lambda r: r["bytes"], reverse=True)
+    return rows
+
+
+# =========================
+# tracemalloc reports
+# =========================
+def _site(stat) -> str:
+    frame = stat.traceback[0]
+    return f"{frame.filename}:{frame.lineno}"
+
+
+def top_allocations(snapshot: tracemalloc.Snapshot, limit: int = TOP_N) -> List[dict]:
+    """Largest live allocations grouped by call site."""
+    stats = snapshot.filter_traces(_FILTERS).statistics("lineno")
+    return [{"site": _site(s), "kb": round(s.size / 1024, 1), "blocks": s.count} for s in stats[:limit]]
+
+
+def growth(prev: tracemalloc.Snapshot, cur: tracemalloc.Snapshot, limit: int = TOP_N) -> List[dict]:
+    """Call sites whose live memory grew the most between two snapshots."""
+    stats = cur.filter_traces(_FILTERS).compare_to(prev.filter_traces(_FILTERS), "lineno")
+    stats = [s for s in stats if s.size_diff > 0][:limit]
+    return [
+        {"site": _site(s), "kb": round(s.size / 1024, 1), "diff_kb": round(s.size_diff / 1024, 1), "blocks_diff": s.count_diff}
+        for s in stats
+    ]
+
+
+def rerun_report(session_id: str, state: Mapping, frames: Optional[Mapping[str, Any]] = None) -> dict:
+    """Everything the Debug panel shows for one rerun of one session."""
+    state_rows = session_state_sizes(state)
+    total = sum(r["bytes"] for r in state_rows)
+    report: Dict[str, Any] = {
+        "session_state": state_rows[:TOP_N],
+        "session_state_bytes": total,
+        "frames": frame_memory(frames or {}),
+        "top": [],
+        "growth": [],
+    }
+    with _lock:
+        _session_totals[session_id] = {"session": session_id[:8], "keys": len(state_rows), "bytes": total, "updated": time.strftime("%H:%M:%S")}
+        _session_totals.move_to_end(session_id)
+        while len(_session_totals) > MAX_SESSIONS:
+            _session_totals.popitem(last=False)
+        report["sessions"] = list(reversed(_session_totals.values()))
+    if not tracemalloc.is_tracing():
+        return report
+    snapshot = tracemalloc.take_snapshot()
+    current, peak = tracemalloc.get_traced_memory()
+    report["traced_mb"] = round(current / 2**20, 2)
+    report["peak_mb"] = round(peak / 2**20, 2)
+    report["top"] = top_allocations(snapshot)
+    with _lock:
+        prev = _snapshots.pop(session_id, None)
+        _snapshots[session_id] = snapshot
+        while len(_snapshots) > MAX_SESSIONS:
+            _snapshots.popitem(last=False)
+    if prev is not None:
+        report["growth"] = growth(prev, snapshot)
+    return report
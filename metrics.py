@@ -0,0 +1,495 @@
+"""
+metrics.py
+
+Process-local counters and histograms with Prometheus text exposition.
+
+Updates take one uncontended per-series lock (no registry-wide lock on the hot
+path). For several server processes (e.g. multiple Streamlit instances behind
+a proxy), set METRICS_MULTIPROC_DIR: each process then writes a snapshot of its
+metrics to <dir>/metrics_<pid>_<token>.json every METRICS_FLUSH_S seconds and
+at exit (temp file + rename), and collect() sums every snapshot in the
+directory with the live registry. The random per-process token keeps a later
+process that reuses a pid from overwriting an older snapshot. Snapshots of
+processes that are gone are folded into metrics_exited.json, so counters from
+exited processes keep counting, as in Prometheus' own multiprocess mode, and
+the directory does not grow with every restart (no folding on Windows, where
+liveness cannot be probed safely).
+
+Exposure:
+- render_text(): Prometheus text format (version 0.0.4).
+- start_http_server(port): GET /metrics on a daemon thread (the app starts one
+  when METRICS_PORT is set; api_server.py serves /metrics too).
+- python metrics.py --port 9464 | --dump metrics.prom: serve or dump the merged
+  metrics of METRICS_MULTIPROC_DIR from a separate process.
+
+The metrics the app records are defined at the bottom of this module.
+"""
+
+from __future__ import annotations
+
+import argparse
+import atexit
+import bisect
+import json
+import math
+import os
+import sys
+import re
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Sequence, Tuple
+
+METRICS_DIR = os.getenv("METRICS_MULTIPROC_DIR") or None
+METRICS_FLUSH_S = float(os.getenv("METRICS_FLUSH_S", "5"))
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+EXITED_SNAPSHOT = "metrics_exited.json"
+FOLD_LOCK_STALE_S = 60.0
+_SNAPSHOT_RE = re.compile(r"^metrics_(\d+)(?:_[0-9a-f]+)?\.json$")
+
+
+class _CounterChild:
+    __slots__ = ("_lock", "value")
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.value = 0.0
+
+    def inc(self, amount: float = 1.0) -> None:
+        with self._lock:
+            self.value += amount
+
+
+class _HistogramChild:
+    __slots__ = ("_lock", "_bounds", "counts", "sum")
+
+    def __init__(self, bounds: Tuple[float, ...]):
+        self._lock = threading.Lock()
+        self._bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)  # per bucket, last one is +Inf
+        self.sum = 0.0
+
+    def observe(self, value: float) -> None:
+        i = bisect.bisect_left(self._bounds, value)
+        with self._lock:
+            self.counts[i] += 1
+            self.sum += value
+
+    @contextmanager
+    def time(self):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started)
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help_text: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self._children: Dict[Tuple[str, ...], object] = {}
+        self._lock = threading.Lock()
+        self._default = None if self.labelnames else self.labels()
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def labels(self, *values, **kw):
+        """Series for one label combination (created on first use)."""
+        if kw:
+            values = tuple(str(kw[n]) for n in self.labelnames)
+        else:
+            values = tuple(str(v) for v in values)
+        if len(values) != len(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}")
+        child = self._children.get(values)
+        if child is None:
+            with self._lock:
+                child = self._children.setdefault(values, self._new_child())
+        return child
+
+    def _series(self) -> List[Tuple[Tuple[str, ...], object]]:
+        with self._lock:
+            return list(self._children.items())
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def _new_child(self):
+        return _CounterChild()
+
+    def inc(self, amount: float = 1.0) -> None:
+        self._default.inc(amount)
+
+    def snapshot(self) -> dict:
+        return {"type": self.kind, "help": self.help, "labelnames": list(self.labelnames),
+                "samples": [[list(k), c.value] for k, c in self._series()]}
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help_text: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.buckets = tuple(sorted(float(b) for b in buckets if not math.isinf(b)))
+        super().__init__(name, help_text, labelnames)
+
+    def _new_child(self):
+        return _HistogramChild(self.buckets)
+
+    def observe(self, value: float) -> None:
+        self._default.observe(value)
+
+    def time(self):
+        return self._default.time()
+
+    def snapshot(self) -> dict:
+        samples = []
+        for k, c in self._series():
+            with c._lock:
+                samples.append([list(k), list(c.counts), c.sum])
+        return {"type": self.kind, "help": self.help, "labelnames": list(self.labelnames),
+                "buckets": list(self.buckets), "samples": samples}
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+
+    def _get_or_create(self, cls, name: str, *args, **kwargs):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = cls(name, *args, **kwargs)
+            elif not isinstance(metric, cls):
+                raise ValueError(f"{name} is already registered as a {metric.kind}")
+            return metric
+
+    def counter(self, name: str, help_text: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._get_or_create(Counter, name, help_text, labelnames)
+
+    def histogram(self, name: str, help_text: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self._get_or_create(Histogram, name, help_text, labelnames, buckets)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        return {m.name: m.snapshot() for m in metrics}
+
+
+REGISTRY = Registry()
+
+
+# =========================
+# Multi-process snapshots
+# =========================
+_token: Tuple[int, str] = (0, "")
+
+
+def _snapshot_path(directory: str) -> str:
+    """This process's snapshot file; the token is regenerated in forked children."""
+    global _token
+    pid = os.getpid()
+    if _token[0] != pid:
+        _token = (pid, uuid.uuid4().hex[:12])
+    return os.path.join(directory, f"metrics_{pid}_{_token[1]}.json")
+
+
+def _write_json(path: str, data: dict) -> None:
+    tmp = f"{path}.tmp-{os.getpid()}"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(data, f, separators=(",", ":"))
+    os.replace(tmp, path)
+
+
+def _read_json(path: str) -> Optional[dict]:
+    try:
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None  # half-written or removed meanwhile
+
+
+def write_snapshot(directory: Optional[str] = None, registry: Registry = REGISTRY) -> Optional[str]:
+    """Write this process's metrics to <directory>/metrics_<pid>_<token>.json atomically."""
+    directory = directory or METRICS_DIR
+    if not directory:
+        return None
+    os.makedirs(directory, exist_ok=True)
+    path = _snapshot_path(directory)
+    _write_json(path, registry.snapshot())
+    return path
+
+
+def _pid_alive(pid: int) -> bool:
+    """Whether pid is running. Always True on Windows, where os.kill(pid, 0) would terminate it."""
+    if os.name == "nt" or pid == os.getpid():
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except OSError:
+        return True  # exists, but owned by another user
+    return True
+
+
+def _read_exited(directory: str) -> dict:
+    exited = _read_json(os.path.join(directory, EXITED_SNAPSHOT)) or {}
+    return {"metrics": exited.get("metrics") or {}, "folded": list(exited.get("folded") or [])}
+
+
+def fold_exited(directory: Optional[str] = None) -> int:
+    """Merge snapshots of processes that are gone into metrics_exited.json.
+
+    The aggregate lists the files it absorbed, so collect() never counts one
+    twice while it is being removed. One process folds at a time (an mkdir
+    lock, given up after FOLD_LOCK_STALE_S). Returns how many were folded.
+    """
+    directory = directory or METRICS_DIR
+    if not directory or not os.path.isdir(directory):
+        return 0
+    dead = []
+    for fname in os.listdir(directory):
+        m = _SNAPSHOT_RE.match(fname)
+        if m and not _pid_alive(int(m.group(1))):
+            dead.append(fname)
+    if not dead:
+        return 0
+    lock = os.path.join(directory, ".fold.lock")
+    try:
+        os.mkdir(lock)
+    except FileExistsError:
+        try:
+            if time.time() - os.path.getmtime(lock) > FOLD_LOCK_STALE_S:
+                os.rmdir(lock)  # left behind by a crashed process; the next call folds
+        except OSError:
+            pass
+        return 0
+    except OSError:
+        return 0
+    try:
+        exited = _read_exited(directory)
+        present = set(os.listdir(directory))
+        folded = [f for f in exited["folded"] if f in present]  # absorbed, not yet removed
+        snapshots, new = [exited["metrics"]], []
+        for fname in sorted(dead):
+            if fname in exited["folded"]:
+                continue
+            snap = _read_json(os.path.join(directory, fname))
+            if snap is not None:
+                snapshots.append(snap)
+                new.append(fname)
+        if new:
+            _write_json(os.path.join(directory, EXITED_SNAPSHOT), {"metrics": merge_snapshots(snapshots), "folded": folded + new})
+        for fname in folded + new:
+            try:
+                os.remove(os.path.join(directory, fname))
+            except OSError:
+                pass
+        return len(new)
+    except OSError:
+        return 0
+    finally:
+        os.rmdir(lock)
+
+
+def merge_snapshots(snapshots: List[dict]) -> dict:
+    """Sum counters and histogram buckets of the same name and labels."""
+    merged: Dict[str, dict] = {}
+    for snap in snapshots:
+        for name, m in snap.items():
+            out = merged.get(name)
+            if out is None:
+                out = merged[name] = {k: v for k, v in m.items() if k != "samples"}
+                out["_series"] = {}
+            series = out["_series"]
+            for sample in m["samples"]:
+                key = tuple(sample[0])
+                if m["type"] == "counter":
+                    series[key] = series.get(key, 0.0) + sample[1]
+                else:
+                    prev = series.get(key)
+                    if prev is None:
+                        series[key] = (list(sample[1]), sample[2])
+                    elif len(prev[0]) == len(sample[1]):  # same bucket layout
+                        series[key] = ([a + b for a, b in zip(prev[0], sample[1])], prev[1] + sample[2])
+    for out in merged.values():
+        series = out.pop("_series")
+        if out["type"] == "counter":
+            out["samples"] = [[list(k), v] for k, v in series.items()]
+        else:
+            out["samples"] = [[list(k), counts, total] for k, (counts, total) in series.items()]
+    return merged
+
+
+def collect(directory: Optional[str] = None, registry: Optional[Registry] = REGISTRY) -> dict:
+    """Live registry plus every other process's snapshot and the exited aggregate in directory."""
+    directory = directory or METRICS_DIR
+    snapshots = [registry.snapshot()] if registry is not None else []
+    if directory and os.path.isdir(directory):
+        fold_exited(directory)
+        own = os.path.basename(_snapshot_path(directory)) if registry is not None else None
+        found = {}
+        for fname in sorted(os.listdir(directory)):
+            if _SNAPSHOT_RE.match(fname) and fname != own:
+                snap = _read_json(os.path.join(directory, fname))
+                if snap is not None:
+                    found[fname] = snap
+        # Read after the snapshots: anything removed meanwhile is in here, and
+        # anything it already absorbed is skipped
+        exited = _read_exited(directory)
+        snapshots.append(exited["metrics"])
+        snapshots.extend(snap for fname, snap in found.items() if fname not in exited["folded"])
+    return merge_snapshots(snapshots)
+
+
+# =========================
+# Exposition
+# =========================
+def _fmt(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+def _labels(names, values, extra: Tuple[Tuple[str, str], ...] = ()) -> str:
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ""
+    esc = (str(v).replace("\\", r"\\").replace("\n", r"\n").replace('"', r"\"") for _, v in pairs)
+    return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(pairs, esc)) + "}"
+
+
+def render_text(snapshot: Optional[dict] = None) -> str:
+    """Prometheus text format for snapshot (default: collect())."""
+    snapshot = collect() if snapshot is None else snapshot
+    lines: List[str] = []
+    for name in sorted(snapshot):
+        m = snapshot[name]
+        lines.append(f"# HELP {name} {m['help']}")
+        lines.append(f"# TYPE {name} {m['type']}")
+        names = m["labelnames"]
+        for sample in sorted(m["samples"], key=lambda s: s[0]):
+            values = sample[0]
+            if m["type"] == "counter":
+                lines.append(f"{name}{_labels(names, values)} {_fmt(sample[1])}")
+                continue
+            counts, total = sample[1], sample[2]
+            cumulative = 0
+            for bound, n in zip(list(m["buckets"]) + [math.inf], counts):
+                cumulative += n
+                lines.append(f"{name}_bucket{_labels(names, values, (('le', _fmt(bound)),))} {cumulative}")
+            lines.append(f"{name}_sum{_labels(names, values)} {_fmt(total)}")
+            lines.append(f"{name}_count{_labels(names, values)} {cumulative}")
+    return "\n".join(lines) + "\n"
+
+
+def start_http_server(port: int = 0, host: str = "127.0.0.1", directory: Optional[str] = None, registry: Optional[Registry] = REGISTRY):
+    """Serve GET /metrics on a daemon thread; returns the server (server_port, shutdown())."""
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    directory = directory or METRICS_DIR
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):  # noqa: N802 (http.server naming)
+            if self.path.split("?", 1)[0] not in ("/metrics", "/"):
+                self.send_error(404)
+                return
+            data = render_text(collect(directory, registry)).encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", CONTENT_TYPE)
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), MetricsHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+    return server
+
+
+_started = False
+_started_lock = threading.Lock()
+
+
+def ensure_exporters() -> None:
+    """Start the snapshot flusher (METRICS_MULTIPROC_DIR) and HTTP endpoint (METRICS_PORT) once per process."""
+    global _started
+    with _started_lock:
+        if _started:
+            return
+        _started = True
+    if METRICS_DIR:
+        def flush_loop():
+            while True:
+                time.sleep(METRICS_FLUSH_S)
+                try:
+                    write_snapshot()
+                except OSError:
+                    pass
+
+        threading.Thread(target=flush_loop, name="metrics-flush", daemon=True).start()
+        atexit.register(write_snapshot)
+    port = os.getenv("METRICS_PORT")
+    if port:
+        try:
+            start_http_server(int(port), os.getenv("METRICS_HOST", "127.0.0.1"))
+        except OSError:
+            pass  # another server process already serves this port (and reads our snapshots)
+
+
+# =========================
+# App metrics
+# =========================
+APP_RERUNS = REGISTRY.counter("app_reruns_total", "Streamlit script reruns")
+HISTORY_SAVES = REGISTRY.counter("history_saves_total", "Entries written to the history file")
+HISTORY_LOAD_SECONDS = REGISTRY.histogram("history_load_seconds", "Time to read and parse the history file")
+CO2_CALCULATIONS = REGISTRY.counter("co2_calculations_total", "calculate_co2 calls")
+TIP_REQUESTS = REGISTRY.counter("tip_requests_total", "Eco tips served, by source", ("source",))
+TIP_CACHE = REGISTRY.counter("tip_cache_total", "GPT tip cache lookups", ("result",))
+GPT_RETRIES = REGISTRY.counter("gpt_retries_total", "GPT calls retried after an API error")
+PDF_RENDER_SECONDS = REGISTRY.histogram("pdf_render_seconds", "PDF render time in the worker pool", buckets=(0.1, 0.25, 0.5, 1.0, 2.0, 5.0, 10.0, 30.0))
+PDF_CACHE = REGISTRY.counter("pdf_cache_total", "Finished-PDF cache lookups", ("result",))
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Serve or dump merged metrics from METRICS_MULTIPROC_DIR")
+    parser.add_argument("--dir", default=METRICS_DIR, help="Snapshot directory (default: METRICS_MULTIPROC_DIR)")
+    parser.add_argument("--port", type=int, default=None, help="Serve /metrics on this port")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--dump", default=None, help="Write the text exposition to this file ('-' for stdout)")
+    args = parser.parse_args(argv)
+    if not args.dir:
+        parser.error("pass --dir or set METRICS_MULTIPROC_DIR")
+    if args.dump:
+        text = render_text(collect(args.dir, registry=None))
+        if args.dump == "-":
+            sys.stdout.write(text)
+        else:
+            with open(args.dump, "w", encoding="utf-8") as f:
+                f.write(text)
+        return 0
+    if args.port is None:
+        parser.error("pass --port or --dump")
+    server = start_http_server(args.port, args.host, args.dir, registry=None)
+    print(f"Metrics on http://{args.host}:{server.server_port}/metrics", flush=True)
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,220 @@
+"""
+mock_openai_server.py
+
+A local HTTP stand-in for the OpenAI chat-completions API, for tests and load
+tests that must not spend money.
+
+It answers POST /v1/chat/completions with the same JSON shape as the real API
+and can simulate:
+- latency: "fixed:S", "uniform:LO:HI" or "lognormal:MEDIAN:SIGMA" (seconds)
+- error_rate: fraction of requests answered with HTTP 500
+- 429 bursts: every `burst_every_s` seconds, reject all requests for `burst_len_s`
+
+Prompts in the batch format (numbered profile lines, JSON answer requested) get
+a {"tips": [...]} answer with one tip per line, so generate_eco_tips_batch can
+be exercised end to end.
+
+Usage:
+    python mock_openai_server.py --port 8089 --latency lognormal:0.4:0.5 --error-rate 0.02
+    # then point ai_tips at it:
+    ai_tips.set_client_provider(lambda: OpenAI(api_key="mock", base_url="http://127.0.0.1:8089/v1", max_retries=0))
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import math
+import random
+import re
+import socket
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Optional
+
+
+_BATCH_LINE = re.compile(r"^\s*(\d+)\.\s", re.MULTILINE)
+
+
+def parse_latency(spec: str):
+    """Return a function rng -> seconds for a latency spec string."""
+    kind, _, rest = (spec or "fixed:0").partition(":")
+    args = [float(x) for x in rest.split(":") if x] if rest else []
+    if kind == "fixed":
+        value = args[0] if args else 0.0
+        return lambda rng: value
+    if kind == "uniform":
+        lo, hi = (args + [0.0, 0.0])[:2]
+        return lambda rng: rng.uniform(lo, hi)
+    if kind == "lognormal":
+        median, sigma = (args + [0.3, 0.5])[:2]
+        mu = math.log(max(median, 1e-6))
+        return lambda rng: rng.lognormvariate(mu, sigma)
+    raise ValueError(f"Unknown latency spec: {spec!r}")
+
+
+class MockOpenAIServer:
+    """Threaded chat-completions stand-in; use as a context manager or start()/stop()."""
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, latency: str = "fixed:0", error_rate: float = 0.0, burst_every_s: float = 0.0, burst_len_s: float = 0.0, seed: Optional[int] = None):
+        self.latency = parse_latency(latency)
+        self.error_rate = float(error_rate)
+        self.burst_every_s = float(burst_every_s)
+        self.burst_len_s = float(burst_len_s)
+        self._rng = random.Random(seed)
+        self._rng_lock = threading.Lock()
+        self._lock = threading.Lock()
+        self.counts: Dict[str, int] = {"requests": 0, "ok": 0, "rate_limited": 0, "errors": 0}
+        self._started_at = time.monotonic()
+        self._httpd = ThreadingHTTPServer((host, port), self._make_handler())
+        self._httpd.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def start(self) -> "MockOpenAIServer":
+        self._started_at = time.monotonic()
+        self._thread = threading.Thread(target=self._httpd.serve_forever, name="mock-openai", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._httpd.shutdown()
+        self._httpd.server_close()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+
+    def __enter__(self) -> "MockOpenAIServer":
+        return self.start()
+
+    def __exit__(self, *exc) -> None:
+        self.stop()
+
+    def _in_burst(self) -> bool:
+        if self.burst_every_s <= 0 or self.burst_len_s <= 0:
+            return False
+        return (time.monotonic() - self._started_at) % self.burst_every_s < self.burst_len_s
+
+    def _decide(self):
+        """Return (delay_s, status) for the next request."""
+        with self._rng_lock:
+            delay = max(0.0, self.latency(self._rng))
+            failed = self._rng.random() < self.error_rate
+        if self._in_burst():
+            return delay, 429
+        return delay, 500 if failed else 200
+
+    def _count(self, key: str) -> None:
+        with self._lock:
+            self.counts[key] += 1
+
+    @staticmethod
+    def _answer(prompt: str) -> str:
+        ids = [int(m) for m in _BATCH_LINE.findall(prompt)]
+        if ids and '"tips"' in prompt:
+            tips = [{"id": i, "tip": f"Mock tip {i}: swap one car trip for the bus this week."} for i in ids]
+            return json.dumps({"tips": tips})
+        return "Mock tip: switch devices fully off tonight and take the bus tomorrow."
+
+    def _make_handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def setup(self):
+                super().setup()
+                # Headers and body go out in separate writes; avoid Nagle delays
+                self.request.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+            def log_message(self, fmt, *args):  # keep test/load-test output quiet
+                pass
+
+            def _send(self, status: int, body: dict, headers: Optional[dict] = None):
+                data = json.dumps(body).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                for k, v in (headers or {}).items():
+                    self.send_header(k, v)
+                self.end_headers()
+                self.wfile.write(data)
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length") or 0)
+                raw = self.rfile.read(length) if length else b"{}"
+                if not self.path.rstrip("/").endswith("/chat/completions"):
+                    self._send(404, {"error": {"message": "not found", "type": "invalid_request_error"}})
+                    return
+                server._count("requests")
+                try:
+                    payload = json.loads(raw or b"{}")
+                except ValueError:
+                    payload = {}
+                delay, status = server._decide()
+                if delay:
+                    time.sleep(delay)
+                if status == 429:
+                    server._count("rate_limited")
+                    self._send(429, {"error": {"message": "Rate limit reached (mock)", "type": "rate_limit_exceeded", "code": "rate_limit_exceeded"}}, {"retry-after": "1"})
+                    return
+                if status == 500:
+                    server._count("errors")
+                    self._send(500, {"error": {"message": "Internal error (mock)", "type": "server_error"}})
+                    return
+                messages = payload.get("messages") or []
+                prompt = str(messages[-1].get("content", "")) if messages else ""
+                content = server._answer(prompt)
+                server._count("ok")
+                prompt_tokens = max(1, len(prompt) // 4)
+                completion_tokens = max(1, len(content) // 4)
+                self._send(200, {
+                    "id": f"chatcmpl-mock-{int(time.time() * 1000)}",
+                    "object": "chat.completion",
+                    "created": int(time.time()),
+                    "model": payload.get("model", "gpt-4o-mini"),
+                    "choices": [{
+                        "index": 0,
+                        "message": {"role": "assistant", "content": content},
+                        "finish_reason": "stop",
+                    }],
+                    "usage": {
+                        "prompt_tokens": prompt_tokens,
+                        "completion_tokens": completion_tokens,
+                        "total_tokens": prompt_tokens + completion_tokens,
+                    },
+                })
+
+        return Handler
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description="Local OpenAI chat-completions stand-in")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8089)
+    parser.add_argument("--latency", default="lognormal:0.4:0.5", help="fixed:S | uniform:LO:HI | lognormal:MEDIAN:SIGMA")
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--burst-every", type=float, default=0.0, help="Seconds between 429 bursts (0 = off)")
+    parser.add_argument("--burst-len", type=float, default=0.0, help="Length of each 429 burst in seconds")
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args(argv)
+
+    srv = MockOpenAIServer(args.host, args.port, args.latency, args.error_rate, args.burst_every, args.burst_len, args.seed)
+    print(f"Mock OpenAI server listening on {srv.base_url} (Ctrl+C to stop)")
+    srv.start()
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        srv.stop()
+        print(f"Served: {srv.counts}")
+
+
+if __name__ == "__main__":
+    main()
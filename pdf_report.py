@@ -0,0 +1,677 @@
+"""
+pdf_report.py
+
+Server-side PDF export for the Eco Tips summary (ReportLab, optional Matplotlib).
+
+UI-free, so it can run from the Streamlit app, a worker process or a batch job.
+ReportLab and Matplotlib are imported lazily; without ReportLab the builder
+returns an error message instead of raising.
+
+Provided helpers:
+- build_eco_tips_pdf(...): landscape one-day summary -> (pdf_bytes, error).
+- render_pdf_async(**kwargs): same arguments, rendered in a worker process;
+  returns a Future. Finished PDFs are cached by a content hash of the inputs
+  (data, branding options, logo bytes), so repeated exports return at once.
+- build_history_report_pdf(...): multi-page report over a long date range,
+  streamed page by page from the history file.
+- pdf_cache_key(**kwargs), get_pdf_pool(), shutdown_pdf_pool(), pdf_render_stats().
+"""
+
+from __future__ import annotations
+
+import hashlib
+import io
+import json
+import multiprocessing
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Executor, Future, ProcessPoolExecutor
+from functools import lru_cache
+
+import metrics
+from tracing import traced
+from utils import format_emissions as fmt_emissions
+
+
+CHART_CACHE_SIZE = int(os.getenv("PDF_CHART_CACHE_SIZE", "256"))
+
+
+def _pyplot():
+    """matplotlib.pyplot with the headless backend, or None if matplotlib is missing."""
+    try:
+        import matplotlib
+        matplotlib.use("Agg")  # headless backend; skips GUI toolkit probing on first import
+        import matplotlib.pyplot as plt
+    except Exception:
+        return None
+    return plt
+
+
+# Chart PNGs are memoized on their full content (data + styling), so repeated
+# exports, and documents in a batch that share a chart, skip matplotlib.
+@lru_cache(maxsize=CHART_CACHE_SIZE)
+def _pie_png(labels: tuple, values: tuple, text_hex: str, chart_bg_hex: str) -> bytes | None:
+    if sum(values) <= 0:
+        return None
+    plt = _pyplot()
+    fig, ax = plt.subplots(figsize=(4, 3))
+    if chart_bg_hex:
+        try:
+            fig.patch.set_facecolor(chart_bg_hex)
+            ax.set_facecolor(chart_bg_hex)
+        except Exception:
+            pass
+    ax.pie(values, labels=labels, autopct='%1.1f%%', startangle=140, textprops={'fontsize': 8, 'color': text_hex}, colors=None)
+    for text in ax.texts:
+        text.set_color(text_hex)
+    ax.axis('equal')
+    img_buf = io.BytesIO()
+    plt.tight_layout()
+    fig.savefig(img_buf, format='png', dpi=150)
+    plt.close(fig)
+    return img_buf.getvalue()
+
+
+@lru_cache(maxsize=CHART_CACHE_SIZE)
+def _sparkline_png(title: str, values: tuple, line_hex: str, text_hex: str, chart_bg_hex: str, cell_w: float, cell_h: float) -> bytes:
+    plt = _pyplot()
+    fig, ax = plt.subplots(figsize=(cell_w/96, cell_h/96), dpi=96)
+    # Theme-aware chart styling
+    if chart_bg_hex:
+        try:
+            fig.patch.set_facecolor(chart_bg_hex)
+            ax.set_facecolor(chart_bg_hex)
+        except Exception:
+            pass
+    ax.plot(list(values), color=line_hex)
+    ax.set_title(title, fontsize=8, color=text_hex)
+    ax.tick_params(colors=text_hex)
+    for spine in ax.spines.values():
+        spine.set_color(text_hex)
+    ax.set_xticks([]); ax.set_yticks([])
+    ax.grid(True, alpha=0.2)
+    img_b = io.BytesIO()
+    plt.tight_layout()
+    fig.savefig(img_b, format='png', dpi=150)
+    plt.close(fig)
+    return img_b.getvalue()
+
+
+@traced()
+def build_eco_tips_pdf(summary_text: str, tip_text: str, emissions: float, date_str: str, source_label: str, per_activity: dict | None, per_category: dict | None, kpis: dict | None, logo_bytes: bytes | None = None, title_text: str | None = None, primary_color: str | None = None, include_pie: bool = True, include_sparklines: bool = True, spark_data: dict | None = None, spark_window_days: int = 7, footer_text: str | None = None, margins_cm: dict | None = None, text_hex: str | None = None, chart_bg_hex: str | None = None, logo_image=None) -> tuple[bytes | None, str | None]:
+    """Build a simple landscape PDF with today's summary, tip, and optional per-activity table.
+    Returns (pdf_bytes, error_message). If error_message is not None, generation failed.
+
+    logo_image: an already decoded ReportLab ImageReader to use instead of
+    logo_bytes (batch jobs decode the logo once and share it across documents).
+    """
+    try:
+        # Lazy import so the app runs even if reportlab isn't installed
+        from reportlab.pdfgen import canvas
+        from reportlab.lib.pagesizes import A4, landscape
+        from reportlab.lib.units import cm
+        from reportlab.lib.utils import simpleSplit, ImageReader
+        from reportlab.lib.colors import HexColor
+    except Exception as e:
+        return None, f"ReportLab not available: {e}. Install with: pip install reportlab"
+
+    # Charts need matplotlib (optional)
+    mpl_ok = _pyplot() is not None
+
+    try:
+        buf = io.BytesIO()
+        page_size = landscape(A4)
+        c = canvas.Canvas(buf, pagesize=page_size)
+        width, height = page_size
+        # Margins
+        side_m = (margins_cm or {}).get("side", 2.0) * cm
+        top_m = (margins_cm or {}).get("top", 2.0) * cm
+        bottom_m = (margins_cm or {}).get("bottom", 1.8) * cm
+        left = side_m
+        right = width - side_m
+
+        # Colors
+        try:
+            if text_hex:
+                c.setFillColor(HexColor(text_hex))
+        except Exception:
+            pass
+
+        # Footer helper
+        def _draw_footer():
+            if footer_text:
+                c.setFont("Helvetica", 9)
+                # Text color
+                try:
+                    if text_hex:
+                        c.setFillColor(HexColor(text_hex))
+                except Exception:
+                    c.setFillColorRGB(0, 0, 0)
+                c.drawString(left, bottom_m - 0.4*cm, footer_text)
+                try:
+                    c.drawRightString(right, bottom_m - 0.4*cm, f"Page {c.getPageNumber()}")
+                except Exception:
+                    pass
+
+        # Page break helper
+        def _show_page():
+            _draw_footer()
+            c.showPage()
+            # Reset text color after page break
+            try:
+                if text_hex:
+                    c.setFillColor(HexColor(text_hex))
+            except Exception:
+                c.setFillColorRGB(0, 0, 0)
+
+        # Title
+        y = height - top_m
+        c.setTitle("Eco Tips Summary")
+        # Slightly larger heading for better hierarchy
+        c.setFont("Helvetica-Bold", 19)
+        # Optional logo (bytes) on the left and custom title/color
+        draw_title = title_text or "Sustainability Tracker — Eco Tips Summary"
+        try:
+            if primary_color:
+                c.setFillColor(HexColor(primary_color))
+        except Exception:
+            pass
+        try:
+            if logo_image is not None or logo_bytes:
+                img = logo_image if logo_image is not None else ImageReader(io.BytesIO(logo_bytes))
+                c.drawImage(img, left, y-0.5*cm, width=2.2*cm, height=2.2*cm, preserveAspectRatio=True, mask='auto')
+                c.drawString(left + 2.5*cm, y, draw_title)
+            else:
+                # Vector fallback badge (no file needed)
+                try:
+                    # Colored rounded rect badge
+                    if primary_color:
+                        c.setFillColor(HexColor(primary_color))
+                    c.roundRect(left, y-0.5*cm, 2.2*cm, 2.2*cm, 0.3*cm, fill=1, stroke=0)
+                    # Badge initials
+                    c.setFillColorRGB(1, 1, 1)
+                    c.setFont("Helvetica-Bold", 14)
+                    c.drawCentredString(left + 1.1*cm, y + 0.5*cm, "ST")
+                except Exception:
+                    pass
+                # Title next to badge
+                c.setFillColorRGB(0, 0, 0)
+                c.drawString(left + 2.5*cm, y, draw_title)
+        except Exception:
+            c.drawString(left, y, draw_title)
+        
+        # Reset text color for body
+        try:
+            if text_hex:
+                c.setFillColor(HexColor(text_hex))
+            else:
+                c.setFillColorRGB(0, 0, 0)
+        except Exception:
+            c.setFillColorRGB(0, 0, 0)
+        y -= 0.4*cm
+
+        # Meta line
+        c.setFont("Helvetica", 11)
+        c.drawString(left, y, f"Date: {date_str}    Total: {fmt_emissions(float(emissions))}    AI source: {source_label}")
+        y -= 0.8*cm
+
+        # KPI line (if provided)
+        if isinstance(kpis, dict):
+            c.setFont("Helvetica-Bold", 12)
+            c.drawString(left, y, "Key metrics:")
+            y -= 0.6*cm
+            c.setFont("Helvetica", 10.5)
+            for label in ["today_total", "yesterday_total", "delta_pct", "streak_days"]:
+                if label in kpis:
+                    c.drawString(left, y, f"- {label.replace('_',' ').title()}: {kpis[label]}")
+                    y -= 0.48*cm
+                    if y < bottom_m + 2*cm:
+                        _show_page(); y = height - top_m
+
+        # Per-category sparklines over the last spark_window_days logged days (if provided)
+        if include_sparklines and mpl_ok and isinstance(spark_data, dict) and spark_data:
+            try:
+                # Arrange small charts in a grid
+                cols = 3
+                cell_w, cell_h = 8*cm, 3*cm
+                c.setFont("Helvetica-Bold", 12)
+                c.drawString(left, y, f"{int(spark_window_days)}-day category trends:")
+                y -= 0.6*cm
+                x0, y0 = left, y
+                i = 0
+                for cat, series in spark_data.items():
+                    img_b = io.BytesIO(_sparkline_png(
+                        str(cat), tuple(float(v) for v in series), primary_color or "#2563eb",
+                        text_hex or "#000000", chart_bg_hex or "", float(cell_w), float(cell_h),
+                    ))
+                    col = i % cols
+                    row = i // cols
+                    x = x0 + col * (cell_w + 0.5*cm)
+                    y_img = y0 - row * (cell_h + 0.5*cm)
+                    if y_img - cell_h < bottom_m + 1.5*cm:
+                        _show_page(); width, height = page_size; y_img = height - top_m - 1*cm; x0 = left; y0 = y_img
+                        row = 0; col = 0; x = x0; y_img = y0
+                    c.drawImage(ImageReader(img_b), x, y_img - cell_h, width=cell_w, height=cell_h, preserveAspectRatio=True, mask='auto')
+                    i += 1
+                y = y_img - cell_h - 0.8*cm
+            except Exception:
+                pass
+
+        # Summary block
+        c.setFont("Helvetica-Bold", 12.5)
+        c.drawString(left, y, "Today's Summary:")
+        y -= 0.6*cm
+        c.setFont("Helvetica", 11)
+        for line in simpleSplit(summary_text or "", "Helvetica", 11, width - 4*cm):
+            c.drawString(left, y, line)
+            y -= 0.5*cm
+            if y < bottom_m + 2*cm:
+                _show_page(); y = height - top_m
+
+        # Tip block
+        y -= 0.2*cm
+        c.setFont("Helvetica-Bold", 12.5)
+        c.drawString(left, y, "Personalized Tip:")
+        y -= 0.6*cm
+        c.setFont("Helvetica", 11)
+        for line in simpleSplit(tip_text or "", "Helvetica", 11, width - 4*cm):
+            c.drawString(left, y, line)
+            y -= 0.5*cm
+            if y < bottom_m + 2*cm:
+                _show_page(); y = height - top_m
+
+        # Per-category breakdown and pie chart (if provided)
+        if per_category:
+            y -= 0.2*cm
+            c.setFont("Helvetica-Bold", 12)
+            c.drawString(left, y, "Per-category (kg CO₂):")
+            y -= 0.6*cm
+            c.setFont("Helvetica", 11)
+            for k, v in sorted(per_category.items(), key=lambda x: x[1], reverse=True):
+                c.drawString(left, y, f"{k}: {float(v):.2f}")
+                y -= 0.45*cm
+                if y < bottom_m + 6*cm:
+                    break
+            if include_pie and mpl_ok:
+                try:
+                    png = _pie_png(
+                        tuple(str(k) for k in per_category.keys()),
+                        tuple(float(v) for v in per_category.values()),
+                        text_hex or "#000000", chart_bg_hex or "",
+                    )
+                    if png:
+                        img_buf = io.BytesIO(png)
+                        img_width = 10*cm
+                        img_height = 7*cm
+                        c.drawImage(ImageReader(img_buf), right - img_width, y + 0.5*cm, width=img_width, height=img_height, preserveAspectRatio=True, mask='auto')
+                        y -= img_height + 0.5*cm
+                except Exception:
+                    pass
+
+        # Per-activity table (if provided)
+        if per_activity:
+            y -= 0.2*cm
+            c.setFont("Helvetica-Bold", 12)
+            c.drawString(left, y, "Per-activity emissions (kg CO₂):")
+            y -= 0.6*cm
+            c.setFont("Helvetica", 11)
+            for k, v in sorted(per_activity.items(), key=lambda x: x[1], reverse=True):
+                c.drawString(left, y, f"{k}: {float(v):.2f}")
+                y -= 0.45*cm
+                if y < bottom_m + 2*cm:
+                    _show_page(); y = height - top_m
+
+        _show_page()
+        c.save()
+        pdf_bytes = buf.getvalue()
+        buf.close()
+        return pdf_bytes, None
+    except Exception as e:
+        return None, f"Failed to build PDF: {e}"
+
+
+# =========================
+# Long-range history report
+# =========================
+@lru_cache(maxsize=CHART_CACHE_SIZE)
+def _trend_png(labels: tuple, series: tuple, line_hexes: tuple, text_hex: str, chart_bg_hex: str) -> bytes:
+    """Multi-line chart; series is ((name, (values...)), ...) sharing the x labels."""
+    plt = _pyplot()
+    fig, ax = plt.subplots(figsize=(9, 3.2))
+    if chart_bg_hex:
+        try:
+            fig.patch.set_facecolor(chart_bg_hex)
+            ax.set_facecolor(chart_bg_hex)
+        except Exception:
+            pass
+    x = list(range(len(labels)))
+    for (name, values), color in zip(series, line_hexes):
+        ax.plot(x, list(values), label=name, color=color)
+    step = max(1, len(labels) // 12)
+    ax.set_xticks(x[::step])
+    ax.set_xticklabels(list(labels)[::step], fontsize=7, rotation=30, color=text_hex)
+    ax.tick_params(colors=text_hex, labelsize=7)
+    for spine in ax.spines.values():
+        spine.set_color(text_hex)
+    ax.set_ylabel("kg CO₂", fontsize=8, color=text_hex)
+    ax.grid(True, alpha=0.2)
+    ax.legend(fontsize=7)
+    img = io.BytesIO()
+    plt.tight_layout()
+    fig.savefig(img, format='png', dpi=150)
+    plt.close(fig)
+    return img.getvalue()
+
+
+def _monthly_sums(history_path, start, end, chunksize: int) -> tuple[dict, object, object]:
+    """Streamed per-month category sums, stored totals and distinct days logged.
+
+    Returns ({"YYYY-MM": {category..., "total", "days"}}, first date, last date).
+    A date with several entries counts as one day and contributes only its
+    first row, like core's totals_by_date and get_yesterday_total, also when
+    its rows are split across chunks.
+    """
+    import core
+
+    cats = list(core.CATEGORY_MAP)
+    months: dict = {}
+    seen_days: set = set()
+    first_day = last_day = None
+    for chunk in core.iter_history_rows(history_path, start, end, chunksize):
+        days = chunk["date"].dt.date
+        new_day = ~days.duplicated() & ~days.isin(seen_days)
+        seen_days.update(days[new_day])
+        firsts = chunk[new_day]
+        frame = core.compute_category_frame(firsts)
+        frame["days"] = 1
+        frame["stored_total"] = _numeric_column(firsts, "total_kg")
+        frame["month"] = firsts["date"].dt.strftime("%Y-%m")
+        for month, row in frame.groupby("month").sum(numeric_only=True).iterrows():
+            acc = months.setdefault(month, dict.fromkeys(cats + ["total", "days"], 0.0))
+            for cat in cats:
+                acc[cat] += float(row[cat])
+            acc["total"] += float(row["stored_total"])
+            acc["days"] += int(row["days"])
+        lo, hi = min(days), max(days)
+        first_day = lo if first_day is None else min(first_day, lo)
+        last_day = hi if last_day is None else max(last_day, hi)
+    return months, first_day, last_day
+
+
+def build_history_report_pdf(history_path: str | None = None, start=None, end=None, out=None, title_text: str | None = None, primary_color: str | None = None, text_hex: str | None = None, chart_bg_hex: str | None = None, footer_text: str | None = None, rows_per_page: int = 30, chunksize: int = 5000) -> tuple[bytes | None, str | None]:
+    """Multi-page report for [start, end]: monthly trend chart, monthly category
+    table and page-broken daily rows, each daily page with a mini chart.
+
+    The history is streamed twice with core.iter_history_rows (monthly
+    aggregates, then daily rows), so only one chunk of rows and the monthly
+    sums are held at once. Pages are compressed as they are emitted. Charts go
+    through the PNG caches, so repeated pages/reports reuse them.
+
+    out: file path or binary file object to write to; when omitted the PDF
+    bytes are returned. Returns (pdf_bytes or None, error_message).
+    """
+    try:
+        from reportlab.pdfgen import canvas
+        from reportlab.lib.pagesizes import A4, landscape
+        from reportlab.lib.units import cm
+        from reportlab.lib.utils import ImageReader
+        from reportlab.lib.colors import HexColor
+    except Exception as e:
+        return None, f"ReportLab not available: {e}. Install with: pip install reportlab"
+
+    import core
+
+    mpl_ok = _pyplot() is not None
+    cats = list(core.CATEGORY_MAP)
+    text_hex = text_hex or "#000000"
+    accent = primary_color or "#2563eb"
+    line_hexes = (accent, "#f59e0b", "#10b981", "#6b7280")
+
+    try:
+        # Pass 1: monthly sums (small, one row per month)
+        months, first_day, last_day = _monthly_sums(history_path, start, end, chunksize)
+        if not months:
+            return None, "No history entries in the selected range."
+
+        target = out if out is not None else io.BytesIO()
+        page_size = landscape(A4)
+        width, height = page_size
+        c = canvas.Canvas(target, pagesize=page_size, pageCompression=1)
+        c.setTitle(title_text or "Emissions history report")
+        left, right, top, bottom = 2*cm, width - 2*cm, height - 1.8*cm, 1.8*cm
+
+        def _color(hex_value, fallback=(0, 0, 0)):
+            try:
+                c.setFillColor(HexColor(hex_value))
+            except Exception:
+                c.setFillColorRGB(*fallback)
+
+        def _end_page():
+            c.setFont("Helvetica", 8.5)
+            _color(text_hex)
+            if footer_text:
+                c.drawString(left, bottom - 0.6*cm, footer_text)
+            c.drawRightString(right, bottom - 0.6*cm, f"Page {c.getPageNumber()}")
+            c.showPage()
+
+        def _heading(text, y):
+            c.setFont("Helvetica-Bold", 15)
+            _color(accent)
+            c.drawString(left, y, text)
+            _color(text_hex)
+            return y - 0.8*cm
+
+        col_x = [left, left + 5*cm, left + 9.5*cm, left + 14*cm, left + 18.5*cm, left + 23*cm]
+
+        def _table_header(y, labels):
+            c.setFont("Helvetica-Bold", 10)
+            for x, label in zip(col_x, labels):
+                c.drawString(x, y, label)
+            c.line(left, y - 0.15*cm, right, y - 0.15*cm)
+            c.setFont("Helvetica", 9.5)
+            return y - 0.55*cm
+
+        # Overview page: range summary + monthly trend
+        y = _heading(title_text or "Emissions history report", top)
+        total_all = sum(m["total"] for m in months.values())
+        days_all = int(sum(m["days"] for m in months.values()))
+        c.setFont("Helvetica", 11)
+        c.drawString(left, y, f"Range: {first_day} to {last_day}    Days logged: {days_all}    Total: {fmt_emissions(total_all)}    Daily average: {fmt_emissions(total_all / days_all)}")
+        y -= 0.6*cm
+        c.drawString(left, y, "    ".join(f"{cat}: {fmt_emissions(sum(m[cat] for m in months.values()))}" for cat in cats))
+        y -= 0.5*cm
+        labels = tuple(sorted(months))
+        if mpl_ok and len(labels) > 1:
+            series = tuple((cat, tuple(round(months[m][cat], 3) for m in labels)) for cat in cats)
+            series += (("Total", tuple(round(months[m]["total"], 3) for m in labels)),)
+            png = _trend_png(labels, series, line_hexes, text_hex, chart_bg_hex or "")
+            chart_h = 8.5*cm
+            c.drawImage(ImageReader(io.BytesIO(png)), left, y - chart_h, width=right - left, height=chart_h, preserveAspectRatio=True, mask='auto')
+            y -= chart_h + 0.4*cm
+
+        # Monthly category table (page-broken)
+        y = _table_header(y, ["Month"] + cats + ["Total (kg)"])
+        for month in labels:
+            if y < bottom + 0.5*cm:
+                _end_page()
+                y = _table_header(_heading("Monthly totals (cont.)", top), ["Month"] + cats + ["Total (kg)"])
+            m = months[month]
+            values = [f"{month} ({int(m['days'])}d)"] + [f"{m[cat]:.2f}" for cat in cats] + [f"{m['total']:.2f}"]
+            for x, v in zip(col_x, values):
+                c.drawString(x, y, v)
+            y -= 0.5*cm
+        _end_page()
+
+        # Pass 2: daily rows, one page at a time
+        del months
+        page_rows: list = []
+
+        def _flush(rows):
+            y = _heading(f"Daily entries {rows[0][0]} to {rows[-1][0]}", top)
+            if mpl_ok and len(rows) > 1:
+                png = _sparkline_png("Daily total (kg)", tuple(r[-1] for r in rows), accent, text_hex, chart_bg_hex or "", float(9*cm), float(2.6*cm))
+                c.drawImage(ImageReader(io.BytesIO(png)), right - 9*cm, top - 2.2*cm, width=9*cm, height=2.6*cm, preserveAspectRatio=True, mask='auto')
+                y -= 1.6*cm
+            y = _table_header(y, ["Date"] + cats + ["Total (kg)"])
+            for row in rows:
+                for x, v in zip(col_x, [str(row[0])] + [f"{v:.2f}" for v in row[1:]]):
+                    c.drawString(x, y, v)
+                y -= 0.45*cm
+            _end_page()
+
+        per_page = max(5, int(rows_per_page))
+        for chunk in core.iter_history_rows(history_path, start, end, chunksize):
+            frame = core.compute_category_frame(chunk)
+            totals = _numeric_column(chunk, "total_kg")
+            for day, vals, total in zip(chunk["date"].dt.date, frame[cats].itertuples(index=False), totals):
+                page_rows.append((day, *(round(float(v), 2) for v in vals), round(float(total), 2)))
+                if len(page_rows) == per_page:
+                    _flush(page_rows)
+                    page_rows = []
+        if page_rows:
+            _flush(page_rows)
+
+        c.save()
+        if out is None:
+            return target.getvalue(), None
+        return None, None
+    except Exception as e:
+        return None, f"Failed to build history report: {e}"
+
+
+def _numeric_column(df, column: str):
+    """Numeric column with non-numeric / missing values as 0.0 (0.0 if the column is absent)."""
+    import pandas as pd
+
+    if column not in df.columns:
+        return pd.Series(0.0, index=df.index)
+    return pd.to_numeric(df[column], errors="coerce").fillna(0.0)
+
+
+# =========================
+# Off-thread rendering + PDF cache
+# =========================
+PDF_WORKERS = int(os.getenv("PDF_WORKERS", "2"))
+PDF_CACHE_SIZE = int(os.getenv("PDF_CACHE_SIZE", "32"))
+
+_pdf_cache: "OrderedDict[str, bytes]" = OrderedDict()
+_pdf_lock = threading.Lock()
+_pdf_stats = {"requests": 0, "cache_hits": 0, "renders": 0, "errors": 0, "render_total_s": 0.0}
+_pool: ProcessPoolExecutor | None = None
+
+
+def pdf_cache_key(**kwargs) -> str:
+    """sha256 over every builder argument; logo bytes are hashed raw."""
+    logo = kwargs.pop("logo_bytes", None) or b""
+    h = hashlib.sha256(json.dumps(kwargs, sort_keys=True, default=str).encode("utf-8"))
+    h.update(b"\0logo\0")
+    h.update(logo)
+    return h.hexdigest()
+
+
+def get_pdf_pool() -> ProcessPoolExecutor:
+    """Shared worker pool for PDF rendering (spawned lazily; PDF_WORKERS processes)."""
+    global _pool
+    with _pdf_lock:
+        if _pool is None:
+            # spawn: safe to start from Streamlit's multi-threaded server process
+            _pool = ProcessPoolExecutor(max_workers=max(1, PDF_WORKERS), mp_context=multiprocessing.get_context("spawn"))
+        return _pool
+
+
+def shutdown_pdf_pool(wait: bool = True) -> None:
+    """Stop the shared PDF pool, dropping queued renders; the next render starts a new one."""
+    global _pool
+    with _pdf_lock:
+        pool, _pool = _pool, None
+    if pool is not None:
+        pool.shutdown(wait=wait, cancel_futures=True)
+
+
+def _reset_pool() -> None:
+    shutdown_pdf_pool(wait=False)
+
+
+def _cache_get(key: str) -> bytes | None:
+    with _pdf_lock:
+        pdf = _pdf_cache.get(key)
+        if pdf is not None:
+            _pdf_cache.move_to_end(key)
+        return pdf
+
+
+def _cache_put(key: str, pdf: bytes) -> None:
+    with _pdf_lock:
+        _pdf_cache[key] = pdf
+        _pdf_cache.move_to_end(key)
+        while len(_pdf_cache) > max(1, PDF_CACHE_SIZE):
+            _pdf_cache.popitem(last=False)
+
+
+def render_pdf_async(pool: Executor | None = None, builder=build_eco_tips_pdf, cache_extra=None, **kwargs) -> Future:
+    """Render builder(**kwargs) (build_eco_tips_pdf by default) off the calling thread.
+
+    Returns a Future resolving to (pdf_bytes, error), never raising. Cache hits
+    come back as an already completed Future; errors are never cached. A broken
+    pool (e.g. a worker killed by the OS) is dropped so the next call starts a
+    fresh one. cache_extra goes into the cache key only, for inputs the
+    builder reads itself (e.g. core.history_version() of a history file).
+    """
+    key = pdf_cache_key(builder=builder.__name__, cache_extra=cache_extra, **kwargs)
+    with _pdf_lock:
+        _pdf_stats["requests"] += 1
+    hit = _cache_get(key)
+    if hit is not None:
+        with _pdf_lock:
+            _pdf_stats["cache_hits"] += 1
+        metrics.PDF_CACHE.labels("hit").inc()
+        done: Future = Future()
+        done.set_result((hit, None))
+        return done
+
+    metrics.PDF_CACHE.labels("miss").inc()
+    started = time.perf_counter()
+    # Resolved only after the cache is updated, so a follow-up call always hits
+    out: Future = Future()
+    try:
+        fut = (pool or get_pdf_pool()).submit(builder, **kwargs)
+    except Exception as e:  # BrokenProcessPool / RuntimeError after shutdown
+        if pool is None:
+            _reset_pool()
+        with _pdf_lock:
+            _pdf_stats["errors"] += 1
+        out.set_result((None, f"PDF worker failed: {e}"))
+        return out
+
+    def _finish(f: Future) -> None:
+        elapsed = time.perf_counter() - started
+        try:
+            pdf, err = f.result()
+        except Exception as e:
+            pdf, err = None, f"PDF worker failed: {e}"
+            if pool is None:
+                _reset_pool()
+        with _pdf_lock:
+            _pdf_stats["renders"] += 1
+            _pdf_stats["render_total_s"] += elapsed
+            if err or not pdf:
+                _pdf_stats["errors"] += 1
+        metrics.PDF_RENDER_SECONDS.observe(elapsed)
+        if pdf and not err:
+            _cache_put(key, pdf)
+        out.set_result((pdf, err))
+
+    fut.add_done_callback(_finish)
+    return out
+
+
+def pdf_render_stats() -> dict:
+    """Counters for the Debug panel, plus the average render time (an ETA for progress bars)."""
+    with _pdf_lock:
+        stats = dict(_pdf_stats)
+        stats["cached_pdfs"] = len(_pdf_cache)
+    renders = stats.pop("render_total_s")
+    stats["avg_render_s"] = round(renders / stats["renders"], 3) if stats["renders"] else 0.0
+    return stats
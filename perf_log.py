@@ -0,0 +1,261 @@
+"""
+perf_log.py
+
+Structured performance-event log with a background writer.
+
+Callers build a PerfEvent and hand it to PerfLogger.log(), which only does a
+non-blocking queue put: no file I/O, no os.path checks on the request path.
+A daemon thread drains the queue in batches, appends them as JSON lines and
+rotates the file by size and/or age, keeping a fixed number of backups
+(perf_log.jsonl.1 is the newest). A file's age counts from its first record,
+so a log that keeps getting appends still rotates on time, also across
+restarts. When the queue is full, events are dropped
+and counted instead of blocking the app.
+
+Provided helpers:
+- PerfEvent: typed event record (event, duration_s, emissions_kg, cache, tip_source).
+- PerfLogger: buffered, rotating JSON-lines writer.
+- perf_log_path(): PERF_LOG_PATH as currently set in the environment.
+- get_perf_logger(): the shared process-wide PerfLogger for perf_log_path() (flushed at exit).
+- read_events(path): parse a log file back into dicts.
+"""
+
+from __future__ import annotations
+
+import atexit
+import json
+import os
+import queue
+import threading
+import time
+from typing import Dict, List, NamedTuple, Optional
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_PERF_LOG_PATH = os.path.join(HERE, "perf_log.jsonl")
+PERF_LOG_MAX_BYTES = int(os.getenv("PERF_LOG_MAX_BYTES", str(5 * 1024 * 1024)))
+PERF_LOG_ROTATE_S = float(os.getenv("PERF_LOG_ROTATE_S", "0"))  # 0 = size-based only
+PERF_LOG_BACKUPS = int(os.getenv("PERF_LOG_BACKUPS", "5"))
+
+# Known event types; others are accepted but these are what the app emits
+EVENT_TIP = "tip"
+EVENT_INVALID_INPUTS = "warning.invalid_inputs"
+EVENT_NO_INPUTS = "warning.no_inputs"
+
+
+def perf_log_path() -> str:
+    """PERF_LOG_PATH, read at call time so later changes to the env take effect."""
+    return os.getenv("PERF_LOG_PATH") or DEFAULT_PERF_LOG_PATH
+
+
+class PerfEvent(NamedTuple):
+    """One perf event. Unknown values stay None so numeric fields stay numeric."""
+
+    event: str
+    ts: float
+    duration_s: Optional[float] = None
+    emissions_kg: Optional[float] = None
+    cache: Optional[str] = None  # "session", "prefetch", "miss", "inline"
+    tip_source: Optional[str] = None  # "gpt", "fallback", "unknown"
+
+    @classmethod
+    def make(cls, event: str, duration_s=None, emissions_kg=None, cache=None, tip_source=None) -> "PerfEvent":
+        return cls(
+            event=str(event),
+            ts=time.time(),
+            duration_s=None if duration_s is None else round(float(duration_s), 6),
+            emissions_kg=None if emissions_kg is None else round(float(emissions_kg), 4),
+            cache=None if cache is None else str(cache),
+            tip_source=None if tip_source is None else str(tip_source),
+        )
+
+
+class PerfLogger:
+    """Buffered JSON-lines writer with size/time rotation on a daemon thread.
+
+    max_bytes rotates once the file reaches that size (0 disables);
+    rotate_every_s rotates once the current file is that old (0 disables).
+    path defaults to perf_log_path() at construction.
+    """
+
+    def __init__(
+        self,
+        path: Optional[str] = None,
+        max_bytes: int = PERF_LOG_MAX_BYTES,
+        rotate_every_s: float = PERF_LOG_ROTATE_S,
+        backups: int = PERF_LOG_BACKUPS,
+        flush_interval_s: float = 1.0,
+        max_queue: int = 10_000,
+    ):
+        self.path = path or perf_log_path()
+        self.max_bytes = int(max_bytes)
+        self.rotate_every_s = float(rotate_every_s)
+        self.backups = max(0, int(backups))
+        self.flush_interval_s = float(flush_interval_s)
+        self._queue: "queue.Queue[Optional[PerfEvent]]" = queue.Queue(maxsize=max(1, int(max_queue)))
+        self._lock = threading.Lock()
+        self._stats = {"logged": 0, "written": 0, "dropped": 0, "rotations": 0, "write_errors": 0}
+        self._opened_at: Optional[float] = None
+        self._flushed = threading.Condition(self._lock)
+        self._pending = 0
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name="perf-log-writer", daemon=True)
+        self._thread.start()
+
+    # Request path
+    def log(self, event: str, **fields) -> bool:
+        """Queue one event; returns False if it was dropped (queue full or closed)."""
+        return self.log_event(PerfEvent.make(event, **fields))
+
+    def log_event(self, ev: PerfEvent) -> bool:
+        if self._closed:
+            return False
+        with self._lock:
+            self._pending += 1
+        try:
+            self._queue.put_nowait(ev)
+        except queue.Full:
+            with self._lock:
+                self._pending -= 1
+                self._stats["dropped"] += 1
+            return False
+        with self._lock:
+            self._stats["logged"] += 1
+        return True
+
+    # Writer thread
+    def _run(self) -> None:
+        stop = False
+        while not stop:
+            batch: List[PerfEvent] = []
+            try:
+                item = self._queue.get(timeout=self.flush_interval_s)
+            except queue.Empty:
+                continue
+            while True:
+                if item is None:
+                    stop = True
+                else:
+                    batch.append(item)
+                if stop or len(batch) >= 1000:
+                    break
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+            if batch:
+                self._write(batch)
+            with self._lock:
+                self._pending -= len(batch)
+                self._flushed.notify_all()
+
+    def _write(self, batch: List[PerfEvent]) -> None:
+        data = "".join(json.dumps(ev._asdict(), separators=(",", ":")) + "\n" for ev in batch)
+        try:
+            self._maybe_rotate()
+            parent = os.path.dirname(self.path)
+            if parent:
+                os.makedirs(parent, exist_ok=True)
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(data)
+            if self._opened_at is None:
+                self._opened_at = batch[0].ts
+            with self._lock:
+                self._stats["written"] += len(batch)
+        except OSError:
+            with self._lock:
+                self._stats["write_errors"] += 1
+
+    def _maybe_rotate(self) -> None:
+        try:
+            size = os.path.getsize(self.path)
+        except OSError:
+            return
+        if self._opened_at is None:
+            self._opened_at = self._first_record_ts()
+        too_big = self.max_bytes > 0 and size >= self.max_bytes
+        too_old = self.rotate_every_s > 0 and time.time() - self._opened_at >= self.rotate_every_s
+        if not (too_big or too_old):
+            return
+        if self.backups == 0:
+            os.remove(self.path)
+        else:
+            for i in range(self.backups - 1, 0, -1):
+                src = f"{self.path}.{i}"
+                if os.path.exists(src):
+                    os.replace(src, f"{self.path}.{i + 1}")
+            os.replace(self.path, f"{self.path}.1")
+        self._opened_at = None
+        with self._lock:
+            self._stats["rotations"] += 1
+
+    def _first_record_ts(self) -> float:
+        """When the current file was started: its first record's ts (mtime if unreadable)."""
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                return float(json.loads(f.readline())["ts"])
+        except (ValueError, KeyError, TypeError):
+            return os.path.getmtime(self.path)
+
+    # Control
+    def flush(self, timeout: float = 5.0) -> bool:
+        """Wait until every queued event has been written; False on timeout."""
+        deadline = time.monotonic() + timeout
+        with self._lock:
+            while self._pending > 0:
+                left = deadline - time.monotonic()
+                if left <= 0:
+                    return False
+                self._flushed.wait(left)
+        return True
+
+    def close(self, timeout: float = 5.0) -> None:
+        """Write what is queued and stop the writer thread."""
+        if self._closed:
+            return
+        self.flush(timeout)
+        self._closed = True
+        self._queue.put(None)
+        self._thread.join(timeout)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            out = dict(self._stats)
+        out["queued"] = self._queue.qsize()
+        return out
+
+
+_logger: Optional[PerfLogger] = None
+_logger_lock = threading.Lock()
+
+
+def get_perf_logger() -> PerfLogger:
+    """Shared PerfLogger for this process (PERF_LOG_* env settings).
+
+    If PERF_LOG_PATH changed since the logger was created, the old logger is
+    flushed and closed and a new one writes to the new path.
+    """
+    global _logger
+    path = perf_log_path()
+    with _logger_lock:
+        if _logger is None or _logger.path != path:
+            if _logger is not None:
+                _logger.close()
+            _logger = PerfLogger(path)
+            atexit.register(_logger.close)
+        return _logger
+
+
+def read_events(path: Optional[str] = None) -> List[dict]:
+    """Parse a JSON-lines perf log (default: perf_log_path()); malformed lines are skipped."""
+    path = path or perf_log_path()
+    events = []
+    try:
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    events.append(json.loads(line))
+                except ValueError:
+                    continue
+    except OSError:
+        pass
+    return events
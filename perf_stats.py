@@ -0,0 +1,348 @@
+"""
+perf_stats.py
+
+Incremental analysis of the perf_log.jsonl event log (see perf_log.py).
+
+PerfLogAggregator remembers how far into the log it has read (inode + byte
+offset), so each refresh() only parses lines appended since the last one. On
+first use it also reads the rotated backups, oldest first; when the live file
+is rotated between refreshes, the rest of the old file is finished from its
+backup, any files rotated in between are read in full, and then the new one
+is started. Nothing is re-read and no raw events are kept: latencies go into
+mergeable LatencySketch histograms (one overall, one per time bucket, only
+the newest max_buckets buckets are kept), plus counters and a bounded heap of
+the slowest events, so memory is independent of log length.
+
+Settings (env):
+- PERF_TIMELINE_BUCKETS: time buckets kept for timeline() (default 2016, a
+  week of 5-minute buckets).
+
+Lines are parsed a block at a time with pyarrow's JSON reader (a Streamlit
+dependency) against a fixed schema and aggregated with numpy/pandas; blocks
+with a malformed line fall back to json.loads per line, skipping bad ones.
+
+Provided helpers:
+- LatencySketch: log-bucketed quantile sketch with bounded relative error.
+- PerfLogAggregator: incremental reader and aggregates for one log path.
+- get_perf_aggregator(path): shared aggregator per path for this process.
+"""
+
+from __future__ import annotations
+
+import heapq
+import json
+import math
+import os
+import threading
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from perf_log import EVENT_TIP, PERF_LOG_BACKUPS, PerfEvent, perf_log_path
+
+READ_BLOCK_BYTES = 8 << 20
+PERF_TIMELINE_BUCKETS = int(os.getenv("PERF_TIMELINE_BUCKETS", "2016"))
+
+
+class LatencySketch:
+    """Quantile sketch: values land in geometric buckets of width ~2*rel_err.
+
+    Any quantile is returned within rel_err of a value at that rank. Sketches
+    with the same rel_err merge by adding bucket counts.
+    """
+
+    def __init__(self, rel_err: float = 0.01, min_value: float = 1e-6):
+        self.rel_err = rel_err
+        self.gamma = (1 + rel_err) / (1 - rel_err)
+        self._log_gamma = math.log(self.gamma)
+        self.min_value = min_value
+        self.buckets: Dict[int, int] = {}
+        self.zeros = 0
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, value: float) -> None:
+        self.count += 1
+        self.total += value
+        if value > self.max:
+            self.max = value
+        if value <= self.min_value:
+            self.zeros += 1
+            return
+        key = math.ceil(math.log(value) / self._log_gamma)
+        self.buckets[key] = self.buckets.get(key, 0) + 1
+
+    def add_many(self, values) -> None:
+        """Vectorized add() for an array of values."""
+        values = np.asarray(values, dtype=float)
+        if not values.size:
+            return
+        self.count += int(values.size)
+        self.total += float(values.sum())
+        self.max = max(self.max, float(values.max()))
+        small = values <= self.min_value
+        self.zeros += int(small.sum())
+        keys = np.ceil(np.log(values[~small]) / self._log_gamma).astype(np.int64)
+        for key, n in zip(*np.unique(keys, return_counts=True)):
+            self.buckets[int(key)] = self.buckets.get(int(key), 0) + int(n)
+
+    def merge(self, other: "LatencySketch") -> None:
+        for key, n in other.buckets.items():
+            self.buckets[key] = self.buckets.get(key, 0) + n
+        self.zeros += other.zeros
+        self.count += other.count
+        self.total += other.total
+        self.max = max(self.max, other.max)
+
+    def quantile(self, q: float) -> Optional[float]:
+        """Approximate q-quantile (0..1); None when empty."""
+        if self.count == 0:
+            return None
+        rank = q * (self.count - 1)
+        if rank < self.zeros:
+            return 0.0
+        seen = self.zeros
+        for key in sorted(self.buckets):
+            seen += self.buckets[key]
+            if seen > rank:
+                return min(self.max, 2 * self.gamma ** key / (self.gamma + 1))
+        return self.max
+
+    def mean(self) -> Optional[float]:
+        return self.total / self.count if self.count else None
+
+
+class PerfLogAggregator:
+    """Incrementally ingests one perf log and keeps latency/outcome aggregates.
+
+    bucket_s sets the time resolution of timeline() and max_buckets how many of
+    the newest buckets it keeps; top_n how many of the slowest tip events are kept.
+    """
+
+    def __init__(
+        self,
+        path: Optional[str] = None,
+        bucket_s: int = 300,
+        top_n: int = 20,
+        backups: int = PERF_LOG_BACKUPS,
+        max_buckets: int = PERF_TIMELINE_BUCKETS,
+    ):
+        self.path = path or perf_log_path()
+        self.bucket_s = max(1, int(bucket_s))
+        self.max_buckets = max(1, int(max_buckets))
+        self.top_n = top_n
+        self.backups = backups
+        self._lock = threading.Lock()
+        self._inode: Optional[int] = None
+        self._offset = 0
+        self._started = False
+        self.lines = 0
+        self.bad_lines = 0
+        self.latency = LatencySketch()
+        self.buckets: Dict[int, LatencySketch] = {}
+        self.events: Dict[str, int] = {}
+        self.sources: Dict[str, int] = {}
+        self.cache: Dict[str, int] = {}
+        self._slowest: List[Tuple[float, int, dict]] = []  # min-heap of (duration, seq, event)
+        self._seq = 0
+
+    # Ingestion
+    def refresh(self) -> int:
+        """Parse everything appended since the last call; returns lines ingested."""
+        with self._lock:
+            before = self.lines
+            if not self._started:
+                self._started = True
+                for i in range(self.backups, 0, -1):
+                    backup = f"{self.path}.{i}"
+                    if os.path.exists(backup):
+                        self._read_from(backup, 0)
+            try:
+                st = os.stat(self.path)
+            except OSError:
+                return self.lines - before
+            if self._inode is not None and st.st_ino != self._inode:
+                self._catch_up_rotations()
+                self._offset = 0
+            elif st.st_size < self._offset:
+                self._offset = 0  # truncated in place
+            self._inode = st.st_ino
+            self._offset = self._read_from(self.path, self._offset)
+            return self.lines - before
+
+    def _catch_up_rotations(self) -> None:
+        """Finish the file last read from its backup, then read newer backups in full.
+
+        Backups are scanned newest first (path.1, path.2, ...) until the one
+        holding the old inode; everything before it was rotated out after the
+        last refresh. If the old file already fell off the end, every backup is
+        newer and is read.
+        """
+        newer = []
+        for i in range(1, self.backups + 1):
+            backup = f"{self.path}.{i}"
+            try:
+                inode = os.stat(backup).st_ino
+            except OSError:
+                break
+            if inode == self._inode:
+                self._read_from(backup, self._offset)
+                break
+            newer.append(backup)
+        for backup in reversed(newer):
+            self._read_from(backup, 0)
+
+    def _read_from(self, path: str, offset: int) -> int:
+        """Ingest complete lines of path from offset; returns the offset after the last one."""
+        try:
+            f = open(path, "rb")
+        except OSError:
+            return offset
+        with f:
+            f.seek(offset)
+            tail = b""
+            while True:
+                block = f.read(READ_BLOCK_BYTES)
+                if not block:
+                    break
+                block = tail + block
+                cut = block.rfind(b"\n") + 1
+                tail = block[cut:]
+                if cut:
+                    self._ingest(block[:cut])
+                    offset += cut
+        return offset  # a partial last line is left for the next refresh
+
+    def _ingest(self, data: bytes) -> None:
+        frame = _parse_block(data)
+        if frame is None:
+            frame = self._parse_lines(data)
+        if frame.empty:
+            return
+        self.lines += len(frame)
+        for name, n in frame["event"].value_counts().items():
+            self.events[name] = self.events.get(name, 0) + int(n)
+        tips = frame[frame["event"] == EVENT_TIP]
+        if tips.empty:
+            return
+        for counts, column in ((self.sources, "tip_source"), (self.cache, "cache")):
+            for value, n in tips[column].fillna("unknown").value_counts().items():
+                counts[value] = counts.get(value, 0) + int(n)
+        timed = tips[tips["duration_s"].notna()]
+        if timed.empty:
+            return
+        durations = timed["duration_s"].to_numpy(dtype=float)
+        self.latency.add_many(durations)
+        bucket = (timed["ts"].fillna(0).to_numpy(dtype=float) // self.bucket_s * self.bucket_s).astype(np.int64)
+        for ts, idx in pd.Series(np.arange(len(bucket))).groupby(bucket):
+            sketch = self.buckets.get(int(ts))
+            if sketch is None:
+                sketch = self.buckets[int(ts)] = LatencySketch()
+            sketch.add_many(durations[idx.to_numpy()])
+        if len(self.buckets) > self.max_buckets:
+            for ts in sorted(self.buckets)[:len(self.buckets) - self.max_buckets]:
+                del self.buckets[ts]
+        for pos in np.argsort(durations)[-self.top_n:]:
+            duration = float(durations[pos])
+            if len(self._slowest) >= self.top_n and duration <= self._slowest[0][0]:
+                continue
+            row = timed.iloc[int(pos)]
+            ev = {k: (None if pd.isna(row[k]) else row[k]) for k in PerfEvent._fields}
+            self._seq += 1
+            item = (duration, self._seq, ev)
+            if len(self._slowest) < self.top_n:
+                heapq.heappush(self._slowest, item)
+            else:
+                heapq.heapreplace(self._slowest, item)
+
+    def _parse_lines(self, data: bytes) -> pd.DataFrame:
+        rows = []
+        for line in data.splitlines():
+            if not line.strip():
+                continue
+            try:
+                ev = json.loads(line)
+                if not isinstance(ev, dict) or not isinstance(ev.get("event"), str):
+                    raise ValueError
+            except ValueError:
+                self.bad_lines += 1
+                continue
+            rows.append({k: ev.get(k) for k in PerfEvent._fields})
+        frame = pd.DataFrame(rows, columns=list(PerfEvent._fields))
+        for column in ("ts", "duration_s", "emissions_kg"):
+            frame[column] = pd.to_numeric(frame[column], errors="coerce")
+        return frame
+
+    # Views
+    def summary(self) -> dict:
+        with self._lock:
+            lat = self.latency
+            return {
+                "lines": self.lines,
+                "bad_lines": self.bad_lines,
+                "tips": lat.count,
+                "p50_s": lat.quantile(0.50),
+                "p90_s": lat.quantile(0.90),
+                "p99_s": lat.quantile(0.99),
+                "mean_s": lat.mean(),
+                "max_s": lat.max if lat.count else None,
+                "events": dict(self.events),
+                "tip_sources": dict(self.sources),
+                "cache": dict(self.cache),
+            }
+
+    def timeline(self) -> List[dict]:
+        """Per time bucket: start ts, tip count and p50/p90/p99 latency (seconds)."""
+        with self._lock:
+            return [
+                {"ts": ts, "count": s.count, "p50_s": s.quantile(0.50), "p90_s": s.quantile(0.90), "p99_s": s.quantile(0.99)}
+                for ts, s in sorted(self.buckets.items())
+            ]
+
+    def slowest(self) -> List[dict]:
+        """The slowest tip events seen so far, slowest first."""
+        with self._lock:
+            return [ev for _, _, ev in sorted(self._slowest, key=lambda t: (-t[0], t[1]))]
+
+
+_SCHEMA = None
+
+
+def _parse_block(data: bytes) -> Optional[pd.DataFrame]:
+    """Parse JSON lines with pyarrow against the PerfEvent schema; None if unavailable or malformed."""
+    global _SCHEMA
+    try:
+        import pyarrow as pa
+        import pyarrow.json as pa_json
+    except ImportError:
+        return None
+    if _SCHEMA is None:
+        types = {"event": pa.string(), "cache": pa.string(), "tip_source": pa.string()}
+        _SCHEMA = pa.schema([(name, types.get(name, pa.float64())) for name in PerfEvent._fields])
+    try:
+        table = pa_json.read_json(
+            pa.BufferReader(data),
+            parse_options=pa_json.ParseOptions(explicit_schema=_SCHEMA, unexpected_field_behavior="ignore"),
+        )
+    except (pa.ArrowInvalid, pa.ArrowTypeError):
+        return None
+    frame = table.to_pandas()
+    if frame["event"].isna().any():
+        return None
+    return frame
+
+
+_aggregators: Dict[str, PerfLogAggregator] = {}
+_aggregators_lock = threading.Lock()
+
+
+def get_perf_aggregator(path: Optional[str] = None) -> PerfLogAggregator:
+    """Shared aggregator for path (default: perf_log_path()), so every session reuses the ingested state."""
+    path = path or perf_log_path()
+    with _aggregators_lock:
+        agg = _aggregators.get(path)
+        if agg is None:
+            agg = _aggregators[path] = PerfLogAggregator(path)
+        return agg
@@ -0,0 +1,169 @@
+"""
+rate_limiter.py
+
+Process-wide rate limiting for OpenAI calls.
+
+When many sessions hit the API at once, each one retrying on its own makes a
+rate-limit storm worse. RateLimiter puts two token buckets (requests per minute
+and tokens per minute) in front of every GPT call and serves waiters from a
+priority queue, so interactive dashboard tips go ahead of background prefetch
+and batch jobs. Callers that cannot be served before their deadline get False
+back and should degrade to the local tip.
+
+Provided helpers:
+- PRIORITY_INTERACTIVE / PRIORITY_BACKGROUND / PRIORITY_BATCH: lower is served first.
+- TokenBucket: continuous-refill bucket.
+- RateLimiter: RPM + TPM buckets with a priority wait queue and 429 cooldown.
+- get_rate_limiter(): the shared limiter, configured from OPENAI_RPM / OPENAI_TPM.
+"""
+
+from __future__ import annotations
+
+import heapq
+import itertools
+import os
+import threading
+import time
+from typing import Callable, Dict, Optional
+
+
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BACKGROUND = 5
+PRIORITY_BATCH = 10
+
+
+class TokenBucket:
+    """Token bucket that refills continuously up to capacity."""
+
+    def __init__(self, capacity: float, refill_per_s: float, now: float):
+        self.capacity = float(capacity)
+        self.refill_per_s = float(refill_per_s)
+        self.tokens = float(capacity)
+        self._last = now
+
+    def refill(self, now: float) -> None:
+        if now > self._last:
+            self.tokens = min(self.capacity, self.tokens + (now - self._last) * self.refill_per_s)
+            self._last = now
+
+    def time_until(self, amount: float, now: float) -> float:
+        """Seconds until `amount` tokens are available (0 if available now)."""
+        self.refill(now)
+        amount = min(float(amount), self.capacity)
+        if self.tokens >= amount:
+            return 0.0
+        if self.refill_per_s <= 0:
+            return float("inf")
+        return (amount - self.tokens) / self.refill_per_s
+
+    def consume(self, amount: float) -> None:
+        self.tokens -= min(float(amount), self.capacity)
+
+
+class RateLimiter:
+    """Requests-per-minute and tokens-per-minute limiter with a priority queue.
+
+    acquire() blocks until both buckets can serve the request and no
+    higher-priority (or earlier same-priority) waiter is ahead of it. It returns
+    False without consuming anything if that cannot happen before the deadline.
+    """
+
+    def __init__(self, rpm: float, tpm: float, clock: Callable[[], float] = time.monotonic):
+        self._clock = clock
+        now = clock()
+        self.rpm = float(rpm)
+        self.tpm = float(tpm)
+        self._requests = TokenBucket(rpm, rpm / 60.0, now)
+        self._tokens = TokenBucket(tpm, tpm / 60.0, now)
+        self._cond = threading.Condition()
+        self._waiters: list = []  # heap of (priority, seq)
+        self._seq = itertools.count()
+        self._cooldown_until = 0.0
+        self.granted = 0
+        self.degraded = 0
+        self.penalties = 0
+        self._wait_total_s = 0.0
+
+    def _wait_needed(self, tokens: float, now: float) -> float:
+        return max(
+            self._cooldown_until - now,
+            self._requests.time_until(1, now),
+            self._tokens.time_until(tokens, now),
+            0.0,
+        )
+
+    def acquire(self, tokens: float = 1.0, priority: int = PRIORITY_INTERACTIVE, deadline_s: Optional[float] = None) -> bool:
+        """Wait for capacity; False if not served within deadline_s seconds."""
+        start = self._clock()
+        deadline = None if deadline_s is None else start + max(0.0, float(deadline_s))
+        entry = (int(priority), next(self._seq))
+        with self._cond:
+            heapq.heappush(self._waiters, entry)
+            try:
+                while True:
+                    now = self._clock()
+                    at_head = self._waiters[0] == entry
+                    wait = self._wait_needed(tokens, now) if at_head else None
+                    if at_head and wait == 0.0:
+                        self._requests.consume(1)
+                        self._tokens.consume(tokens)
+                        self.granted += 1
+                        self._wait_total_s += now - start
+                        return True
+                    if deadline is not None:
+                        remaining = deadline - now
+                        # At the head we know exactly how long capacity takes
+                        if remaining <= 0 or (wait is not None and wait > remaining):
+                            self.degraded += 1
+                            return False
+                        timeout = remaining if wait is None else min(wait, remaining)
+                    else:
+                        timeout = wait
+                    self._cond.wait(timeout=timeout)
+            finally:
+                if entry in self._waiters:
+                    self._waiters.remove(entry)
+                    heapq.heapify(self._waiters)
+                self._cond.notify_all()
+
+    def penalize(self, seconds: float) -> None:
+        """Pause all callers for `seconds` (e.g. after a 429 from the API)."""
+        with self._cond:
+            self._cooldown_until = max(self._cooldown_until, self._clock() + max(0.0, float(seconds)))
+            self.penalties += 1
+            self._cond.notify_all()
+
+    def stats(self) -> Dict[str, float]:
+        with self._cond:
+            now = self._clock()
+            self._requests.refill(now)
+            self._tokens.refill(now)
+            return {
+                "rpm": self.rpm,
+                "tpm": self.tpm,
+                "requests_available": round(self._requests.tokens, 2),
+                "tokens_available": round(self._tokens.tokens, 1),
+                "waiting": len(self._waiters),
+                "granted": self.granted,
+                "degraded": self.degraded,
+                "penalties": self.penalties,
+                "cooldown_s": round(max(0.0, self._cooldown_until - now), 2),
+                "avg_wait_s": round(self._wait_total_s / self.granted, 4) if self.granted else 0.0,
+            }
+
+
+_LIMITER: Optional[RateLimiter] = None
+_LIMITER_LOCK = threading.Lock()
+
+
+def get_rate_limiter() -> RateLimiter:
+    """Return the process-wide RateLimiter, creating it on first use."""
+    global _LIMITER
+    if _LIMITER is None:
+        with _LIMITER_LOCK:
+            if _LIMITER is None:
+                _LIMITER = RateLimiter(
+                    rpm=float(os.getenv("OPENAI_RPM", "500")),
+                    tpm=float(os.getenv("OPENAI_TPM", "200000")),
+                )
+    return _LIMITER
@@ -0,0 +1,302 @@
+"""
+synthetic_history.py
+
+Seeded synthetic history data for scale testing: many users over several
+years, every core.ALL_KEYS activity, written to CSV, SQLite or Parquet.
+
+What the data looks like:
+- Each user has a fixed profile: which activities they have at all (no car,
+  no gas heating, ...) and a personal level for each one.
+- Seasonality: heating peaks in January, cycling and flights in July, and
+  electricity varies a little with the season. Commuting halves at weekends.
+  Flights are rare one-day events.
+- Gaps: users join at staggered dates, and a two-state (logging/away) Markov
+  chain per user skips days, so streaks break the way real ones do.
+- legacy_schema=True mimics old files: "electricity_kWh"/"district_heating_kWh"
+  columns in the original position, with the lowercase duplicates appended
+  after total_kg. Rows before the midpoint only fill the legacy column; later
+  rows fill the new one and leave the legacy column 0 or empty.
+
+Rows are produced in vectorized blocks of whole days (about chunk_rows rows
+each), sorted by date and then user, so memory stays flat and output is
+sorted like save_entry keeps history.csv. total_kg is computed from
+co2_engine.CO2_FACTORS. The same arguments and seed always give the same rows.
+
+Usage:
+    python synthetic_history.py history_big.csv --users 1000 --years 5
+    python synthetic_history.py history.sqlite --users 20000 --years 3 --seed 7
+    python synthetic_history.py history.parquet --users 5000 --legacy-schema
+"""
+
+from __future__ import annotations
+
+import argparse
+import datetime as dt
+import os
+import sqlite3
+import sys
+import time
+from typing import Iterator, NamedTuple, Optional
+
+import numpy as np
+import pandas as pd
+
+from co2_engine import CO2_FACTORS
+from core import ALL_KEYS
+
+DEFAULT_CHUNK_ROWS = 500_000
+LEGACY_COLUMNS = {"electricity_kwh": "electricity_kWh", "district_heating_kwh": "district_heating_kWh"}
+
+
+class Profile(NamedTuple):
+    mean: float  # typical daily amount for a user who has the activity
+    share: float  # fraction of users who have it at all
+    daily_p: float  # chance it happens on a logged day
+    season: Optional[str] = None  # "heating", "electricity", "summer"
+    commute: bool = False  # halved at weekends
+
+
+PROFILES = {
+    "electricity_kwh": Profile(8.0, 1.00, 1.00, "electricity"),
+    "natural_gas_m3": Profile(1.5, 0.50, 1.00, "heating"),
+    "hot_water_liter": Profile(60.0, 0.90, 0.95),
+    "cold_water_liter": Profile(120.0, 0.60, 0.95),
+    "district_heating_kwh": Profile(15.0, 0.20, 1.00, "heating"),
+    "propane_liter": Profile(0.3, 0.05, 0.50, "heating"),
+    "fuel_oil_liter": Profile(1.0, 0.08, 1.00, "heating"),
+    "petrol_liter": Profile(2.5, 0.50, 0.70, commute=True),
+    "diesel_liter": Profile(2.0, 0.20, 0.70, commute=True),
+    "bus_km": Profile(8.0, 0.50, 0.60, commute=True),
+    "train_km": Profile(20.0, 0.35, 0.50, commute=True),
+    "bicycle_km": Profile(5.0, 0.40, 0.50, "summer"),
+    "flight_short_km": Profile(800.0, 0.30, 0.010, "summer"),
+    "flight_long_km": Profile(6000.0, 0.15, 0.003, "summer"),
+    "meat_kg": Profile(0.15, 0.75, 0.70),
+    "chicken_kg": Profile(0.12, 0.70, 0.50),
+    "eggs_kg": Profile(0.05, 0.80, 0.60),
+    "dairy_kg": Profile(0.30, 0.90, 0.90),
+    "vegetarian_kg": Profile(0.40, 0.90, 0.80),
+    "vegan_kg": Profile(0.30, 0.60, 0.60),
+}
+
+# (amplitude, day of year with the peak)
+SEASONS = {"heating": (0.7, 15), "electricity": (0.2, 15), "summer": (0.6, 196)}
+
+
+def history_columns(users: int = 1, legacy_schema: bool = False) -> list:
+    """Column order of the generated frames."""
+    keys = [LEGACY_COLUMNS.get(k, k) for k in ALL_KEYS] if legacy_schema else list(ALL_KEYS)
+    cols = ["date"] + (["user_id"] if users > 1 else []) + keys + ["total_kg"]
+    return cols + (list(LEGACY_COLUMNS) if legacy_schema else [])
+
+
+def iter_synthetic_history(
+    users: int = 100,
+    start: dt.date | str = "2020-01-01",
+    days: int = 5 * 365,
+    seed: int = 0,
+    legacy_schema: bool = False,
+    gap_rate: float = 0.02,
+    mean_gap_days: float = 4.0,
+    chunk_rows: int = DEFAULT_CHUNK_ROWS,
+) -> Iterator[pd.DataFrame]:
+    """Yield history DataFrames of whole days (about chunk_rows rows each).
+
+    gap_rate is the daily chance a logging user stops logging; gaps last
+    mean_gap_days on average. A user_id column is included when users > 1.
+    """
+    users, days = max(1, int(users)), max(0, int(days))
+    start = np.datetime64(pd.Timestamp(start).date(), "D")
+    root = np.random.SeedSequence(seed)
+    user_ss, *_ = root.spawn(1)
+    rng = np.random.default_rng(user_ss)
+
+    n_keys = len(ALL_KEYS)
+    profiles = [PROFILES[k] for k in ALL_KEYS]
+    mean = np.array([p.mean for p in profiles])
+    daily_p = np.array([p.daily_p for p in profiles])
+    commute = np.array([p.commute for p in profiles])
+    factors = np.array([CO2_FACTORS.get(k, 0.0) for k in ALL_KEYS])
+
+    has = rng.random((users, n_keys)) < np.array([p.share for p in profiles])
+    level = rng.lognormal(0.0, 0.35, (users, n_keys)) * has * mean
+    # A fifth of users are there from day one, the rest join during the first half
+    joined = np.where(rng.random(users) < 0.2, 0, rng.integers(0, max(1, days // 2), users))
+    logging = np.ones(users, dtype=bool)
+    p_return = 1.0 / max(1.0, mean_gap_days)
+    user_ids = np.array([f"u{i:06d}" for i in range(users)], dtype=object)
+    cutover = days // 2
+    columns = history_columns(users, legacy_schema)
+
+    block = max(1, int(chunk_rows) // users)
+    for first in range(0, days, block):
+        n_days = min(block, days - first)
+        rng = np.random.default_rng(root.spawn(1)[0])
+
+        # Who logs on each day of the block (day-by-day Markov step, vectorized over users)
+        active = np.empty((n_days, users), dtype=bool)
+        for d in range(n_days):
+            u = rng.random(users)
+            logging = np.where(logging, u >= gap_rate, u < p_return)
+            active[d] = logging & (joined <= first + d)
+
+        day_idx, user_idx = np.nonzero(active)
+        if not len(day_idx):
+            continue
+        dates = start + (first + np.arange(n_days))
+        doy = (dates - dates.astype("datetime64[Y]")).astype(int) + 1
+        season = np.ones((n_days, n_keys))
+        for j, p in enumerate(profiles):
+            if p.season:
+                amp, peak = SEASONS[p.season]
+                season[:, j] = 1 + amp * np.cos(2 * np.pi * (doy - peak) / 365.25)
+        weekend = (dates.astype("datetime64[D]").view("int64") - 4) % 7 >= 5  # 1970-01-01 was a Thursday
+        season[np.ix_(weekend, commute)] *= 0.5
+
+        n = len(day_idx)
+        happens = rng.random((n, n_keys)) < daily_p
+        values = level[user_idx] * season[day_idx] * happens * rng.gamma(4.0, 0.25, (n, n_keys))
+        values = np.round(values, 2)
+        total = np.round(values @ factors, 2)
+
+        frame = pd.DataFrame(values, columns=list(ALL_KEYS))
+        frame.insert(0, "date", dates[day_idx].astype("datetime64[ns]"))
+        if users > 1:
+            frame.insert(1, "user_id", user_ids[user_idx])
+        frame["total_kg"] = total
+        if legacy_schema:
+            old = (first + day_idx) < cutover
+            for key, legacy in LEGACY_COLUMNS.items():
+                amount = frame[key].to_numpy()
+                frame[legacy] = np.where(old, amount, np.where(rng.random(n) < 0.5, 0.0, np.nan))
+                frame[key] = np.where(old, np.nan, amount)
+        yield frame[columns]
+
+
+# =========================
+# Writers
+# =========================
+def _infer_format(path: str) -> str:
+    ext = os.path.splitext(path)[1].lower()
+    if ext in (".sqlite", ".sqlite3", ".db"):
+        return "sqlite"
+    if ext in (".parquet", ".pq"):
+        return "parquet"
+    return "csv"
+
+
+def _date_strings(frame: pd.DataFrame) -> np.ndarray:
+    return np.datetime_as_string(frame["date"].to_numpy().astype("datetime64[D]"))
+
+
+def write_csv(chunks, path: str) -> int:
+    """Write chunks as one CSV (pyarrow's writer when available, else pandas)."""
+    try:
+        import pyarrow as pa
+        import pyarrow.csv as pa_csv
+    except ImportError:
+        pa = None
+    rows = 0
+    with open(path, "wb") as f:
+        for i, frame in enumerate(chunks):
+            if pa is None:
+                f.write(frame.to_csv(index=False, header=i == 0, date_format="%Y-%m-%d").encode("utf-8"))
+            else:
+                table = pa.Table.from_pandas(frame, preserve_index=False)
+                table = table.set_column(0, "date", table.column("date").cast(pa.date32()))
+                pa_csv.write_csv(table, f, pa_csv.WriteOptions(include_header=i == 0, quoting_style="none"))
+            rows += len(frame)
+    return rows
+
+
+def write_sqlite(chunks, path: str, table: str = "history") -> int:
+    """Write chunks into a fresh SQLite table (dates as ISO text), indexed by date."""
+    if os.path.exists(path):
+        os.remove(path)
+    con = sqlite3.connect(path)
+    rows = 0
+    try:
+        con.execute("PRAGMA journal_mode=OFF")
+        con.execute("PRAGMA synchronous=OFF")
+        columns = None
+        for frame in chunks:
+            if columns is None:
+                columns = list(frame.columns)
+                decl = ", ".join(f'"{c}" {"TEXT" if c in ("date", "user_id") else "REAL"}' for c in columns)
+                con.execute(f'CREATE TABLE "{table}" ({decl})')
+                insert = f'INSERT INTO "{table}" VALUES ({", ".join("?" * len(columns))})'
+            data = [_date_strings(frame).tolist()] + [frame[c].tolist() for c in columns[1:]]
+            with con:
+                con.executemany(insert, zip(*data))  # NaN is stored as NULL
+            rows += len(frame)
+        if columns is not None:
+            con.execute(f'CREATE INDEX "{table}_date" ON "{table}" (date)')
+            if "user_id" in columns:
+                con.execute(f'CREATE INDEX "{table}_user_date" ON "{table}" (user_id, date)')
+            con.commit()
+    finally:
+        con.close()
+    return rows
+
+
+def write_parquet(chunks, path: str) -> int:
+    """Write chunks as one Parquet file, one row group per chunk."""
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError as e:
+        raise ImportError(f"Parquet output needs pyarrow: {e}. Install with: pip install pyarrow") from e
+    writer = None
+    rows = 0
+    try:
+        for frame in chunks:
+            table = pa.Table.from_pandas(frame, preserve_index=False)
+            table = table.set_column(0, "date", table.column("date").cast(pa.date32()))
+            if writer is None:
+                writer = pq.ParquetWriter(path, table.schema)
+            writer.write_table(table)
+            rows += len(frame)
+    finally:
+        if writer is not None:
+            writer.close()
+    return rows
+
+
+WRITERS = {"csv": write_csv, "sqlite": write_sqlite, "parquet": write_parquet}
+
+
+def write_history(path: str, fmt: Optional[str] = None, **kwargs) -> int:
+    """Generate history with iter_synthetic_history(**kwargs) into path; returns rows written.
+
+    fmt is "csv", "sqlite" or "parquet" (default: from the file extension).
+    """
+    return WRITERS[fmt or _infer_format(path)](iter_synthetic_history(**kwargs), path)
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Generate seeded synthetic history for scale testing")
+    parser.add_argument("out", help="Output file (.csv, .sqlite/.db or .parquet)")
+    parser.add_argument("--format", choices=sorted(WRITERS), help="Override the format inferred from the extension")
+    parser.add_argument("--users", type=int, default=100)
+    parser.add_argument("--start", default="2020-01-01", help="First date (YYYY-MM-DD)")
+    parser.add_argument("--years", type=float, default=5.0)
+    parser.add_argument("--days", type=int, help="Number of days (overrides --years)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--legacy-schema", action="store_true", help="Old layout with duplicate *_kWh columns")
+    parser.add_argument("--gap-rate", type=float, default=0.02, help="Daily chance a user stops logging")
+    parser.add_argument("--chunk-rows", type=int, default=DEFAULT_CHUNK_ROWS)
+    args = parser.parse_args(argv)
+
+    days = args.days if args.days is not None else int(round(args.years * 365.25))
+    t0 = time.perf_counter()
+    rows = write_history(
+        args.out, args.format, users=args.users, start=args.start, days=days, seed=args.seed,
+        legacy_schema=args.legacy_schema, gap_rate=args.gap_rate, chunk_rows=args.chunk_rows,
+    )
+    elapsed = time.perf_counter() - t0
+    print(f"Wrote {rows:,} rows to {args.out} in {elapsed:.1f}s ({rows / max(elapsed, 1e-9):,.0f} rows/s)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
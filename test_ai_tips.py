@@ -230,4 +230,80 @@ def test_missing_input_edge_case(monkeypatch):
 
     tip = ai_tips.generate_eco_tip(user_data, emissions)
     assert isinstance(tip, str)
-    assert len(tip.strip()) > 0
\ No newline at end of file
+    assert len(tip.strip()) > 0
+
+def test_batch_tips_one_call_per_chunk_with_per_item_fallback(monkeypatch):
+    monkeypatch.setenv("OPENAI_API_KEY", "sk-test-key")
+    calls = {"n": 0}
+
+    class FakeChoice:
+        def __init__(self, content):
+            self.message = SimpleNamespace(content=content)
+
+    class FakeResponse:
+        def __init__(self, content):
+            self.choices = [FakeChoice(content)]
+
+    def fake_create(**kwargs):
+        calls["n"] += 1
+        # Answer only for id 1 and 3; id 2 is missing and must fall back locally
+        return FakeResponse('```json\n{"tips": [{"id": 1, "tip": "Take the bus."}, {"id": 3, "tip": "Go meat-free."}]}\n```')
+
+    monkeypatch.setattr(ai_tips.client.chat.completions, "create", fake_create, raising=True)
+
+    profiles = [
+        ({"petrol_liter": 5}, 1.2),
+        ({"electricity_kwh": 20}, 4.7),
+        ({"meat_kg": 1}, 27.0),
+    ]
+    tips = ai_tips.generate_eco_tips_batch(profiles, chunk_size=10)
+
+    assert calls["n"] == 1
+    assert tips[0] == "Take the bus."
+    assert tips[1] == ai_tips.clean_tip(ai_tips.local_tip({"electricity_kwh": 20}, 4.7))
+    assert tips[2] == "Go meat-free."
+
+
+def test_batch_tips_unparsable_chunk_falls_back_per_item(monkeypatch):
+    monkeypatch.setenv("OPENAI_API_KEY", "sk-test-key")
+    calls = {"n": 0}
+
+    def fake_create(**kwargs):
+        calls["n"] += 1
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content="Sorry, no JSON today."))])
+
+    monkeypatch.setattr(ai_tips.client.chat.completions, "create", fake_create, raising=True)
+
+    profiles = [({"bus_km": i + 1}, 0.12 * (i + 1)) for i in range(5)]
+    tips = ai_tips.generate_eco_tips_batch(profiles, chunk_size=2)
+
+    # 5 profiles in chunks of 2 -> 3 model calls
+    assert calls["n"] == 3
+    assert tips == [ai_tips.clean_tip(ai_tips.local_tip(ud, em)) for ud, em in profiles]
+
+
+def test_batch_tips_without_key_never_calls_api(monkeypatch):
+    monkeypatch.delenv("OPENAI_API_KEY", raising=False)
+    with patch("ai_tips.client.chat.completions.create", side_effect=AssertionError("no API")):
+        tips = ai_tips.generate_eco_tips_batch([({"meat_kg": 0.5}, 13.5)])
+    assert len(tips) == 1 and "meat" in tips[0].lower()
+
+
+def test_generate_tip_with_source_ignores_other_threads(monkeypatch):
+    import threading
+
+    monkeypatch.delenv("OPENAI_API_KEY", raising=False)
+    real = ai_tips.generate_eco_tip
+
+    def generate_then_other_session_finishes(*args, **kwargs):
+        tip = real(*args, **kwargs)
+        # Another session's GPT tip lands before this session reads the source
+        t = threading.Thread(target=ai_tips._set_tip_source, args=("gpt",))
+        t.start()
+        t.join()
+        return tip
+
+    monkeypatch.setattr(ai_tips, "generate_eco_tip", generate_then_other_session_finishes)
+    tip, source = ai_tips.generate_tip_with_source({"bus_km": 10}, emissions=1.0)
+    assert tip and source == "fallback"
+    assert ai_tips.LAST_TIP_SOURCE == "gpt"
@@ -0,0 +1,87 @@
+import asyncio
+import http.client
+import json
+
+import pytest
+
+from api_server import ApiError, ApiServer, calculate, calculate_batch
+from bench_api import run_benchmark
+
+
+@pytest.fixture
+def server(tmp_path):
+    with ApiServer(history_path=str(tmp_path / "history.csv")) as srv:
+        yield srv
+
+
+def _post(conn, path, body):
+    conn.request("POST", path, json.dumps(body), {"Content-Type": "application/json"})
+    resp = conn.getresponse()
+    return resp.status, json.loads(resp.read())
+
+
+def test_calculate_matches_engine_and_reports_unknown_keys():
+    out = calculate({"activity_data": {"Electricity (kWh)": 10, "bus_km": 5, "rocket_km": 1}})
+    assert out["total_kg"] == round(10 * 0.233 + 5 * 0.12, 2)
+    assert out["breakdown"]["electricity_kwh"] == pytest.approx(2.33)
+    assert out["unknown_keys"] == ["rocket_km"]
+    with pytest.raises(ApiError) as exc:
+        calculate({"activity_data": {"bus_km": "lots"}})
+    assert exc.value.status == 400
+
+
+def test_batch_keeps_order_and_isolates_bad_items():
+    out = calculate_batch({"items": [{"bus_km": 10}, "oops", {"meat_kg": 1}]})
+    assert out["count"] == 3
+    assert out["results"][0]["total_kg"] == 1.2
+    assert "error" in out["results"][1]
+    assert out["results"][2]["total_kg"] == 27.0
+
+
+def test_endpoints_over_one_keep_alive_connection(server, monkeypatch):
+    monkeypatch.delenv("OPENAI_API_KEY", raising=False)
+    conn = http.client.HTTPConnection("127.0.0.1", server.port, timeout=5)
+    assert _post(conn, "/v1/history", {"date": "2025-01-02", "activity_data": {"bus_km": 3}}) == (200, {"date": "2025-01-02", "total_kg": 0.36})
+    conn.request("GET", "/v1/history?limit=10")
+    resp = conn.getresponse()
+    rows = json.loads(resp.read())["rows"]
+    assert resp.status == 200 and rows[0]["date"] == "2025-01-02" and rows[0]["total_kg"] == 0.36
+    status, body = _post(conn, "/v1/tip", {"activity_data": {"bus_km": 3}})
+    assert status == 200 and body["tip"]
+    status, body = _post(conn, "/v1/nowhere", {})
+    assert status == 404
+    # Everything above went over the same socket
+    assert server.requests == 4
+
+
+def test_bad_content_length_and_limit_answer_400(server):
+    for length in ("abc", "-5"):
+        conn = http.client.HTTPConnection("127.0.0.1", server.port, timeout=5)
+        conn.putrequest("POST", "/v1/calculate")
+        conn.putheader("Content-Length", length)
+        conn.endheaders()
+        resp = conn.getresponse()
+        assert resp.status == 400 and resp.getheader("Connection") == "close"
+        assert json.loads(resp.read()) == {"error": "invalid Content-Length"}
+        conn.close()
+    conn = http.client.HTTPConnection("127.0.0.1", server.port, timeout=5)
+    for limit in ("0", "-1", "x"):
+        conn.request("GET", f"/v1/history?limit={limit}")
+        resp = conn.getresponse()
+        assert resp.status == 400 and "limit" in json.loads(resp.read())["error"]
+
+
+def test_benchmark_reports_throughput_and_percentiles(server):
+    result = asyncio.run(run_benchmark(server.base_url, "calculate", connections=4, duration_s=0.3))
+    assert result["requests"] > 0 and result["errors"] == 0
+    assert result["p50_ms"] <= result["p99_ms"] <= result["max_ms"]
+
+
+def test_metrics_endpoint_serves_prometheus_text(server):
+    conn = http.client.HTTPConnection("127.0.0.1", server.port, timeout=5)
+    _post(conn, "/v1/calculate", {"activity_data": {"bus_km": 3}})
+    conn.request("GET", "/metrics")
+    resp = conn.getresponse()
+    body = resp.read().decode()
+    assert resp.status == 200 and resp.getheader("Content-Type").startswith("text/plain")
+    assert "# TYPE co2_calculations_total counter" in body
@@ -0,0 +1,63 @@
+import datetime as dt
+import os
+
+import pandas as pd
+import pytest
+
+pytest.importorskip("reportlab")
+
+from batch_reports import build_payload, output_name, run_batch
+
+
+def _history(tmp_path):
+    rows = []
+    for user in ("alice", "bob"):
+        for day in range(1, 6):
+            rows.append({"user_id": user, "date": f"2025-01-{day:02d}", "bus_km": 10.0 * day, "meat_kg": 0.1, "total_kg": 1.2 * day + 2.7})
+    path = tmp_path / "history.csv"
+    pd.DataFrame(rows).to_csv(path, index=False)
+    return str(path)
+
+
+def _jobs(*users):
+    return [{"user_id": u, "start": dt.date(2025, 1, 1), "end": dt.date(2025, 1, 31), "history": None} for u in users]
+
+
+def test_payload_filters_user_and_range(tmp_path):
+    df = pd.read_csv(_history(tmp_path), parse_dates=["date"])
+    job = {"user_id": "alice", "start": dt.date(2025, 1, 2), "end": dt.date(2025, 1, 3), "history": None}
+    payload = build_payload(job, df)
+    assert payload["per_category"]["Transport"] == pytest.approx((20 + 30) * 0.12)
+    assert payload["spark_data"]["Transport"] == [2.4, 3.6]
+    assert "2 of 2 days" in payload["summary_text"]
+    assert payload["kpis"]["streak_days"] == "2 days"
+    # Streak as of the range end: nothing logged on Jan 31
+    assert build_payload(_jobs("alice")[0], df)["kpis"]["streak_days"] == "0 days"
+
+
+def test_batch_writes_pdfs_and_resumes(tmp_path):
+    history = _history(tmp_path)
+    out = tmp_path / "reports"
+    stats = run_batch(_jobs("alice", "bob"), str(out), history_path=history, workers=1)
+    assert stats["written"] == 2 and not stats["failed"]
+    assert stats["docs_per_s"] > 0
+    first = out / output_name(_jobs("alice")[0])
+    assert first.read_bytes().startswith(b"%PDF")
+
+    # A restarted run only renders what is missing
+    stats = run_batch(_jobs("alice", "bob", "carol"), str(out), history_path=history, workers=1)
+    assert (stats["written"], stats["skipped"]) == (1, 2)
+    assert not [p for p in os.listdir(out) if ".tmp-" in p]
+
+
+def test_failed_document_does_not_stop_the_batch(tmp_path):
+    history = _history(tmp_path)
+    out = tmp_path / "reports"
+    # A directory where alice's PDF should go makes the final rename fail
+    blocked = out / output_name(_jobs("alice")[0])
+    blocked.mkdir(parents=True)
+    stats = run_batch(_jobs("alice", "bob"), str(out), history_path=history, workers=1, force=True)
+    assert stats["written"] == 1
+    assert [path for path, _ in stats["failed"]] == [str(blocked)]
+    assert (out / output_name(_jobs("bob")[0])).read_bytes().startswith(b"%PDF")
+    assert not [p for p in os.listdir(out) if ".tmp-" in p]
@@ -0,0 +1,94 @@
+import csv
+import json
+
+import pytest
+
+from batch_score import score_file
+from co2_engine import calculate_co2
+
+
+def _rows(n):
+    return [{"user_id": i, "electricity_kwh": i % 7, "bus_km": (i * 3) % 11, "meat_kg": (i % 4) / 10} for i in range(n)]
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_csv_scoring_is_ordered_and_matches_engine(tmp_path, workers):
+    src, dst = tmp_path / "in.csv", tmp_path / "out.csv"
+    rows = _rows(53)
+    with open(src, "w", newline="") as f:
+        w = csv.DictWriter(f, fieldnames=list(rows[0]))
+        w.writeheader()
+        w.writerows(rows)
+    stats = score_file(str(src), str(dst), workers=workers, chunk_rows=10)
+    assert stats["rows"] == 53 and stats["chunks"] == 6
+    with open(dst, newline="") as f:
+        out = list(csv.DictReader(f))
+    assert list(out[0]) == ["user_id", "total_kg", "Energy_kg", "Transport_kg", "Meals_kg"]
+    assert [int(r["user_id"]) for r in out] == list(range(53))
+    for r, o in zip(rows, out):
+        assert float(o["total_kg"]) == pytest.approx(calculate_co2({k: v for k, v in r.items() if k != "user_id"}))
+
+
+def test_jsonl_in_jsonl_out(tmp_path):
+    src, dst = tmp_path / "in.jsonl", tmp_path / "out.jsonl"
+    src.write_text("".join(json.dumps(r) + "\n" for r in _rows(5)))
+    score_file(str(src), str(dst), workers=1, chunk_rows=2)
+    out = [json.loads(line) for line in dst.read_text().splitlines()]
+    assert [o["user_id"] for o in out] == [0, 1, 2, 3, 4]
+    assert out[1]["Meals_kg"] == pytest.approx(0.1 * 27.0)
+
+
+def test_csv_blocks_keep_quoted_line_breaks_together(tmp_path):
+    src, dst = tmp_path / "in.csv", tmp_path / "out.csv"
+    rows = [{"user_id": i, "note": f'line one\nsays "hi" {i}\nline three', "bus_km": i} for i in range(7)]
+    with open(src, "w", newline="") as f:
+        w = csv.DictWriter(f, fieldnames=list(rows[0]))
+        w.writeheader()
+        w.writerows(rows)
+    stats = score_file(str(src), str(dst), workers=1, chunk_rows=2)
+    assert stats["rows"] == 7 and stats["chunks"] == 4
+    with open(dst, newline="") as f:
+        out = list(csv.DictReader(f))
+    assert [o["note"] for o in out] == [r["note"] for r in rows]
+    assert [float(o["total_kg"]) for o in out] == pytest.approx([calculate_co2({"bus_km": i}) for i in range(7)])
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_csv_pass_through_values_are_untouched(tmp_path, workers):
+    src, dst = tmp_path / "in.csv", tmp_path / "out.csv"
+    src.write_text(
+        "user_id,household,electricity_kwh\n"
+        "00123,5,10\n00124,,2\n00125,7,1\n"
+    )
+    score_file(str(src), str(dst), workers=workers, chunk_rows=2)
+    with open(dst, newline="") as f:
+        out = list(csv.DictReader(f))
+    assert [r["user_id"] for r in out] == ["00123", "00124", "00125"]
+    assert [r["household"] for r in out] == ["5", "", "7"]
+
+
+def test_jsonl_late_key_is_dropped_and_columns_stay_aligned(tmp_path):
+    src, dst = tmp_path / "in.jsonl", tmp_path / "out.csv"
+    rows = [
+        {"user_id": 1, "date": "2025-01-01", "electricity_kwh": 1},
+        {"user_id": 2, "date": "2025-01-02", "electricity_kwh": 2},
+        {"user_id": 3, "date": "2025-01-03", "note": "late", "electricity_kwh": 3},
+    ]
+    src.write_text("".join(json.dumps(r) + "\n" for r in rows))
+    stats = score_file(str(src), str(dst), workers=1, chunk_rows=2)
+    assert stats["dropped_columns"] == ["note"]
+    with open(dst, newline="") as f:
+        out = list(csv.DictReader(f))
+    assert list(out[0])[:2] == ["user_id", "date"] and "note" not in out[0]
+    assert [r["date"] for r in out] == ["2025-01-01", "2025-01-02", "2025-01-03"]
+    assert float(out[2]["total_kg"]) == pytest.approx(calculate_co2({"electricity_kwh": 3}))
+
+
+def test_jsonl_dates_and_sparse_ints_round_trip(tmp_path):
+    src, dst = tmp_path / "in.jsonl", tmp_path / "out.jsonl"
+    rows = [{"date": "2025-01-01", "household": 5, "bus_km": 1}, {"date": "2025-01-02", "bus_km": 2}]
+    src.write_text("".join(json.dumps(r) + "\n" for r in rows))
+    score_file(str(src), str(dst), workers=1, chunk_rows=10)
+    out = [json.loads(line) for line in dst.read_text().splitlines()]
+    assert [o["date"] for o in out] == ["2025-01-01", "2025-01-02"]
+    assert out[0]["household"] == 5 and out[1]["household"] is None
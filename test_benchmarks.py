@@ -0,0 +1,42 @@
+import json
+
+import pandas as pd
+
+import benchmarks
+
+
+def _result(median):
+    return {"median_s": median, "min_s": median, "stdev_s": 0.0, "loops": 1, "repeat": 1}
+
+
+def test_compare_flags_only_slowdowns_beyond_threshold():
+    baseline = {"results": {"a": _result(1.0), "b": _result(1.0), "c": _result(1.0)}}
+    current = {"results": {"a": _result(1.15), "b": _result(1.5), "c": _result(0.5), "new": _result(9.0)}}
+    failures, lines = benchmarks.compare(current, baseline, max_regression=0.2)
+    assert len(failures) == 1 and failures[0].startswith("b:")
+    assert len(lines) == 3  # "new" has no baseline
+    failures, _ = benchmarks.compare(current, baseline, max_regression=0.2, slack_s=1.0)
+    assert failures == []
+
+
+def test_run_save_and_compare_cli(tmp_path, capsys):
+    out = tmp_path / "bench.json"
+    args = ["run", "--filter", "micro.clean_tip", "--filter", "load_history.1k", "--repeat", "2", "--min-time", "0.001"]
+    assert benchmarks.main(args + ["--save", str(out)]) == 0
+    data = json.loads(out.read_text())
+    assert set(data["results"]) == {"micro.clean_tip", "macro.load_history.1k"}
+    assert data["results"]["micro.clean_tip"]["median_s"] > 0
+    slower = {"results": {k: dict(v, median_s=v["median_s"] * 10) for k, v in data["results"].items()}}
+    slow_path = tmp_path / "slow.json"
+    slow_path.write_text(json.dumps(slower))
+    assert benchmarks.main(["compare", str(out), str(slow_path)]) == 1
+    assert benchmarks.main(["compare", str(slow_path), str(out)]) == 0
+    assert "REGRESSION" in capsys.readouterr().out
+
+
+def test_history_file_fits_many_rows_per_day(tmp_path, monkeypatch):
+    monkeypatch.setattr(benchmarks, "MAX_HISTORY_DAYS", 10)
+    path = benchmarks.make_history_file(str(tmp_path / "h.csv"), 35)
+    df = pd.read_csv(path, parse_dates=["date"])
+    assert len(df) == 35 and df["date"].nunique() == 9
+    assert df["date"].is_monotonic_increasing
@@ -1,7 +1,7 @@
 import math
 import pytest
 
-from co2_engine import calculate_co2, calculate_co2_breakdown, CO2_FACTORS
+from co2_engine import calculate_co2, calculate_co2_breakdown, calculate_co2_frame, CO2_FACTORS
 
 def test_calculate_co2_basic_sum():
     user_data = {
@@ -45,6 +45,34 @@ def test_calculate_co2_breakdown_handles_weird_keys():
     assert total == pytest.approx(round(2 * CO2_FACTORS["electricity_kwh"] + 10 * CO2_FACTORS["bus_km"], 2), rel=1e-6)
 
 
+def test_calculate_co2_frame_matches_row_by_row():
+    import pandas as pd
+
+    rows = [
+        {"Electricity (kWh)": 2, "bus_km": 10, "note": "x"},
+        {"Electricity (kWh)": "bad", "bus_km": -3, "note": "y"},
+        {"Electricity (kWh)": 1.5, "bus_km": 0, "note": "z"},
+    ]
+    kg = calculate_co2_frame(pd.DataFrame(rows))
+    assert "note" not in kg.columns
+    for i, row in enumerate(rows):
+        assert kg["total_kg"].iloc[i] == pytest.approx(calculate_co2(row))
+
+
+def test_calculate_co2_frame_rounds_exactly_like_round(monkeypatch):
+    import random
+    import pandas as pd
+
+    monkeypatch.setitem(CO2_FACTORS, "electricity_kwh", 1.0)
+    rng = random.Random(7)
+    # Every .xx5 value up to 500 (np.round on x*100 gets 0.005, 0.015, ... wrong),
+    # exact binary ties, large and random values
+    amounts = [k / 1000 for k in range(5, 500_000, 10)] + [0.125, 1e7 + 0.005, 123456.785, 0.0]
+    amounts += [rng.uniform(0, 500) for _ in range(2000)]
+    kg = calculate_co2_frame(pd.DataFrame({"electricity_kwh": amounts}))
+    assert kg["total_kg"].tolist() == [round(a, 2) for a in amounts]
+
+
 # -----------------------------
 # Manual runner for python file execution
 # -----------------------------
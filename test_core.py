@@ -0,0 +1,154 @@
+import datetime as dt
+import os
+import subprocess
+import sys
+
+import pytest
+
+import core
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+def test_core_and_pdf_report_import_without_streamlit():
+    code = "import sys, core, pdf_report; print('streamlit' in sys.modules)"
+    out = subprocess.run([sys.executable, "-c", code], cwd=HERE, capture_output=True, text=True, check=True)
+    assert out.stdout.strip() == "False"
+
+
+def test_history_roundtrip_and_streak(tmp_path):
+    path = str(tmp_path / "history.csv")
+    today = dt.date(2025, 1, 3)
+    for offset, total in ((2, 12.0), (1, 10.0), (0, 8.0)):
+        core.save_entry(today - dt.timedelta(days=offset), {"electricity_kwh": 1.0}, total, path)
+    df = core.load_history(path)
+    assert len(df) == 3
+    assert core.get_yesterday_total(df, today) == 10.0
+    assert core.compute_streak(df, today) == 3
+
+
+def test_validation_helpers_without_ui():
+    assert not core.should_generate_tip({"electricity_kwh": 0})
+    assert core.find_invalid_fields({"electricity_kwh": -1, "bus_km": 2}) == ["electricity_kwh"]
+    assert core.should_generate_tip({"bus_km": 2})
+
+
+def test_history_views_are_memoized_until_history_or_factors_change(tmp_path, monkeypatch):
+    path = str(tmp_path / "history.csv")
+    core.clear_view_cache()
+    today = dt.date(2025, 1, 3)
+    core.save_entry(today - dt.timedelta(days=1), {"bus_km": 10.0}, 1.2, path)
+    first = core.history_views(path)
+    # A rerun with nothing changed reuses the same frames
+    assert core.history_views(path) is first
+    assert core.history_kpis(today, path) == {"yesterday_total": 1.2, "streak": 0}
+
+    core.save_entry(today, {"bus_km": 5.0}, 0.6, path)
+    second = core.history_views(path)
+    assert second is not first
+    assert len(second["history"]) == 2
+    assert core.history_kpis(today, path)["streak"] == 2
+    assert second["deltas"]["Transport"][0] == pytest.approx(1.8)
+
+    monkeypatch.setitem(core.CO2_FACTORS, "bus_km", 1.0)
+    third = core.history_views(path)
+    assert third is not second
+    assert third["deltas"]["Transport"][0] == pytest.approx(15.0)
+    info = core.view_cache_info()
+    assert info["maxsize"] == core.DERIVED_VIEW_CACHE_SIZE
+    # Older versions of the same path are replaced, not kept alongside
+    assert info["currsize"] == 1
+
+
+def test_history_csv_is_built_on_demand_per_version(tmp_path):
+    path = str(tmp_path / "history.csv")
+    core.save_entry(dt.date(2025, 1, 2), {"bus_km": 10.0}, 1.2, path)
+    assert "csv" not in core.history_views(path)
+    first = core.history_csv(path)
+    assert first == core.load_history(path).to_csv(index=False)
+    assert core.history_csv(path) is first
+    core.save_entry(dt.date(2025, 1, 3), {"bus_km": 5.0}, 0.6, path)
+    assert core.history_csv(path).count("\n") == first.count("\n") + 1
+
+
+def test_compute_category_frame_matches_per_row_category_emissions():
+    import pandas as pd
+
+    rows = [
+        {"electricity_kwh": 3.0, "bus_km": 12.0, "meat_kg": 0.2},
+        {"electricity_kwh": None, "diesel_liter": 4.0, "vegan_kg": 1.0},
+    ]
+    frame = core.compute_category_frame(pd.DataFrame(rows))
+    assert list(frame.columns) == list(core.CATEGORY_MAP) + ["total_kg"]
+    for i, row in enumerate(rows):
+        expected = core.compute_category_emissions(row)
+        for cat, val in expected.items():
+            assert round(frame[cat].iloc[i], 2) == pytest.approx(val)
+        assert frame["total_kg"].iloc[i] == pytest.approx(frame[list(core.CATEGORY_MAP)].iloc[i].sum())
+
+
+def test_build_spark_data_uses_last_row_per_date_and_window():
+    import pandas as pd
+
+    rows = []
+    for day in range(1, 11):
+        rows.append({"date": f"2025-01-{day:02d}", "bus_km": float(day), "meat_kg": 0.0, "total_kg": 0.0})
+    # A later correction for Jan 10 wins over the first entry
+    rows.append({"date": "2025-01-10", "bus_km": 100.0, "meat_kg": 0.1, "total_kg": 0.0})
+    df = pd.DataFrame(rows)
+    df["date"] = pd.to_datetime(df["date"])
+
+    spark = core.build_spark_data(df, window_days=7)
+    assert spark["Transport"] == [round(d * 0.12, 2) for d in range(4, 10)] + [12.0]
+    assert spark["Meals"][-1] == 2.7
+    assert len(core.build_spark_data(df, window_days=30)["Energy"]) == 10
+    assert core.build_spark_data(df.iloc[0:0], window_days=7) == {}
+
+
+def test_iter_history_rows_streams_chunks_within_range(tmp_path):
+    path = str(tmp_path / "history.csv")
+    first = dt.date(2025, 1, 1)
+    for offset in range(10):
+        core.save_entry(first + dt.timedelta(days=offset), {"bus_km": float(offset)}, float(offset), path)
+    chunks = list(core.iter_history_rows(path, start=dt.date(2025, 1, 3), end=dt.date(2025, 1, 7), chunksize=2))
+    assert all(len(c) <= 2 for c in chunks)
+    days = [d.date() for c in chunks for d in c["date"]]
+    assert days == [first + dt.timedelta(days=i) for i in range(2, 7)]
+    assert list(core.iter_history_rows(str(tmp_path / "missing.csv"))) == []
+
+
+def test_chart_series_is_downsampled_filtered_and_cached(tmp_path):
+    import pandas as pd
+
+    path = str(tmp_path / "history.csv")
+    days = pd.date_range("2020-01-01", periods=2000, freq="D")
+    pd.DataFrame({"date": days, "bus_km": range(2000), "total_kg": [float(i % 50) for i in range(2000)]}).to_csv(path, index=False)
+    full = core.chart_series("total_kg", path, max_points=300)
+    assert 50 < len(full) <= 300
+    assert core.chart_series("total_kg", path, max_points=300) is full
+    recent = core.chart_series("Transport", path, start=dt.date(2025, 5, 1), max_points=300)
+    assert len(recent) == 53 and recent.index[0] == pd.Timestamp("2025-05-01")
+    core.save_entry(dt.date(2025, 6, 23), {"bus_km": 1.0}, 99.0, path)
+    assert core.chart_series("total_kg", path, max_points=300) is not full
+
+
+def test_history_page_counts_and_pages_within_range(tmp_path):
+    import pandas as pd
+
+    path = str(tmp_path / "history.csv")
+    days = pd.date_range("2024-01-01", periods=100, freq="D")
+    pd.DataFrame({"date": days, "bus_km": range(100), "total_kg": [float(i) for i in range(100)]}).to_csv(path, index=False)
+    assert core.count_history(path) == 100
+    assert core.count_history(path, dt.date(2024, 2, 1), dt.date(2024, 2, 29)) == 29
+    assert core.count_history(path, dt.date(2030, 1, 1)) == 0
+
+    first = core.history_page(path, page=1, page_size=30)
+    assert (first["total"], first["pages"], len(first["rows"])) == (100, 4, 30)
+    assert first["rows"]["date"].iloc[0] == dt.date(2024, 4, 9)  # newest first
+    last = core.history_page(path, page=99, page_size=30, columns=["total_kg"])
+    assert last["page"] == 4 and list(last["rows"].columns) == ["date", "total_kg"]
+    assert last["rows"]["total_kg"].tolist() == [9.0, 8.0, 7.0, 6.0, 5.0, 4.0, 3.0, 2.0, 1.0, 0.0]
+    feb = core.history_page(path, dt.date(2024, 2, 1), dt.date(2024, 2, 29), page=2, page_size=20, newest_first=False)
+    assert feb["rows"]["date"].tolist() == [dt.date(2024, 2, d) for d in range(21, 30)]
+    empty = core.history_page(path, dt.date(2030, 1, 1))
+    assert empty["total"] == 0 and empty["rows"].empty and empty["pages"] == 1
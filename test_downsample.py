@@ -0,0 +1,39 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import downsample
+
+
+def _series(n, seed=0):
+    values = np.random.default_rng(seed).normal(size=n).cumsum()
+    return pd.Series(values, index=pd.date_range("2020-01-01", periods=n, freq="D"))
+
+
+@pytest.mark.parametrize("method", ["lttb", "minmax"])
+def test_downsample_bounds_points_and_keeps_ends_and_spikes(method):
+    s = _series(5000)
+    s.iloc[1234] = 500.0  # one-day spike must survive
+    out = downsample.downsample(s, 200, method)
+    assert len(out) <= 200
+    assert out.index.is_monotonic_increasing
+    assert out.index[0] == s.index[0] and out.index[-1] == s.index[-1]
+    assert out.max() == 500.0
+    assert (out == s.loc[out.index]).all()
+
+
+def test_short_series_and_nans_pass_through():
+    s = _series(30)
+    s.iloc[3] = np.nan
+    assert downsample.downsample(s, 100).equals(s.dropna())
+    with pytest.raises(ValueError):
+        downsample.downsample(s, 10, "average")
+
+
+def test_lttb_matches_reference_on_small_input():
+    x = np.arange(10, dtype=float)
+    y = np.array([0, 1, 0, 5, 0, 1, 0, -4, 0, 1], dtype=float)
+    idx = downsample.lttb_indices(x, y, 5)
+    assert idx.tolist() == [0, 2, 3, 7, 9]  # buckets [1,3) [3,6) [6,9), worked by hand
+    assert downsample.points_for_width(1 / 3, width_px=1200, px_per_point=2) == 200
+    assert downsample.points_for_width(0.01) == downsample.MIN_POINTS
@@ -0,0 +1,41 @@
+import os
+import subprocess
+import sys
+
+import ai_tips
+from bench_import import check_forbidden, compare
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+def _modules_after_import(module: str) -> set:
+    code = f"import sys, {module}; print(' '.join(sorted(sys.modules)))"
+    env = dict(os.environ)
+    env.pop("OPENAI_API_KEY", None)
+    out = subprocess.run([sys.executable, "-c", code], cwd=HERE, env=env, capture_output=True, text=True, check=True)
+    return set(out.stdout.split())
+
+
+def test_importing_ai_tips_does_not_load_openai_or_dotenv():
+    loaded = _modules_after_import("ai_tips")
+    assert "openai" not in loaded
+    assert "dotenv" not in loaded
+
+
+def test_client_is_built_lazily_on_first_access(monkeypatch):
+    monkeypatch.setenv("OPENAI_API_KEY", "sk-lazy-test")
+    first = ai_tips.client
+    assert ai_tips.client is first
+    assert ai_tips.get_client() is first
+
+
+def test_compare_flags_regressions_beyond_threshold():
+    baseline = {"ai_tips": {"median_ms": 10.0}, "app": {"median_ms": 100.0}}
+    results = {"ai_tips": {"median_ms": 20.0}, "app": {"median_ms": 110.0}}
+    failures = compare(results, baseline, max_regression=0.25, slack_ms=2.0)
+    assert len(failures) == 1 and failures[0].startswith("ai_tips")
+
+
+def test_check_forbidden_reports_eager_heavy_imports():
+    results = {"ai_tips": {"imported": ["json", "openai"]}, "utils": {"imported": ["datetime"]}}
+    assert check_forbidden(results) == ["ai_tips: eagerly imports openai"]
@@ -0,0 +1,32 @@
+import os
+
+import pytest
+
+import core
+import loadtest_app
+
+
+def test_parse_mix():
+    assert loadtest_app.parse_mix("edit:4, save:1,pdf") == {"edit": 4.0, "save": 1.0, "pdf": 1.0}
+    with pytest.raises(ValueError):
+        loadtest_app.parse_mix("scroll:1")
+    with pytest.raises(ValueError):
+        loadtest_app.parse_mix("")
+
+
+def test_concurrent_sessions_report(monkeypatch):
+    pytest.importorskip("streamlit.testing.v1")
+    monkeypatch.delenv("OPENAI_API_KEY", raising=False)
+    monkeypatch.delenv("PERF_LOG_PATH", raising=False)
+    before = core.HISTORY_FILE
+    result = loadtest_app.run_app_load_test(sessions=2, actions=2, mix="save:1,browse:1,tab:1", history_days=60, latency="fixed:0")
+    # Sessions run in their own processes: nothing leaks into this one
+    assert core.HISTORY_FILE == before
+    assert "OPENAI_API_KEY" not in os.environ and "PERF_LOG_PATH" not in os.environ
+    assert result["session_failures"] == [] and result["script_errors"] == 0
+    assert result["reruns"] == 2 * 3  # page load + two actions per session
+    assert result["by_action"]["open"]["count"] == 2
+    assert set(result["by_action"]) <= {"open", "save", "browse", "tab"}
+    assert 0 < result["p50_s"] <= result["p99_s"] <= result["max_s"]
+    assert result["throughput_rps"] > 0 and result["cpu_s"] > 0
+    assert result["session_state_kb_mean"] > 0
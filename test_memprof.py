@@ -0,0 +1,38 @@
+import numpy as np
+import pandas as pd
+
+import memprof
+
+
+def test_sizes_for_session_state_and_history_frames():
+    df = pd.DataFrame({"date": pd.date_range("2025-01-01", periods=1000), "total_kg": np.arange(1000.0)})
+    shared = ["x" * 1000]
+    state = {"history_copy": df, "big_list": [shared, shared], "flag": True, "arr": np.zeros(500)}
+    rows = memprof.session_state_sizes(state)
+    assert [r["key"] for r in rows][:2] == ["history_copy", "arr"]
+    assert rows[0]["bytes"] >= df.memory_usage(deep=True).sum()
+    assert next(r for r in rows if r["key"] == "arr")["bytes"] >= 4000
+    # The shared string is counted once
+    assert next(r for r in rows if r["key"] == "big_list")["bytes"] < 2 * 1000
+
+    frames = memprof.frame_memory({"history": df, "series": {"Energy": df["total_kg"], "Empty": pd.Series(dtype=float)}, "csv": b"..."})
+    assert [f["name"] for f in frames] == ["history", "series.Energy", "series.Empty"]
+    assert frames[0]["rows"] == 1000 and frames[0]["columns"] == 2
+
+
+def test_rerun_report_tracks_growth_per_session():
+    memprof.start()
+    try:
+        first = memprof.rerun_report("session-a", {"k": 1})
+        assert first["growth"] == [] and first["traced_mb"] >= 0
+        keep = [bytearray(1024) for _ in range(2000)]  # ~2 MB allocated on this line
+        second = memprof.rerun_report("session-a", {"k": keep})
+        assert second["growth"] and "test_memprof.py:" in second["growth"][0]["site"]
+        assert second["growth"][0]["diff_kb"] > 1500
+        assert second["sessions"][0]["session"] == "session-"
+        assert second["session_state"][0]["bytes"] > 2 * 1024 * 1000
+    finally:
+        memprof.stop()
+    assert not memprof.is_enabled()
+    assert "traced_mb" not in memprof.rerun_report("session-a", {})
+
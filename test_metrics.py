@@ -0,0 +1,80 @@
+import http.client
+import os
+import re
+import subprocess
+import sys
+
+import metrics
+
+
+def test_text_exposition_for_counters_and_histograms():
+    reg = metrics.Registry()
+    tips = reg.counter("tips_total", "Tips by source", ("source",))
+    tips.labels("gpt").inc()
+    tips.labels(source="gpt").inc(2)
+    tips.labels("fallback").inc()
+    load = reg.histogram("load_seconds", "Load time", buckets=(0.1, 1.0))
+    for v in (0.05, 0.1, 0.5, 3.0):
+        load.observe(v)
+    assert reg.counter("tips_total", "Tips by source", ("source",)) is tips
+
+    text = metrics.render_text(reg.snapshot())
+    assert "# TYPE tips_total counter" in text
+    assert 'tips_total{source="gpt"} 3' in text and 'tips_total{source="fallback"} 1' in text
+    assert 'load_seconds_bucket{le="0.1"} 2' in text  # le is inclusive
+    assert 'load_seconds_bucket{le="1"} 3' in text and 'load_seconds_bucket{le="+Inf"} 4' in text
+    assert "load_seconds_sum 3.65" in text and "load_seconds_count 4" in text
+
+
+def test_snapshots_from_several_processes_are_summed(tmp_path):
+    code = (
+        "import metrics\n"
+        "metrics.HISTORY_SAVES.inc(2)\n"
+        "metrics.TIP_REQUESTS.labels('gpt').inc()\n"
+        "metrics.HISTORY_LOAD_SECONDS.observe(0.2)\n"
+        "metrics.write_snapshot()\n"
+    )
+    env = dict(os.environ, METRICS_MULTIPROC_DIR=str(tmp_path))
+    for _ in range(2):
+        subprocess.run([sys.executable, "-c", code], cwd=os.path.dirname(os.path.abspath(metrics.__file__)), env=env, check=True)
+    assert len(list(tmp_path.glob("metrics_*.json"))) == 2
+
+    merged = metrics.collect(str(tmp_path), registry=None)
+    text = metrics.render_text(merged)
+    assert "history_saves_total 4" in text
+    assert 'tip_requests_total{source="gpt"} 2' in text
+    assert "history_load_seconds_count 2" in text
+
+    server = metrics.start_http_server(0, directory=str(tmp_path), registry=None)
+    try:
+        conn = http.client.HTTPConnection("127.0.0.1", server.server_port, timeout=5)
+        conn.request("GET", "/metrics")
+        resp = conn.getresponse()
+        assert resp.status == 200 and resp.getheader("Content-Type").startswith("text/plain")
+        assert "history_saves_total 4" in resp.read().decode()
+    finally:
+        server.shutdown()
+
+
+def test_exited_snapshots_are_folded_and_pids_never_collide(tmp_path):
+    code = "import metrics\nmetrics.HISTORY_SAVES.inc(3)\nprint(metrics.write_snapshot())\n"
+    env = dict(os.environ, METRICS_MULTIPROC_DIR=str(tmp_path))
+    cwd = os.path.dirname(os.path.abspath(metrics.__file__))
+
+    def child():
+        out = subprocess.run([sys.executable, "-c", code], cwd=cwd, env=env, check=True, capture_output=True, text=True)
+        return os.path.basename(out.stdout.strip())
+
+    first, second = child(), child()
+    assert re.fullmatch(r"metrics_\d+_[0-9a-f]{12}\.json", first) and first != second
+    # A snapshot left by a later process that reused the first pid does not replace it
+    pid = first.split("_")[1]
+    reused = tmp_path / f"metrics_{pid}_{'0' * 12}.json"
+    reused.write_text((tmp_path / first).read_text())
+
+    assert "history_saves_total 9" in metrics.render_text(metrics.collect(str(tmp_path), registry=None))
+    # Every process is gone: their snapshots now live in the exited aggregate only
+    assert sorted(p.name for p in tmp_path.glob("metrics_*.json")) == [metrics.EXITED_SNAPSHOT]
+    assert "history_saves_total 9" in metrics.render_text(metrics.collect(str(tmp_path), registry=None))
+    child()
+    assert "history_saves_total 12" in metrics.render_text(metrics.collect(str(tmp_path), registry=None))
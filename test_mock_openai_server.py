@@ -0,0 +1,90 @@
+import os
+
+import pytest
+from openai import OpenAI
+
+import ai_tips
+from loadtest_tips import percentile, run_load_test
+from mock_openai_server import MockOpenAIServer, parse_latency
+from rate_limiter import RateLimiter
+
+
+@pytest.fixture
+def isolated_tips(monkeypatch):
+    """Fresh limiter/cache and no real sleeping, so 429s don't leak across tests."""
+    monkeypatch.setenv("OPENAI_API_KEY", "mock")
+    monkeypatch.setattr(ai_tips, "get_rate_limiter", lambda: RateLimiter(rpm=100000, tpm=10**9))
+    monkeypatch.setattr(ai_tips.time, "sleep", lambda s: None, raising=True)
+    ai_tips._generate_eco_tip_cached.cache_clear()
+    ai_tips.reset_tip_stats()
+    yield
+    ai_tips.set_client_provider(None)
+
+
+def _use(server):
+    client = OpenAI(api_key="mock", base_url=server.base_url, max_retries=0)
+    ai_tips.set_client_provider(lambda: client)
+
+
+def test_parse_latency_specs():
+    assert parse_latency("fixed:0.25")(None) == 0.25
+    import random
+    rng = random.Random(1)
+    v = parse_latency("uniform:0.1:0.2")(rng)
+    assert 0.1 <= v <= 0.2
+    with pytest.raises(ValueError):
+        parse_latency("bogus:1")
+
+
+def test_generate_tip_against_mock_server(isolated_tips):
+    with MockOpenAIServer() as server:
+        _use(server)
+        tip = ai_tips.generate_tip({"bus_km": 10}, 1.2)
+        assert tip.startswith("Mock tip")
+        assert ai_tips.LAST_TIP_SOURCE == "gpt"
+        assert server.counts["ok"] == 1
+
+
+def test_batch_tips_against_mock_server(isolated_tips):
+    profiles = [({"meat_kg": i / 10}, 2.7 * i) for i in range(1, 8)]
+    with MockOpenAIServer() as server:
+        _use(server)
+        tips = ai_tips.generate_eco_tips_batch(profiles, chunk_size=5)
+        assert server.counts["requests"] == 2
+    assert [t.split(":")[0] for t in tips] == [f"Mock tip {i}" for i in (1, 2, 3, 4, 5, 1, 2)]
+
+
+def test_429_burst_falls_back_to_local_tip(isolated_tips):
+    with MockOpenAIServer(burst_every_s=60, burst_len_s=60) as server:
+        _use(server)
+        user_data = {"petrol_liter": 8}
+        tip = ai_tips.generate_tip(user_data, 1.9)
+        assert server.counts["rate_limited"] == 3
+    assert tip == ai_tips.clean_tip(ai_tips.local_tip(user_data, 1.9))
+    assert ai_tips.get_tip_stats()["fallback"] == 1
+
+
+def test_load_test_reports_percentiles_and_ratios(isolated_tips):
+    with MockOpenAIServer(latency="fixed:0.005") as server:
+        result = run_load_test(server.base_url, requests=40, concurrency=8, profiles=4)
+    assert result["requests"] == 40
+    assert 0 <= result["p50_s"] <= result["p95_s"] <= result["p99_s"]
+    assert result["max_s"] >= 0.005
+    assert result["fallback_rate"] == 0.0
+    # 4 distinct profiles -> most lookups are cache hits
+    assert result["cache_hit_ratio"] > 0.5
+
+
+def test_load_test_restores_api_key(isolated_tips, monkeypatch):
+    monkeypatch.delenv("OPENAI_API_KEY")
+    with MockOpenAIServer(latency="fixed:0") as server:
+        result = run_load_test(server.base_url, requests=4, concurrency=2, profiles=2)
+    assert result["fallback_rate"] == 0.0
+    assert "OPENAI_API_KEY" not in os.environ
+
+
+def test_percentile_nearest_rank():
+    values = list(range(1, 101))
+    assert percentile(values, 50) == 50
+    assert percentile(values, 99) == 99
+    assert percentile([], 95) == 0.0
@@ -0,0 +1,88 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+import pdf_report
+
+pytest.importorskip("reportlab")
+
+ARGS = dict(
+    summary_text="Energy: 5 kWh", tip_text="Take the bus.", emissions=3.2, date_str="2025-01-02",
+    source_label="Fallback", per_activity={"bus_km": 1.2}, per_category={"Energy": 2.0, "Transport": 1.2, "Meals": 0.0},
+    kpis={"today_total": "3.20 kg CO₂"}, spark_data={"Energy": [1.0, 2.0, 1.5]},
+)
+
+
+def test_cache_key_covers_data_branding_and_logo():
+    base = pdf_report.pdf_cache_key(**ARGS)
+    assert base == pdf_report.pdf_cache_key(**dict(ARGS))
+    assert base != pdf_report.pdf_cache_key(**ARGS, primary_color="#ff0000")
+    assert base != pdf_report.pdf_cache_key(**ARGS, logo_bytes=b"\x89PNG...")
+
+
+def test_render_async_caches_finished_pdf_and_chart_images():
+    pdf_report._pie_png.cache_clear()
+    with ThreadPoolExecutor(max_workers=1) as pool:
+        pdf, err = pdf_report.render_pdf_async(pool=pool, **ARGS).result(timeout=60)
+        assert err is None and pdf.startswith(b"%PDF")
+        again = pdf_report.render_pdf_async(pool=pool, **ARGS)
+        # Served from the PDF cache without touching the pool
+        assert again.done() and again.result()[0] == pdf
+        # A different tip re-renders the PDF but reuses the pie chart PNG
+        pdf_report.render_pdf_async(pool=pool, **dict(ARGS, tip_text="Cycle.")).result(timeout=60)
+    info = pdf_report._pie_png.cache_info()
+    assert info.misses == 1 and info.hits == 1
+
+
+def test_render_async_with_broken_pool_returns_error_and_resets_pool(monkeypatch):
+    from concurrent.futures import ProcessPoolExecutor
+
+    broken = ProcessPoolExecutor(max_workers=1)
+    broken._broken = "a child process terminated abruptly"  # as after a worker crash
+    monkeypatch.setattr(pdf_report, "_pool", broken)
+    fut = pdf_report.render_pdf_async(**dict(ARGS, tip_text="Broken pool."))
+    # Submit failed synchronously: the caller still gets a finished Future, not an exception
+    assert fut.done()
+    pdf, err = fut.result()
+    assert pdf is None and err.startswith("PDF worker failed:")
+    assert pdf_report._pool is None
+
+
+def test_history_report_pages_daily_rows_and_reuses_charts(tmp_path):
+    import datetime as dt
+
+    import core
+
+    path = str(tmp_path / "history.csv")
+    first = dt.date(2024, 1, 1)
+    for offset in range(70):
+        core.save_entry(first + dt.timedelta(days=offset), {"electricity_kwh": 1.0 + offset % 5}, 0.5 + offset % 5, path)
+    pdf_report._trend_png.cache_clear()
+    pdf, err = pdf_report.build_history_report_pdf(path, rows_per_page=30, chunksize=16)
+    assert err is None and pdf.startswith(b"%PDF")
+    # Overview page + ceil(70 / 30) daily pages
+    assert b"/Count 4" in pdf
+    out = tmp_path / "report.pdf"
+    assert pdf_report.build_history_report_pdf(path, out=str(out), chunksize=16) == (None, None)
+    assert out.read_bytes().startswith(b"%PDF")
+    assert pdf_report._trend_png.cache_info().hits >= 1
+    empty = pdf_report.build_history_report_pdf(path, start=dt.date(2030, 1, 1))
+    assert empty[0] is None and "No history entries" in empty[1]
+
+
+def test_history_report_counts_distinct_days(tmp_path):
+    import pandas as pd
+
+    # Three entries on Jan 1 (split across chunks), one on Jan 2 and one on Feb 1
+    path = tmp_path / "history.csv"
+    pd.DataFrame({
+        "date": ["2024-01-01", "2024-01-01", "2024-01-01", "2024-01-02", "2024-02-01"],
+        "electricity_kwh": [1.0, 2.0, 3.0, 4.0, 5.0],
+        "total_kg": [1.0, 2.0, 3.0, 4.0, 5.0],
+    }).to_csv(path, index=False)
+    months, first, last = pdf_report._monthly_sums(str(path), None, None, chunksize=2)
+    assert {m: int(v["days"]) for m, v in months.items()} == {"2024-01": 2, "2024-02": 1}
+    # The first row per date wins, also for the Jan 1 row in the second chunk
+    assert months["2024-01"]["total"] == 5.0
+    assert months["2024-01"]["Energy"] == pytest.approx(months["2024-02"]["Energy"])
+    assert (str(first), str(last)) == ("2024-01-01", "2024-02-01")
@@ -0,0 +1,71 @@
+import json
+import os
+import time
+
+import perf_log
+
+
+def test_events_are_typed_and_written_in_background(tmp_path):
+    path = str(tmp_path / "perf.jsonl")
+    logger = perf_log.PerfLogger(path, max_bytes=0, flush_interval_s=0.05)
+    assert logger.log(perf_log.EVENT_TIP, duration_s=0.25, emissions_kg="3.5", cache="miss", tip_source="fallback")
+    assert logger.log(perf_log.EVENT_NO_INPUTS, emissions_kg=0)
+    assert logger.flush()
+    logger.close()
+    tip, warning = perf_log.read_events(path)
+    assert tip["event"] == "tip" and tip["duration_s"] == 0.25 and tip["emissions_kg"] == 3.5
+    assert tip["cache"] == "miss" and tip["tip_source"] == "fallback"
+    # Warnings keep the numeric columns numeric (no "warning:..." strings in duration_s)
+    assert warning["event"] == "warning.no_inputs" and warning["duration_s"] is None
+    assert logger.stats()["written"] == 2
+    assert not logger.log(perf_log.EVENT_TIP)  # closed
+
+
+def test_rotates_by_size_and_keeps_backups(tmp_path):
+    path = str(tmp_path / "perf.jsonl")
+    logger = perf_log.PerfLogger(path, max_bytes=200, backups=2, flush_interval_s=0.05)
+    for i in range(12):
+        logger.log(perf_log.EVENT_TIP, duration_s=i)
+        logger.flush()
+    logger.close()
+    assert logger.stats()["rotations"] >= 2
+    assert os.path.exists(path + ".1") and os.path.exists(path + ".2")
+    assert not os.path.exists(path + ".3")
+    kept = sum(len(perf_log.read_events(p)) for p in (path, path + ".1", path + ".2"))
+    assert 0 < kept < 12
+
+
+def test_full_queue_drops_instead_of_blocking(tmp_path):
+    logger = perf_log.PerfLogger(str(tmp_path / "perf.jsonl"), max_queue=1, flush_interval_s=0.05)
+    results = [logger.log(perf_log.EVENT_TIP) for _ in range(500)]
+    logger.close()
+    stats = logger.stats()
+    assert stats["logged"] + stats["dropped"] == 500 and stats["dropped"] == results.count(False)
+
+
+def test_rotation_age_counts_from_first_record_not_last_write(tmp_path):
+    path = tmp_path / "perf.jsonl"
+    # Started 100s ago but appended to just now (fresh mtime)
+    old = perf_log.PerfEvent.make(perf_log.EVENT_TIP)._replace(ts=time.time() - 100)
+    path.write_text(json.dumps(old._asdict()) + "\n" + json.dumps(perf_log.PerfEvent.make(perf_log.EVENT_TIP)._asdict()) + "\n")
+    logger = perf_log.PerfLogger(str(path), max_bytes=0, rotate_every_s=50, flush_interval_s=0.05)
+    logger.log(perf_log.EVENT_TIP, duration_s=1.0)
+    logger.close()
+    assert logger.stats()["rotations"] == 1
+    assert len(perf_log.read_events(str(path) + ".1")) == 2
+    assert [ev["duration_s"] for ev in perf_log.read_events(str(path))] == [1.0]
+
+
+def test_log_path_is_read_from_env_at_call_time(tmp_path, monkeypatch):
+    first, second = str(tmp_path / "a.jsonl"), str(tmp_path / "b.jsonl")
+    monkeypatch.setenv("PERF_LOG_PATH", first)
+    logger = perf_log.get_perf_logger()
+    assert logger.path == first
+    default = perf_log.PerfLogger(flush_interval_s=0.05)
+    assert default.path == first
+    default.close()
+    logger.log(perf_log.EVENT_TIP, duration_s=0.1)
+    monkeypatch.setenv("PERF_LOG_PATH", second)
+    # The old logger is flushed and replaced by one for the new path
+    assert perf_log.get_perf_logger().path == second
+    assert len(perf_log.read_events(first)) == 1 and perf_log.read_events() == []
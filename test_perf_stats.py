@@ -0,0 +1,123 @@
+import json
+import os
+import random
+
+import pytest
+
+import perf_log
+import perf_stats
+
+
+def _write(path, events, mode="a"):
+    with open(path, mode, encoding="utf-8") as f:
+        for ev in events:
+            f.write(json.dumps(ev) + "\n")
+
+
+def _tip(ts, duration, source="fallback", cache="miss"):
+    return {"event": "tip", "ts": ts, "duration_s": duration, "emissions_kg": 1.0, "cache": cache, "tip_source": source}
+
+
+def test_sketch_quantiles_within_relative_error():
+    rng = random.Random(1)
+    values = sorted(rng.lognormvariate(-1.0, 1.0) for _ in range(20000))
+    sketch = perf_stats.LatencySketch(rel_err=0.01)
+    sketch.add_many(values[:10000])
+    for v in values[10000:]:
+        sketch.add(v)
+    for q in (0.5, 0.9, 0.99):
+        exact = values[int(q * (len(values) - 1))]
+        assert sketch.quantile(q) == pytest.approx(exact, rel=0.03)
+    assert sketch.count == 20000 and sketch.max == values[-1]
+
+
+def test_refresh_reads_only_new_lines_and_survives_rotation(tmp_path):
+    path = str(tmp_path / "perf.jsonl")
+    _write(path, [_tip(600 + i, 0.1 * (i + 1), cache="session" if i % 2 else "miss") for i in range(10)])
+    _write(path, [{"event": "warning.no_inputs", "ts": 610, "duration_s": None, "emissions_kg": 0.0, "cache": None, "tip_source": None}])
+    agg = perf_stats.PerfLogAggregator(path, bucket_s=300, top_n=3)
+    assert agg.refresh() == 11
+    assert agg.refresh() == 0
+    with open(path, "a", encoding="utf-8") as f:
+        f.write('{"event": "tip", "ts": 9')  # partial line: not consumed yet
+    assert agg.refresh() == 0
+    with open(path, "a", encoding="utf-8") as f:
+        f.write('00, "duration_s": 5.0, "tip_source": "gpt", "cache": "prefetch"}\nnot json\n')
+    assert agg.refresh() == 1 and agg.bad_lines == 1
+
+    # Rotation: lines appended to the old file before the rename are not lost
+    _write(path, [_tip(901, 0.2)])
+    os.replace(path, path + ".1")
+    _write(path, [_tip(1300, 0.3, source="gpt")])
+    assert agg.refresh() == 2
+
+    summary = agg.summary()
+    assert summary["tips"] == 13 and summary["events"]["warning.no_inputs"] == 1
+    assert summary["tip_sources"] == {"fallback": 11, "gpt": 2}
+    assert summary["cache"] == {"miss": 7, "session": 5, "prefetch": 1}
+    assert [b["ts"] for b in agg.timeline()] == [600, 900, 1200]
+    assert [ev["duration_s"] for ev in agg.slowest()] == [5.0, 1.0, 0.9]
+
+
+def test_fresh_aggregator_reads_backups_written_by_perf_logger(tmp_path):
+    path = str(tmp_path / "perf.jsonl")
+    logger = perf_log.PerfLogger(path, max_bytes=300, backups=3, flush_interval_s=0.05)
+    for i in range(6):
+        logger.log(perf_log.EVENT_TIP, duration_s=0.5, tip_source="gpt")
+        logger.flush()
+    logger.close()
+    agg = perf_stats.PerfLogAggregator(path, backups=3)
+    assert agg.refresh() == 6
+    assert agg.summary()["p50_s"] == pytest.approx(0.5, rel=0.02)
+
+
+def test_refresh_reads_files_rotated_more_than_once_in_between(tmp_path):
+    path = str(tmp_path / "perf.jsonl")
+    _write(path, [_tip(100, 0.1)])
+    agg = perf_stats.PerfLogAggregator(path, backups=3)
+    assert agg.refresh() == 1
+    _write(path, [_tip(101, 0.2)])
+    os.replace(path, path + ".1")
+    _write(path, [_tip(102, 0.3), _tip(103, 0.4)])
+    os.replace(path + ".1", path + ".2")
+    os.replace(path, path + ".1")
+    _write(path, [_tip(104, 0.5)])
+    # Rest of the first file, all of the intermediate one, then the live file
+    assert agg.refresh() == 4
+    assert agg.summary()["tips"] == 5
+
+
+def test_timeline_keeps_only_the_newest_buckets(tmp_path):
+    path = str(tmp_path / "perf.jsonl")
+    _write(path, [_tip(300 * i, 0.1) for i in range(10)])
+    agg = perf_stats.PerfLogAggregator(path, bucket_s=300, max_buckets=4)
+    agg.refresh()
+    _write(path, [_tip(300 * 10, 0.2)])
+    agg.refresh()
+    assert [b["ts"] for b in agg.timeline()] == [2100, 2400, 2700, 3000]
+    # Overall aggregates still cover every event
+    assert agg.summary()["tips"] == 11
+
+
+def test_perf_tab_reads_log_on_demand_without_starting_logger(tmp_path, monkeypatch):
+    testing = pytest.importorskip("streamlit.testing.v1")
+    import core
+
+    path = str(tmp_path / "perf.jsonl")
+    _write(path, [_tip(600, 0.2)])
+    monkeypatch.setenv("PERF_LOG_PATH", path)
+    monkeypatch.setattr(perf_log, "_logger", None)
+    monkeypatch.setattr(core, "HISTORY_FILE", str(tmp_path / "history.csv"))
+    app_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "app.py")
+    at = testing.AppTest.from_file(app_path, default_timeout=60).run()
+    agg = perf_stats.get_perf_aggregator(path)
+    assert agg.summary()["tips"] == 1
+    # Logging is off, so the tab never creates the logger or its writer thread
+    assert perf_log._logger is None
+
+    _write(path, [_tip(610, 0.3)])
+    at.run()
+    assert agg.summary()["tips"] == 1  # plain reruns do not re-read the log
+    at.button(key="perf_refresh").click().run()
+    assert not at.exception
+    assert agg.summary()["tips"] == 2
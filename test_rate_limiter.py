@@ -0,0 +1,135 @@
+import os
+import threading
+import time
+
+import pytest
+
+import ai_tips
+from rate_limiter import PRIORITY_BACKGROUND, PRIORITY_BATCH, PRIORITY_INTERACTIVE, RateLimiter, TokenBucket
+
+
+def test_token_bucket_refills_up_to_capacity():
+    bucket = TokenBucket(capacity=10, refill_per_s=5, now=0.0)
+    bucket.consume(10)
+    assert bucket.time_until(5, now=0.0) == pytest.approx(1.0)
+    bucket.refill(now=100.0)
+    assert bucket.tokens == 10
+
+
+def test_limiter_serves_burst_then_degrades_at_deadline():
+    limiter = RateLimiter(rpm=3, tpm=100000)
+    assert all(limiter.acquire(10, deadline_s=0) for _ in range(3))
+    # Bucket is empty and refills at 3/min, far beyond a 50 ms deadline
+    assert limiter.acquire(10, deadline_s=0.05) is False
+    stats = limiter.stats()
+    assert stats["granted"] == 3
+    assert stats["degraded"] == 1
+
+
+def test_limiter_tpm_bucket_limits_large_requests():
+    limiter = RateLimiter(rpm=1000, tpm=1000)
+    assert limiter.acquire(900, deadline_s=0)
+    assert limiter.acquire(900, deadline_s=0.01) is False
+
+
+def test_interactive_requests_preempt_batch_waiters():
+    limiter = RateLimiter(rpm=600, tpm=1_000_000)  # refills one request per 0.1 s
+    while limiter.acquire(1, deadline_s=0):
+        pass
+    order = []
+
+    def worker(name, priority):
+        if limiter.acquire(1, priority=priority, deadline_s=5):
+            order.append(name)
+
+    batch = [threading.Thread(target=worker, args=(f"batch{i}", PRIORITY_BATCH)) for i in range(2)]
+    for t in batch:
+        t.start()
+    time.sleep(0.02)
+    interactive = threading.Thread(target=worker, args=("interactive", PRIORITY_INTERACTIVE))
+    interactive.start()
+    for t in batch + [interactive]:
+        t.join(timeout=5)
+    assert order[0] == "interactive"
+    assert sorted(order[1:]) == ["batch0", "batch1"]
+
+
+def test_penalize_pauses_all_callers():
+    limiter = RateLimiter(rpm=1000, tpm=1_000_000)
+    limiter.penalize(5)
+    assert limiter.acquire(1, deadline_s=0.05) is False
+    assert limiter.stats()["cooldown_s"] > 4
+
+
+def test_generate_eco_tip_degrades_to_local_tip_when_over_budget(monkeypatch):
+    monkeypatch.setenv("OPENAI_API_KEY", "sk-test-key")
+    ai_tips._generate_eco_tip_cached.cache_clear()
+    limiter = RateLimiter(rpm=1, tpm=100000)
+    limiter.acquire(1, deadline_s=0)
+    monkeypatch.setattr(ai_tips, "get_rate_limiter", lambda: limiter)
+
+    calls = {"n": 0}
+
+    def fake_create(**kwargs):
+        calls["n"] += 1
+        raise AssertionError("should not reach the API")
+
+    monkeypatch.setattr(ai_tips.client.chat.completions, "create", fake_create, raising=True)
+
+    user_data = {"petrol_liter": 5.0, "bus_km": 2.0}
+    tip = ai_tips.generate_eco_tip(user_data, emissions=12.0, priority=PRIORITY_BATCH, deadline_s=0.01)
+    assert calls["n"] == 0
+    assert tip == ai_tips.clean_tip(ai_tips.local_tip(user_data, 12.0))
+    assert ai_tips.LAST_TIP_SOURCE == "fallback"
+    # The degraded call must not be cached as a permanent fallback
+    assert ai_tips._generate_eco_tip_cached.cache_info().currsize == 0
+
+
+def test_dashboard_tip_runs_at_interactive_priority(tmp_path, monkeypatch):
+    testing = pytest.importorskip("streamlit.testing.v1")
+    import core
+
+    seen = []
+
+    def fake_generate_eco_tip(user_data, emissions, priority=PRIORITY_INTERACTIVE, deadline_s=None):
+        seen.append(priority)
+        return "Take the bus today."
+
+    monkeypatch.setattr(ai_tips, "generate_eco_tip", fake_generate_eco_tip)
+    monkeypatch.setattr(core, "HISTORY_FILE", str(tmp_path / "history.csv"))
+    app_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "app.py")
+    at = testing.AppTest.from_file(app_path, default_timeout=60).run()
+    at.run()  # the rerun reattaches to the session's future
+    assert not at.exception
+    assert any("Take the bus today." in s.value for s in at.success)
+    # Form mode never hands the dashboard a background prefetch
+    assert seen == [PRIORITY_INTERACTIVE]
+
+
+def test_live_tip_failure_is_not_resubmitted_on_rerun(tmp_path, monkeypatch):
+    testing = pytest.importorskip("streamlit.testing.v1")
+    import core
+
+    seen = []
+
+    def failing_generate_eco_tip(user_data, emissions, priority=PRIORITY_INTERACTIVE, deadline_s=None):
+        seen.append(priority)
+        raise RuntimeError("model unavailable")
+
+    monkeypatch.setattr(ai_tips, "generate_eco_tip", failing_generate_eco_tip)
+    monkeypatch.setattr(core, "HISTORY_FILE", str(tmp_path / "history.csv"))
+    app_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "app.py")
+    at = testing.AppTest.from_file(app_path, default_timeout=60)
+    at.session_state["tip_prefetch"] = True
+    at.session_state["tip_prefetch_debounce"] = 0.01
+    at.run()
+    deadline = time.time() + 5
+    while not seen and time.time() < deadline:
+        time.sleep(0.05)
+    time.sleep(0.2)
+    for _ in range(3):
+        at.run()
+    assert not at.exception
+    assert any("Tip generation failed" in w.value for w in at.warning)
+    # The failed prefetch is remembered instead of retried on every rerun
+    assert seen == [PRIORITY_BACKGROUND]
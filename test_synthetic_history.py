@@ -0,0 +1,62 @@
+import sqlite3
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import core
+import synthetic_history as sh
+from co2_engine import calculate_co2_frame
+
+
+def _frame(**kwargs):
+    return pd.concat(list(sh.iter_synthetic_history(**kwargs)), ignore_index=True)
+
+
+def test_seeded_output_is_reproducible_sorted_and_has_gaps():
+    a = _frame(users=20, days=200, seed=3, chunk_rows=500)
+    b = _frame(users=20, days=200, seed=3, chunk_rows=500)
+    pd.testing.assert_frame_equal(a, b)
+    assert not a.equals(_frame(users=20, days=200, seed=4, chunk_rows=500))
+    assert list(a.columns) == sh.history_columns(20)
+    assert a["date"].is_monotonic_increasing
+    assert not a.duplicated(["date", "user_id"]).any()
+    # Gaps: every user misses days after joining, so streaks break
+    spans = a.groupby("user_id")["date"].agg(lambda d: (d.max() - d.min()).days + 1 - len(d))
+    assert (spans > 0).mean() > 0.8
+    totals = calculate_co2_frame(a)["total_kg"]
+    np.testing.assert_allclose(a["total_kg"], totals, atol=0.02)
+
+
+def test_seasonality_and_legacy_schema():
+    df = _frame(users=30, start="2021-01-01", days=365, seed=1, legacy_schema=True)
+    assert list(df.columns) == sh.history_columns(30, legacy_schema=True)
+    assert {"electricity_kWh", "electricity_kwh"} <= set(df.columns)
+    month = df["date"].dt.month
+    assert df.loc[month == 1, "natural_gas_m3"].mean() > 2 * df.loc[month == 7, "natural_gas_m3"].mean()
+    old = df["date"] < pd.Timestamp("2021-01-01") + pd.Timedelta(days=182)
+    assert df.loc[old, "electricity_kwh"].isna().all() and df.loc[old, "electricity_kWh"].gt(0).any()
+    assert df.loc[~old, "electricity_kwh"].notna().all()
+    # Legacy + new columns still add up to the stored total
+    np.testing.assert_allclose(df["total_kg"], calculate_co2_frame(df)["total_kg"], atol=0.02)
+
+
+@pytest.mark.parametrize("ext", [".csv", ".sqlite", ".parquet"])
+def test_writers_round_trip(tmp_path, ext):
+    if ext == ".parquet":
+        pytest.importorskip("pyarrow")
+    path = str(tmp_path / f"history{ext}")
+    kwargs = dict(users=5, days=90, seed=2, chunk_rows=100)
+    rows = sh.write_history(path, **kwargs)
+    expected = _frame(**kwargs)
+    assert rows == len(expected)
+    if ext == ".csv":
+        got = core.load_history(path)
+    elif ext == ".sqlite":
+        with sqlite3.connect(path) as con:
+            got = pd.read_sql("SELECT * FROM history", con, parse_dates=["date"])
+    else:
+        got = pd.read_parquet(path)
+    assert len(got) == rows
+    assert pd.to_datetime(got["date"]).dt.date.tolist() == expected["date"].dt.date.tolist()
+    np.testing.assert_allclose(got["total_kg"].to_numpy(float), expected["total_kg"].to_numpy())
@@ -0,0 +1,162 @@
+import threading
+import time
+
+import pytest
+
+from tip_executor import (
+    QueueFullError,
+    SessionFutures,
+    TipExecutor,
+    TipPrefetcher,
+    get_executor,
+    input_hash,
+)
+
+
+def test_input_hash_is_order_independent_and_numeric_stable():
+    a = input_hash({"electricity_kwh": 5, "bus_km": 10.0}, 12.0)
+    b = input_hash({"bus_km": 10, "electricity_kwh": 5.0}, 12)
+    c = input_hash({"bus_km": 11, "electricity_kwh": 5.0}, 12)
+    assert a == b
+    assert a != c
+
+
+def test_get_executor_is_process_wide_singleton():
+    assert get_executor() is get_executor()
+
+
+def test_queue_limit_rejects_and_reports_metrics():
+    ex = TipExecutor(max_workers=1, max_queue=2)
+    gate = threading.Event()
+    try:
+        f1 = ex.submit(gate.wait)
+        f2 = ex.submit(gate.wait)
+        with pytest.raises(QueueFullError):
+            ex.submit(gate.wait)
+        stats = ex.stats()
+        assert stats["rejected"] == 1
+        assert stats["queue_depth"] + stats["running"] == 2
+        gate.set()
+        f1.result(timeout=2)
+        f2.result(timeout=2)
+        stats = ex.stats()
+        assert stats["completed"] == 2
+        assert stats["queue_depth"] == 0
+        assert stats["max_wait_s"] >= 0.0
+        # Completion time is stamped on the future itself, not read at render time
+        assert f1.elapsed_s > 0.0 and f2.elapsed_s > 0.0
+    finally:
+        gate.set()
+        ex.shutdown()
+
+
+def test_session_futures_reattach_instead_of_resubmitting():
+    ex = TipExecutor(max_workers=1, max_queue=4)
+    calls = {"n": 0}
+
+    def job(x):
+        calls["n"] += 1
+        return x * 2
+
+    try:
+        futs = SessionFutures()
+        key = input_hash({"bus_km": 3}, 0.36)
+        f1 = futs.get_or_submit(key, job, 21, executor=ex)
+        assert f1.result(timeout=2) == 42
+        f2 = futs.get_or_submit(key, job, 21, executor=ex)
+        assert f2 is f1
+        assert calls["n"] == 1
+    finally:
+        ex.shutdown()
+
+
+def test_session_futures_drop_failed_and_evict_oldest():
+    ex = TipExecutor(max_workers=1, max_queue=4)
+
+    def boom():
+        raise RuntimeError("fail")
+
+    try:
+        futs = SessionFutures(max_entries=2)
+        f = futs.get_or_submit("bad", boom, executor=ex)
+        with pytest.raises(RuntimeError):
+            f.result(timeout=2)
+        # Failed futures are not reattached to
+        assert futs.get("bad") is None
+
+        for key in ("a", "b", "c"):
+            futs.get_or_submit(key, lambda: key, executor=ex).result(timeout=2)
+        assert len(futs) == 2
+        assert "a" not in futs
+    finally:
+        ex.shutdown()
+
+
+def test_prefetcher_debounces_and_supersedes_older_inputs():
+    ex = TipExecutor(max_workers=1, max_queue=4)
+    calls = []
+    try:
+        pf = TipPrefetcher(executor=ex)
+        pf.schedule("k1", calls.append, "k1", delay=0.2)
+        pf.schedule("k2", calls.append, "k2", delay=0.05)
+        assert pf.is_pending("k2")
+        deadline = time.time() + 2
+        while pf.claim("k2") is None and time.time() < deadline:
+            time.sleep(0.01)
+        pf.claim("k2").result(timeout=2)
+        time.sleep(0.3)
+        # Only the settled inputs were generated
+        assert calls == ["k2"]
+        assert pf.claim("k1") is None
+    finally:
+        ex.shutdown()
+
+
+def test_prefetcher_defers_while_executor_busy_and_take_cancels_timer():
+    ex = TipExecutor(max_workers=1, max_queue=4)
+    gate = threading.Event()
+    calls = []
+    try:
+        blocker = ex.submit(gate.wait)
+        pf = TipPrefetcher(executor=ex, max_deferrals=5)
+        pf.schedule("k", calls.append, "k", delay=0.05)
+        time.sleep(0.2)
+        # Interactive work is running, so the speculative job was deferred
+        assert pf.deferred >= 1
+        assert pf.claim("k") is None
+        # Caller takes over: the pending timer must not fire later
+        assert pf.take("k") is None
+        gate.set()
+        blocker.result(timeout=2)
+        time.sleep(0.3)
+        assert calls == []
+    finally:
+        gate.set()
+        ex.shutdown()
+
+
+def test_take_only_adopts_finished_prefetches():
+    ex = TipExecutor(max_workers=1, max_queue=4)
+    gate = threading.Event()
+    try:
+        pf = TipPrefetcher(executor=ex, max_deferrals=0)
+        blocker = ex.submit(gate.wait)
+        pf.schedule("k", lambda: "tip", delay=0.01)
+        deadline = time.time() + 2
+        while pf.claim("k") is None and time.time() < deadline:
+            time.sleep(0.01)
+        queued = pf.claim("k")
+        # Still queued at background priority: the caller submits its own job
+        assert pf.take("k") is None
+        assert queued.cancelled()
+        gate.set()
+        blocker.result(timeout=2)
+
+        pf.schedule("k2", lambda: "tip2", delay=0.01)
+        deadline = time.time() + 2
+        while (pf.claim("k2") is None or not pf.claim("k2").done()) and time.time() < deadline:
+            time.sleep(0.01)
+        assert pf.take("k2").result() == "tip2"
+    finally:
+        gate.set()
+        ex.shutdown()
@@ -0,0 +1,48 @@
+import json
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+import core
+import tracing
+
+
+def test_spans_are_noops_without_an_active_trace():
+    assert tracing.current_span() is None
+    with tracing.span("ignored") as s:
+        assert s is None
+    assert core.compute_category_emissions({"bus_km": 1.0})["Transport"] > 0
+    assert tracing.bind(len) is len
+
+
+def test_trace_builds_tree_from_decorated_functions_and_bound_threads(tmp_path):
+    path = str(tmp_path / "history.csv")
+
+    @tracing.traced("work")
+    def work():
+        with tracing.span("inner", n=2):
+            return core.compute_category_emissions({"bus_km": 1.0})
+
+    with tracing.trace("rerun") as tr:
+        core.save_entry(core.dt.date(2025, 1, 1), {"bus_km": 1.0}, 0.1, path)
+        with ThreadPoolExecutor(max_workers=1) as pool:
+            pool.submit(tracing.bind(work)).result()
+        with pytest.raises(ValueError):
+            with tracing.span("fails"):
+                raise ValueError("boom")
+
+    root = tracing.to_dict(tr)["root"]
+    names = [c["name"] for c in root["children"]]
+    assert names == ["core.save_entry", "work", "fails"]
+    save, work_span, fails = root["children"]
+    assert save["children"][0]["name"] == "core.load_history"
+    assert work_span["children"][0]["attrs"] == {"n": 2}
+    assert work_span["children"][0]["children"][0]["name"] == "core.compute_category_emissions"
+    assert fails["error"] == "ValueError"
+    assert root["duration_ms"] >= save["duration_ms"] >= 0
+
+    chrome = json.loads(json.dumps(tracing.to_chrome_trace(tr)))
+    events = chrome["traceEvents"]
+    assert len(events) == 7 and all(ev["ph"] == "X" for ev in events)
+    assert len({ev["tid"] for ev in events}) == 2  # script thread + pool thread
+    assert "core.compute_category_emissions" in tracing.format_tree(tr)
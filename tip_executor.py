@@ -0,0 +1,296 @@
+"""
+tip_executor.py
+
+A long-lived, process-wide executor for eco-tip generation.
+
+Streamlit reruns the whole script on every widget interaction. Creating a fresh
+ThreadPoolExecutor per rerun (and polling it) means an unrelated click can start
+a second, identical tip request. This module keeps one bounded pool per process
+and lets each session keep its futures keyed by an input hash, so a rerun can
+reattach to an in-flight or completed result.
+
+Provided helpers:
+- input_hash(user_data, emissions): stable key for a tip request.
+- TipExecutor: bounded pool with queue limit and wait-time metrics.
+- get_executor(): the shared process-wide TipExecutor.
+- SessionFutures: small per-session map of input hash -> Future.
+- TipPrefetcher: debounced, low-priority speculative tip requests.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, Mapping, Optional
+
+
+DEFAULT_MAX_WORKERS = int(os.getenv("TIP_EXECUTOR_WORKERS", "4"))
+DEFAULT_MAX_QUEUE = int(os.getenv("TIP_EXECUTOR_MAX_QUEUE", "32"))
+
+
+class QueueFullError(RuntimeError):
+    """Raised when the executor already holds max_queue pending/running jobs."""
+
+
+def input_hash(user_data: Mapping[str, Any], emissions: float) -> str:
+    """Return a short, order-independent hash for a tip request.
+
+    Values are coerced to float where possible so 5 and 5.0 hash the same.
+    """
+    parts = []
+    for k in sorted(user_data.keys()):
+        v = user_data.get(k)
+        try:
+            v = float(v or 0)
+        except (TypeError, ValueError):
+            v = str(v)
+        parts.append(f"{k}={v}")
+    try:
+        em = f"{float(emissions or 0):.4f}"
+    except (TypeError, ValueError):
+        em = str(emissions)
+    parts.append(f"emissions={em}")
+    return hashlib.sha1(";".join(parts).encode("utf-8")).hexdigest()[:16]
+
+
+class TipExecutor:
+    """Bounded thread pool with a queue limit and simple metrics.
+
+    max_queue counts jobs that are queued or running. Submitting beyond it raises
+    QueueFullError so callers can fall back to generating inline. Each returned
+    future gets an elapsed_s attribute (queue wait plus run time) once it
+    completes, so a later rerun can report how long the job actually took.
+    """
+
+    def __init__(self, max_workers: int = DEFAULT_MAX_WORKERS, max_queue: int = DEFAULT_MAX_QUEUE):
+        self.max_workers = max(1, int(max_workers))
+        self.max_queue = max(self.max_workers, int(max_queue))
+        self._pool = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="eco-tip")
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._running = 0
+        self._submitted = 0
+        self._completed = 0
+        self._rejected = 0
+        self._wait_total_s = 0.0
+        self._wait_max_s = 0.0
+        self._run_total_s = 0.0
+
+    def submit(self, fn: Callable[..., Any], *args, **kwargs) -> Future:
+        with self._lock:
+            if self._pending + self._running >= self.max_queue:
+                self._rejected += 1
+                raise QueueFullError(f"tip executor queue is full ({self.max_queue})")
+            self._pending += 1
+            self._submitted += 1
+        enqueued_at = time.perf_counter()
+
+        def _job():
+            started = time.perf_counter()
+            with self._lock:
+                waited = started - enqueued_at
+                self._pending -= 1
+                self._running += 1
+                self._wait_total_s += waited
+                self._wait_max_s = max(self._wait_max_s, waited)
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                with self._lock:
+                    self._running -= 1
+                    self._completed += 1
+                    self._run_total_s += time.perf_counter() - started
+
+        def _stamp(fut: Future) -> None:
+            fut.elapsed_s = time.perf_counter() - enqueued_at
+
+        fut = self._pool.submit(_job)
+        fut.add_done_callback(_stamp)
+        fut.add_done_callback(self._on_cancelled)
+        return fut
+
+    def _on_cancelled(self, fut: Future) -> None:
+        # A cancelled future never ran _job, so release its queue slot here.
+        if fut.cancelled():
+            with self._lock:
+                self._pending -= 1
+
+    def stats(self) -> Dict[str, float]:
+        """Snapshot of queue depth and wait-time metrics."""
+        with self._lock:
+            started = self._completed + self._running
+            return {
+                "max_workers": self.max_workers,
+                "max_queue": self.max_queue,
+                "queue_depth": self._pending,
+                "running": self._running,
+                "submitted": self._submitted,
+                "completed": self._completed,
+                "rejected": self._rejected,
+                "avg_wait_s": round(self._wait_total_s / started, 4) if started else 0.0,
+                "max_wait_s": round(self._wait_max_s, 4),
+                "avg_run_s": round(self._run_total_s / self._completed, 4) if self._completed else 0.0,
+            }
+
+    def shutdown(self, wait: bool = True) -> None:
+        self._pool.shutdown(wait=wait)
+
+
+_EXECUTOR: Optional[TipExecutor] = None
+_EXECUTOR_LOCK = threading.Lock()
+
+
+def get_executor() -> TipExecutor:
+    """Return the process-wide TipExecutor, creating it on first use."""
+    global _EXECUTOR
+    if _EXECUTOR is None:
+        with _EXECUTOR_LOCK:
+            if _EXECUTOR is None:
+                _EXECUTOR = TipExecutor()
+    return _EXECUTOR
+
+
+class SessionFutures:
+    """Per-session map of input hash -> Future with bounded size.
+
+    Stored in st.session_state so a rerun caused by an unrelated widget change
+    reattaches to the same future instead of generating again.
+    """
+
+    def __init__(self, max_entries: int = 8):
+        self.max_entries = max(1, int(max_entries))
+        self._futures: "OrderedDict[str, Future]" = OrderedDict()
+
+    def get(self, key: str) -> Optional[Future]:
+        fut = self._futures.get(key)
+        if fut is None:
+            return None
+        if fut.cancelled() or (fut.done() and fut.exception() is not None):
+            # Failed or cancelled jobs should be retried, not reattached to
+            self._futures.pop(key, None)
+            return None
+        self._futures.move_to_end(key)
+        return fut
+
+    def put(self, key: str, fut: Future) -> None:
+        self._futures[key] = fut
+        self._futures.move_to_end(key)
+        while len(self._futures) > self.max_entries:
+            self._futures.popitem(last=False)
+
+    def get_or_submit(self, key: str, fn: Callable[..., Any], *args, executor: Optional[TipExecutor] = None, **kwargs) -> Future:
+        """Reattach to the future for key, or submit fn to the shared executor."""
+        fut = self.get(key)
+        if fut is None:
+            fut = (executor or get_executor()).submit(fn, *args, **kwargs)
+            self.put(key, fut)
+        return fut
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._futures
+
+    def __len__(self) -> int:
+        return len(self._futures)
+
+
+class TipPrefetcher:
+    """Debounced, low-priority speculative tip requests for one session.
+
+    schedule() (re)starts a debounce timer for the latest inputs; a newer call
+    cancels the pending timer and any not-yet-started prefetch for older inputs.
+    When the timer fires the job is only submitted if the executor has an idle
+    worker, otherwise it is deferred by another debounce interval (up to
+    max_deferrals times) so interactive requests keep priority.
+    """
+
+    def __init__(self, executor: Optional[TipExecutor] = None, max_deferrals: int = 3):
+        self._executor = executor
+        self.max_deferrals = max(0, int(max_deferrals))
+        self._lock = threading.Lock()
+        self._timer: Optional[threading.Timer] = None
+        self._key: Optional[str] = None
+        self._future: Optional[Future] = None
+        self.scheduled = 0
+        self.superseded = 0
+        self.deferred = 0
+
+    @property
+    def executor(self) -> TipExecutor:
+        return self._executor or get_executor()
+
+    def schedule(self, key: str, fn: Callable[..., Any], *args, delay: float = 0.75, **kwargs) -> None:
+        """Prefetch fn(*args, **kwargs) for key once inputs settle for `delay` seconds."""
+        with self._lock:
+            if key == self._key:
+                return  # Same inputs: keep the pending timer or in-flight future
+            self._cancel_locked()
+            self._key = key
+            self.scheduled += 1
+            self._start_timer_locked(key, fn, args, kwargs, max(0.0, float(delay)), 0)
+
+    def _start_timer_locked(self, key, fn, args, kwargs, delay, deferrals) -> None:
+        timer = threading.Timer(delay, self._fire, args=(key, fn, args, kwargs, delay, deferrals))
+        timer.daemon = True
+        self._timer = timer
+        timer.start()
+
+    def _fire(self, key, fn, args, kwargs, delay, deferrals) -> None:
+        with self._lock:
+            if key != self._key or self._future is not None:
+                return
+            stats = self.executor.stats()
+            busy = stats["queue_depth"] + stats["running"] >= stats["max_workers"]
+            if busy and deferrals < self.max_deferrals:
+                self.deferred += 1
+                self._start_timer_locked(key, fn, args, kwargs, max(delay, 0.05), deferrals + 1)
+                return
+            self._timer = None
+            try:
+                self._future = self.executor.submit(fn, *args, **kwargs)
+            except QueueFullError:
+                self._future = None
+
+    def _cancel_locked(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if self._future is not None:
+            if self._future.cancel():
+                self.superseded += 1
+            self._future = None
+        self._key = None
+
+    def claim(self, key: str) -> Optional[Future]:
+        """Return the prefetched future for key, if one has been submitted."""
+        with self._lock:
+            if key == self._key and self._future is not None:
+                return self._future
+            return None
+
+    def take(self, key: str) -> Optional[Future]:
+        """Return the prefetched future for key only if it has already finished.
+
+        Used when the caller is about to submit the job itself at interactive
+        priority. A pending timer, or a prefetch still queued or waiting at
+        background priority, is cancelled instead of adopted, so the caller
+        neither inherits the background priority nor races a duplicate request.
+        """
+        with self._lock:
+            fut = self._future if key == self._key else None
+            if fut is not None and fut.done() and not fut.cancelled():
+                return fut
+            self._cancel_locked()
+            return None
+
+    def is_pending(self, key: str) -> bool:
+        """True if key is still waiting for its debounce timer."""
+        with self._lock:
+            return key == self._key and self._future is None
+
+    def cancel(self) -> None:
+        with self._lock:
+            self._cancel_locked()
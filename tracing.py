@@ -0,0 +1,221 @@
+"""
+tracing.py
+
+Lightweight span tracing for one Streamlit rerun (or any unit of work).
+
+    with tracing.trace("rerun") as tr:        # collect spans for this block
+        with tracing.span("charts", rows=n):  # nested, timed section
+            ...
+    tracing.to_chrome_trace(tr)               # chrome://tracing / Perfetto JSON
+
+Functions decorated with @traced() record a span whenever a trace is active in
+the calling context, and cost one ContextVar lookup otherwise. The current span
+lives in a ContextVar, so concurrent sessions (one script thread each) never
+mix their trees. Work handed to another thread can be attached to the caller's
+trace with bind(fn); spans from other processes (e.g. the PDF workers) are not
+collected.
+
+Provided helpers:
+- trace(name, **attrs): start collecting a span tree; yields the Trace.
+- span(name, **attrs): timed section, a no-op when no trace is active.
+- traced(name=None): decorator form of span().
+- bind(fn): run fn elsewhere under the caller's current span.
+- to_dict(trace), to_chrome_trace(trace), format_tree(trace).
+"""
+
+from __future__ import annotations
+
+import contextvars
+import functools
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, List, Optional
+
+_current: contextvars.ContextVar = contextvars.ContextVar("trace_span", default=None)
+
+
+class Span:
+    __slots__ = ("name", "attrs", "start", "end", "children", "thread", "error")
+
+    def __init__(self, name: str, attrs: Optional[dict] = None):
+        self.name = name
+        self.attrs = attrs or {}
+        self.start = time.perf_counter()
+        self.end: Optional[float] = None
+        self.children: List[Span] = []
+        self.thread = threading.get_ident()
+        self.error: Optional[str] = None
+
+    @property
+    def duration_s(self) -> Optional[float]:
+        return None if self.end is None else self.end - self.start
+
+
+class Trace:
+    """A finished or running span tree plus the wall-clock time it started."""
+
+    def __init__(self, name: str, attrs: Optional[dict] = None):
+        self.root = Span(name, attrs)
+        self.started_at = time.time()
+
+
+class _Noop:
+    __slots__ = ()
+
+    def __enter__(self):
+        return None
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NOOP = _Noop()
+
+
+class _SpanContext:
+    __slots__ = ("_span", "_token")
+
+    def __init__(self, parent: Span, name: str, attrs: dict):
+        self._span = Span(name, attrs)
+        parent.children.append(self._span)  # list.append is atomic; bound threads may add concurrently
+
+    def __enter__(self) -> Span:
+        self._token = _current.set(self._span)
+        return self._span
+
+    def __exit__(self, exc_type, exc, tb):
+        self._span.end = time.perf_counter()
+        if exc_type is not None:
+            self._span.error = exc_type.__name__
+        _current.reset(self._token)
+        return False
+
+
+def span(name: str, **attrs):
+    """Context manager timing a section as a child of the current span."""
+    parent = _current.get()
+    if parent is None:
+        return _NOOP
+    return _SpanContext(parent, name, attrs)
+
+
+def traced(name: Optional[str] = None) -> Callable:
+    """Decorator: record a span named name (default: module.function) per call."""
+
+    def decorate(fn: Callable) -> Callable:
+        label = name or f"{fn.__module__}.{fn.__name__}"
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            parent = _current.get()
+            if parent is None:
+                return fn(*args, **kwargs)
+            with _SpanContext(parent, label, {}):
+                return fn(*args, **kwargs)
+
+        return wrapper
+
+    return decorate
+
+
+@contextmanager
+def trace(name: str = "rerun", **attrs):
+    """Collect every span opened in this context (and bound work) under one root."""
+    tr = Trace(name, attrs)
+    token = _current.set(tr.root)
+    try:
+        yield tr
+    except BaseException as e:
+        tr.root.error = type(e).__name__
+        raise
+    finally:
+        tr.root.end = time.perf_counter()
+        _current.reset(token)
+
+
+def bind(fn: Callable) -> Callable:
+    """Return fn bound to the caller's context, so its spans join the current trace.
+
+    Returns fn unchanged when no trace is active.
+    """
+    if _current.get() is None:
+        return fn
+    ctx = contextvars.copy_context()
+
+    @functools.wraps(fn)
+    def bound(*args, **kwargs):
+        return ctx.copy().run(fn, *args, **kwargs)
+
+    return bound
+
+
+def current_span() -> Optional[Span]:
+    return _current.get()
+
+
+# =========================
+# Export
+# =========================
+def _span_dict(s: Span, origin: float) -> Dict[str, Any]:
+    out: Dict[str, Any] = {
+        "name": s.name,
+        "start_ms": round((s.start - origin) * 1000, 3),
+        "duration_ms": None if s.end is None else round((s.end - s.start) * 1000, 3),
+    }
+    if s.attrs:
+        out["attrs"] = {k: v if isinstance(v, (int, float, str, bool)) or v is None else str(v) for k, v in s.attrs.items()}
+    if s.error:
+        out["error"] = s.error
+    if s.children:
+        out["children"] = [_span_dict(c, origin) for c in list(s.children)]
+    return out
+
+
+def to_dict(tr: Trace) -> Dict[str, Any]:
+    """Nested JSON-serializable span tree (times in ms relative to the root)."""
+    return {"started_at": tr.started_at, "root": _span_dict(tr.root, tr.root.start)}
+
+
+def to_chrome_trace(tr: Trace) -> Dict[str, Any]:
+    """Chrome trace-event format ("X" complete events), loadable in chrome://tracing or Perfetto."""
+    events: List[dict] = []
+    pid = os.getpid()
+    origin = tr.root.start
+    wall_us = tr.started_at * 1e6
+    stack = [tr.root]
+    while stack:
+        s = stack.pop()
+        end = s.end if s.end is not None else time.perf_counter()
+        ev = {
+            "name": s.name, "ph": "X", "pid": pid, "tid": s.thread,
+            "ts": round(wall_us + (s.start - origin) * 1e6, 1), "dur": round((end - s.start) * 1e6, 1),
+        }
+        args = dict(s.attrs)
+        if s.error:
+            args["error"] = s.error
+        if args:
+            ev["args"] = {k: v if isinstance(v, (int, float, str, bool)) or v is None else str(v) for k, v in args.items()}
+        events.append(ev)
+        stack.extend(reversed(list(s.children)))
+    return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+
+def format_tree(tr: Trace, min_ms: float = 0.0) -> str:
+    """Indented text view: one line per span with its duration, children in start order."""
+    lines: List[str] = []
+
+    def walk(s: Span, depth: int) -> None:
+        dur = s.duration_s
+        if depth and dur is not None and dur * 1000 < min_ms:
+            return
+        label = "running" if dur is None else f"{dur * 1000:8.2f} ms"
+        extra = f"  {s.attrs}" if s.attrs else ""
+        err = f"  !{s.error}" if s.error else ""
+        lines.append(f"{label}  {'  ' * depth}{s.name}{extra}{err}")
+        for c in sorted(list(s.children), key=lambda c: c.start):
+            walk(c, depth + 1)
+
+    walk(tr.root, 0)
+    return "\n".join(lines)